@@ -6,4 +6,7 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 app = Celery('core')
 app.config_from_object('django.conf:settings', namespace='CELERY')
 # Автопоиск (tasks.py) в приложениях
-app.autodiscover_tasks()
\ No newline at end of file
+app.autodiscover_tasks()
+
+# Метрики задач: обработчики сигналов Celery
+from . import metrics  # noqa: E402,F401
\ No newline at end of file
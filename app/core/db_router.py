@@ -0,0 +1,112 @@
+"""
+Чтение с реплик PostgreSQL.
+
+Запись всегда идёт в default. Безопасные чтения (ReplicaReadMixin.replica_actions)
+выполняются на одной случайно выбранной реплике из DATABASE_REPLICAS — одной
+на весь запрос, чтобы запросы страницы не попали на реплики с разным
+отставанием. Клиент, который только что что-то изменил, REPLICA_STICKY_SECONDS
+секунд читает с основной БД и видит свои изменения. Анонимные ответы
+попадают в общий кэш, поэтому сразу после любой записи они тоже строятся
+по основной БД: иначе устаревшая страница с реплики закэшировалась бы
+под новым поколением.
+"""
+import contextvars
+import random
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.permissions import SAFE_METHODS
+
+PIN_COOKIE = 'db_primary'
+PIN_KEY = 'db:primary:user:{}'
+WRITE_KEY = 'db:last-write'
+
+# Реплика текущего запроса; None — основная БД
+_replica = contextvars.ContextVar('replica', default=None)
+
+
+@contextmanager
+def replica_scope():
+    """
+    Выбор реплики действует до конца запроса: поток воркера обслуживает
+    следующие запросы, поэтому выбор сбрасывается и после исключения,
+    которое DRF не обработал
+    """
+    token = _replica.set(None)
+    try:
+        yield
+    finally:
+        _replica.reset(token)
+
+
+def note_write():
+    """Была запись: ближайшие REPLICA_STICKY_SECONDS секунд реплики могут отставать"""
+    if settings.DATABASE_REPLICAS:
+        cache.set(WRITE_KEY, 1, settings.REPLICA_STICKY_SECONDS)
+
+
+def recently_written():
+    return cache.get(WRITE_KEY) is not None
+
+
+def pin_to_primary(request, response):
+    """Клиент после записи читает с основной БД"""
+    seconds = settings.REPLICA_STICKY_SECONDS
+    if request.user.is_authenticated:
+        cache.set(PIN_KEY.format(request.user.pk), 1, seconds)
+    else:
+        response.set_cookie(PIN_COOKIE, '1', max_age=seconds, httponly=True, samesite='Lax')
+
+
+def is_pinned(request):
+    if PIN_COOKIE in request.COOKIES:
+        return True
+    return request.user.is_authenticated and cache.get(PIN_KEY.format(request.user.pk)) is not None
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return _replica.get()
+
+    def db_for_write(self, model, **hints):
+        # Явно default: иначе Django сохранил бы объект туда, откуда он прочитан
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и основная БД
+        databases = {'default', *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+class ReplicaReadMixin:
+    """
+    Действия из replica_actions читают с реплики, если клиент не закреплён
+    за основной БД. Успешная запись закрепляет клиента.
+    """
+    replica_actions = ('list', 'retrieve')
+
+    def use_replica(self, request):
+        if not settings.DATABASE_REPLICAS or self.action not in self.replica_actions:
+            return False
+        if not request.user.is_authenticated and recently_written():
+            return False
+        return not is_pinned(request)
+
+    def dispatch(self, request, *args, **kwargs):
+        with replica_scope():
+            return super().dispatch(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # После аутентификации: закрепление ищется по пользователю
+        if self.use_replica(request):
+            _replica.set(random.choice(settings.DATABASE_REPLICAS))
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            pin_to_primary(request, response)
+        return response
@@ -0,0 +1,67 @@
+"""
+Распределённые блокировки на общем кэше (Redis): не больше одного
+выполнения периодической задачи одновременно.
+
+Блокировка — ключ с уникальным токеном, созданный атомарным cache.add.
+Срок жизни ограничивает блокировку упавшей задачи; снимает её только
+владелец токена.
+"""
+import functools
+import logging
+import uuid
+
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.redis import RedisCache
+
+logger = logging.getLogger(__name__)
+
+LOCK_KEY = 'lock:{}'
+
+# Сравнение и удаление одной командой на сервере Redis
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def acquire(name, timeout):
+    """Токен блокировки или None, если она уже занята"""
+    # Целое число RedisCache хранит без pickle: скрипт сравнивает его как строку
+    token = uuid.uuid4().int
+    if cache.add(LOCK_KEY.format(name), token, timeout):
+        return token
+    return None
+
+
+def release(name, token):
+    # Не снимать чужую блокировку: наша могла истечь и достаться другому запуску
+    key = LOCK_KEY.format(name)
+    backend = caches[DEFAULT_CACHE_ALIAS]
+    if isinstance(backend, RedisCache):
+        client = backend._cache.get_client(key, write=True)
+        client.eval(RELEASE_SCRIPT, 1, backend.make_key(key), str(token))
+    elif cache.get(key) == token:
+        # Другие бэкенды (тесты): проверка и удаление раздельно
+        cache.delete(key)
+
+
+def single_flight(name, timeout):
+    """
+    Декоратор задачи: если предыдущий запуск ещё идёт, новый пропускается
+    и возвращает {'skipped': 1}
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            token = acquire(name, timeout)
+            if token is None:
+                logger.info("%s is already running, skipped", name)
+                return {'skipped': 1}
+            try:
+                return func(*args, **kwargs)
+            finally:
+                release(name, token)
+        return wrapper
+    return decorator
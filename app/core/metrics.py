@@ -0,0 +1,370 @@
+"""
+Метрики запросов и задач Celery в формате Prometheus.
+
+Каждый процесс (воркер веб-сервера, процесс Celery) копит приращения в
+памяти и раз в METRICS_FLUSH_INTERVAL секунд отправляет их в Redis одним
+конвейером HINCRBYFLOAT: счётчики всех процессов складываются атомарно.
+Эндпоинт /metrics отдаёт сумму из Redis. Без METRICS_REDIS_URL метрики
+остаются в памяти процесса.
+"""
+import contextvars
+import hmac
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+import redis
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from celery import signals as celery_signals
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse, HttpResponseForbidden
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+REDIS_KEY = 'metrics'
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+QUERY_BUCKETS = (1, 2, 3, 5, 10, 25, 50, 100)
+
+
+class Metric:
+    def __init__(self, name, kind, documentation, labels, buckets=None):
+        self.name = name
+        self.kind = kind
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = buckets
+
+
+METRICS = {metric.name: metric for metric in [
+    Metric('http_requests_total', 'counter', "Запросы по представлению, методу и коду ответа",
+           ('view', 'method', 'status')),
+    Metric('http_request_duration_seconds', 'histogram', "Время ответа",
+           ('view', 'method'), DURATION_BUCKETS),
+    Metric('http_request_db_queries', 'histogram', "SQL-запросов на один запрос",
+           ('view',), QUERY_BUCKETS),
+    Metric('http_request_db_duration_seconds', 'histogram', "Время SQL-запросов за один запрос",
+           ('view',), DURATION_BUCKETS),
+    Metric('http_request_stage_duration_seconds', 'histogram',
+           "Время этапов обработки запроса: serialize, filter, xlsx", ('view', 'stage'), DURATION_BUCKETS),
+    Metric('celery_tasks_total', 'counter', "Выполнения задач по итогу (success, failure, retry)",
+           ('task', 'state')),
+    Metric('celery_task_duration_seconds', 'histogram', "Время выполнения задачи",
+           ('task',), DURATION_BUCKETS),
+    Metric('celery_task_items_total', 'counter', "Числа из отчёта задачи (обработано, отправлено, ошибок...)",
+           ('task', 'item')),
+]}
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _series(name, labels):
+    if not labels:
+        return name
+    return name + '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+
+def _format_bound(bound):
+    return '+Inf' if bound == float('inf') else repr(float(bound))
+
+
+class Registry:
+    """Приращения метрик процесса: {строка серии: значение}"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = {}
+        # Имена серий по меткам строятся один раз
+        self.counter_series = {}
+        self.histogram_series = {}
+        self.last_flush = time.monotonic()
+
+    def add(self, series, amount):
+        with self.lock:
+            self.values[series] = self.values.get(series, 0) + amount
+
+    def inc(self, name, amount=1, **labels):
+        metric = METRICS[name]
+        key = (name, *(labels[label] for label in metric.labels))
+        series = self.counter_series.get(key)
+        if series is None:
+            series = self.counter_series[key] = _series(name, [(label, labels[label]) for label in metric.labels])
+        self.add(series, amount)
+
+    def observe(self, name, value, **labels):
+        metric = METRICS[name]
+        key = (name, *(labels[label] for label in metric.labels))
+        series = self.histogram_series.get(key)
+        if series is None:
+            series = self.histogram_series[key] = self.build_histogram_series(metric, labels)
+        buckets, sum_series, count_series = series
+        with self.lock:
+            # Корзины гистограммы накопительные: значение попадает во все le >= value
+            for bound, bucket in buckets:
+                if value <= bound:
+                    self.values[bucket] = self.values.get(bucket, 0) + 1
+            self.values[sum_series] = self.values.get(sum_series, 0) + value
+            self.values[count_series] = self.values.get(count_series, 0) + 1
+
+    def build_histogram_series(self, metric, labels):
+        label_items = [(key, labels[key]) for key in metric.labels]
+        buckets = [
+            (bound, _series(f'{metric.name}_bucket', label_items + [('le', _format_bound(bound))]))
+            for bound in (*metric.buckets, float('inf'))
+        ]
+        return buckets, _series(f'{metric.name}_sum', label_items), _series(f'{metric.name}_count', label_items)
+
+    def take(self):
+        with self.lock:
+            values, self.values = self.values, {}
+            self.last_flush = time.monotonic()
+        return values
+
+    def restore(self, values):
+        """Вернуть неотправленные приращения (Redis недоступен)"""
+        with self.lock:
+            for series, amount in values.items():
+                self.values[series] = self.values.get(series, 0) + amount
+
+
+registry = Registry()
+_client = None
+
+
+def redis_client():
+    global _client
+    if not settings.METRICS_REDIS_URL:
+        return None
+    if _client is None:
+        _client = redis.Redis.from_url(settings.METRICS_REDIS_URL, socket_timeout=1)
+    return _client
+
+
+def flush_due():
+    """Пора ли отправлять накопленное в Redis"""
+    return time.monotonic() - registry.last_flush >= settings.METRICS_FLUSH_INTERVAL
+
+
+def flush(force=False):
+    """Отправляет накопленное в Redis не чаще раза в METRICS_FLUSH_INTERVAL секунд"""
+    client = redis_client()
+    if client is None:
+        return
+    if not force and not flush_due():
+        return
+    values = registry.take()
+    if not values:
+        return
+    try:
+        pipeline = client.pipeline(transaction=False)
+        for series, amount in values.items():
+            pipeline.hincrbyfloat(REDIS_KEY, series, amount)
+        pipeline.execute()
+    except redis.RedisError as e:
+        logger.warning("Metrics flush failed: %s", e)
+        registry.restore(values)
+
+
+def collect():
+    """Текущие значения всех серий: из Redis (сумма процессов) или из памяти"""
+    client = redis_client()
+    if client is None:
+        with registry.lock:
+            return dict(registry.values)
+    flush(force=True)
+    return {series.decode(): float(value) for series, value in client.hgetall(REDIS_KEY).items()}
+
+
+def _sort_key(item):
+    # Корзины гистограммы — по возрастанию границы, а не по строке
+    series, _ = item
+    head, _, bound = series.partition('le="')
+    return head, float(bound.split('"', 1)[0].replace('+Inf', 'inf')) if bound else 0.0
+
+
+def render(values):
+    """Текстовый формат Prometheus"""
+    families = {}
+    for series, value in values.items():
+        base = series.split('{', 1)[0]
+        for suffix in ('_bucket', '_sum', '_count'):
+            if base.endswith(suffix) and base[:-len(suffix)] in METRICS:
+                base = base[:-len(suffix)]
+                break
+        if base in METRICS:
+            families.setdefault(base, []).append((series, value))
+
+    lines = []
+    for name, metric in METRICS.items():
+        lines.append(f'# HELP {name} {metric.documentation}')
+        lines.append(f'# TYPE {name} {metric.kind}')
+        for series, value in sorted(families.get(name, []), key=_sort_key):
+            value = float(value)
+            lines.append(f'{series} {int(value) if value.is_integer() else value!r}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """
+    GET /metrics: для персонала или с заголовком Authorization: Bearer <METRICS_TOKEN>.
+    Без METRICS_TOKEN — только для персонала.
+    """
+    token = settings.METRICS_TOKEN
+    authorization = request.headers.get('Authorization', '')
+    by_token = bool(token) and hmac.compare_digest(authorization.encode(), f'Bearer {token}'.encode())
+    if not by_token and not request.user.is_staff:
+        return HttpResponseForbidden()
+    return HttpResponse(render(collect()), content_type=CONTENT_TYPE)
+
+
+# Измерения текущего запроса
+class RequestMetrics:
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.stages = {}
+        self.active = set()
+
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+@contextmanager
+def stage(name):
+    """
+    Время этапа запроса (serialize, filter, xlsx). Вложенные вызовы того же
+    этапа (вложенные сериализаторы) не учитываются повторно. Вне запроса
+    ничего не делает.
+    """
+    state = _current.get()
+    if state is None or name in state.active:
+        yield
+        return
+    state.active.add(name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        state.stages[name] = state.stages.get(name, 0) + time.perf_counter() - start
+        state.active.discard(name)
+
+
+class TimedSerializerMixin:
+    """Время to_representation попадает в этап serialize текущего запроса"""
+
+    def to_representation(self, instance):
+        with stage('serialize'):
+            return super().to_representation(instance)
+
+
+def count_query(execute, sql, params, many, context):
+    state = _current.get()
+    if state is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        state.queries += 1
+        state.db_time += time.perf_counter() - start
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    # Обёртка ставится на соединение один раз и считает запросы текущего
+    # запроса через contextvar: он виден и в потоках sync_to_async
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+class MetricsMiddleware:
+    """
+    Время ответа, число и время SQL-запросов и этапы обработки по
+    представлению. Подключается первым, чтобы учитывать остальные
+    middleware; работает и в WSGI, и в ASGI без переключения потоков.
+    В ASGI отправка в Redis (раз в METRICS_FLUSH_INTERVAL) — в отдельном
+    потоке: блокирующий вызов не останавливает цикл событий.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        state = RequestMetrics()
+        token = _current.set(state)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.record(request, response, state, time.perf_counter() - start)
+        flush()
+        return response
+
+    async def __acall__(self, request):
+        state = RequestMetrics()
+        token = _current.set(state)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.record(request, response, state, time.perf_counter() - start)
+        if flush_due():
+            await sync_to_async(flush, thread_sensitive=False)()
+        return response
+
+    def record(self, request, response, state, duration):
+        view = self.view_name(request)
+        registry.inc('http_requests_total', view=view, method=request.method, status=response.status_code)
+        registry.observe('http_request_duration_seconds', duration, view=view, method=request.method)
+        registry.observe('http_request_db_queries', state.queries, view=view)
+        registry.observe('http_request_db_duration_seconds', state.db_time, view=view)
+        for name, seconds in state.stages.items():
+            registry.observe('http_request_stage_duration_seconds', seconds, view=view, stage=name)
+
+    def view_name(self, request):
+        # Имя маршрута (event-list, event-bulk...), а не путь: число серий ограничено
+        match = getattr(request, 'resolver_match', None)
+        return match.view_name if match is not None else 'unmatched'
+
+
+# Задачи Celery
+_task_started = {}
+
+
+@celery_signals.task_prerun.connect
+def task_started(task_id=None, **kwargs):
+    _task_started[task_id] = time.perf_counter()
+
+
+@celery_signals.task_postrun.connect
+def task_finished(task_id=None, task=None, retval=None, state=None, **kwargs):
+    start = _task_started.pop(task_id, None)
+    if start is not None:
+        registry.observe('celery_task_duration_seconds', time.perf_counter() - start, task=task.name)
+    registry.inc('celery_tasks_total', task=task.name, state=(state or 'unknown').lower())
+    # Отчёт задачи ({'sent': 3, 'failed': 1}) — счётчики обработанных элементов
+    if isinstance(retval, dict):
+        for item, value in retval.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                registry.inc('celery_task_items_total', value, task=task.name, item=item)
+    flush()
+
+
+@celery_signals.worker_process_shutdown.connect
+def flush_on_shutdown(**kwargs):
+    flush(force=True)
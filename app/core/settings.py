@@ -38,6 +38,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'django_extensions',
     
     'rest_framework',
@@ -68,6 +69,8 @@ SPECTACULAR_SETTINGS = {
 }
 
 MIDDLEWARE = [
+    # Первым: время ответа включает остальные middleware
+    'core.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -119,9 +122,35 @@ DATABASES = {
         'PASSWORD': DB_PASSWORD,
         'HOST': DB_HOST,
         'PORT': DB_PORT,
+        'OPTIONS': {
+            # Порог сходства для поиска с опечатками (в pg_trgm по умолчанию 0.6:
+            # одна опечатка в слове из 8 букв даёт 0.5)
+            'options': "-c pg_trgm.word_similarity_threshold=%s" % os.environ.get("SEARCH_TRIGRAM_THRESHOLD", "0.5"),
+        },
+        # Соединение живёт между запросами DB_CONN_MAX_AGE секунд (0 — новое на
+        # каждый запрос) и проверяется перед повторным использованием. Под ASGI
+        # соединения не переиспользуются: там нужен 0 или пулер (PgBouncer)
+        'CONN_MAX_AGE': int(os.environ.get("DB_CONN_MAX_AGE", 60)),
+        'CONN_HEALTH_CHECKS': os.environ.get("DB_CONN_HEALTH_CHECKS", "1") == "1",
     }
 }
 
+# Реплики для чтения: DB_REPLICA_HOSTS="replica1,replica2:5433". Имя БД и
+# учётные данные — как у основной. В тестах реплика — зеркало default
+for number, replica in enumerate(filter(None, os.environ.get("DB_REPLICA_HOSTS", "").split(",")), start=1):
+    host, _, port = replica.strip().partition(':')
+    DATABASES[f'replica{number}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DB_PORT,
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['core.db_router.PrimaryReplicaRouter']
+# Сколько секунд после записи клиент читает с основной БД (должно быть
+# больше обычного отставания реплик)
+REPLICA_STICKY_SECONDS = int(os.environ.get("REPLICA_STICKY_SECONDS", 5))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -163,29 +192,179 @@ STATIC_URL = 'static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Превью изображений: размеры меньшей стороны (px) и качество WebP
+THUMBNAIL_SIZES = [200, 800]
+THUMBNAIL_WEBP_QUALITY = 80
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
+# Кэш (Redis из docker-compose)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get("CACHE_URL", "redis://redis:6379/1"),
+    }
+}
+# Время жизни закэшированных ответов API (сек.); актуальность обеспечивают
+# счётчики поколений, поэтому срок может быть большим
+API_CACHE_TIMEOUT = int(os.environ.get("API_CACHE_TIMEOUT", 3600))
+# /api/events/timeline/ по прошедшим диапазонам: срок кэша (сек.). Поколения
+# не учитываются — правка прошедшего мероприятия видна по истечении срока
+TIMELINE_CACHE_TIMEOUT = int(os.environ.get("TIMELINE_CACHE_TIMEOUT", 24 * 3600))
+
+# Метрики Prometheus (/metrics): процессы складывают их в Redis раз в
+# METRICS_FLUSH_INTERVAL секунд; пустой METRICS_REDIS_URL — только память процесса
+METRICS_REDIS_URL = os.environ.get("METRICS_REDIS_URL", "redis://redis:6379/2")
+METRICS_FLUSH_INTERVAL = float(os.environ.get("METRICS_FLUSH_INTERVAL", 10))
+# /metrics открыт персоналу и (если задан) по заголовку Authorization: Bearer <токен>
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
+
+# Экспорт XLSX: строк за один запрос к БД и порог фонового экспорта
+EXPORT_CHUNK_SIZE = int(os.environ.get("EXPORT_CHUNK_SIZE", 2000))
+EXPORT_ASYNC_THRESHOLD = int(os.environ.get("EXPORT_ASYNC_THRESHOLD", 50000))
+# Через сколько часов файл фонового экспорта удаляется из медиа-хранилища
+EXPORT_FILE_TTL_HOURS = int(os.environ.get("EXPORT_FILE_TTL_HOURS", 24))
+# Импорт XLSX: строк в одном bulk_create и размер файла (байт) для фонового импорта
+IMPORT_BATCH_SIZE = int(os.environ.get("IMPORT_BATCH_SIZE", 1000))
+IMPORT_ASYNC_THRESHOLD = int(os.environ.get("IMPORT_ASYNC_THRESHOLD", 5 * 1024 * 1024))
+# Пакетный эндпоинт /api/events/bulk/: максимум операций в одном запросе
+EVENT_BULK_MAX_OPERATIONS = int(os.environ.get("EVENT_BULK_MAX_OPERATIONS", 2000))
+# Загрузка изображений частями (/api/uploads/): максимальный размер файла (байт),
+# разрешённые типы и через сколько часов брошенная загрузка удаляется
+UPLOAD_MAX_SIZE = int(os.environ.get("UPLOAD_MAX_SIZE", 50 * 1024 * 1024))
+UPLOAD_ALLOWED_TYPES = ['image/jpeg', 'image/png', 'image/gif', 'image/webp']
+UPLOAD_SESSION_TTL_HOURS = int(os.environ.get("UPLOAD_SESSION_TTL_HOURS", 24))
+
+
 # CELERY
 CELERY_BROKER_URL = os.environ.get("CELERY_BROKER", "redis://redis:6379/0")
 CELERY_RESULT_BACKEND = os.environ.get("CELERY_BROKER", "redis://redis:6379/0")
 
+# Очереди: письма не ждут за загрузкой погоды и превью. Каждую очередь
+# обслуживает свой воркер (docker-compose); внутри очереди задачи с меньшим
+# priority идут раньше (Redis: 0 — наивысший)
+CELERY_TASK_DEFAULT_QUEUE = 'default'
+CELERY_TASK_ROUTES = {
+    'events.tasks.send_publication_emails_task': {'queue': 'email', 'priority': 0},
+    'events.tasks.publish_event_task': {'queue': 'default', 'priority': 0},
+    'events.tasks.publish_events_chunk': {'queue': 'default', 'priority': 0},
+    'events.tasks.update_weather_chunk': {'queue': 'weather', 'priority': 5},
+    'events.tasks.generate_thumbnails_task': {'queue': 'media', 'priority': 5},
+    'events.tasks.export_events_xlsx_task': {'queue': 'media', 'priority': 9},
+    'events.tasks.import_events_xlsx_task': {'queue': 'media', 'priority': 9},
+}
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    'priority_steps': list(range(10)),
+    'sep': ':',
+    'queue_order_strategy': 'priority',
+}
+# Воркер берёт по одной задаче: длинные пачки не копятся у одного процесса
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
+# Получатели уведомлений о публикации
+EVENT_NOTIFICATION_RECIPIENTS = ['admin@example.com']
+# Уведомления копятся EMAIL_BATCH_DELAY секунд и уходят пачками
+# через одно соединение не быстрее EMAIL_RATE_LIMIT писем/с (0 — без ограничения)
+EMAIL_BATCH_SIZE = int(os.environ.get("EMAIL_BATCH_SIZE", 100))
+EMAIL_BATCH_DELAY = int(os.environ.get("EMAIL_BATCH_DELAY", 10))
+EMAIL_RATE_LIMIT = float(os.environ.get("EMAIL_RATE_LIMIT", 0))
+# Через сколько секунд пачка, взятая упавшим отправителем, снова уходит в отправку
+EMAIL_CLAIM_TIMEOUT = int(os.environ.get("EMAIL_CLAIM_TIMEOUT", 30 * 60))
+
+# Публиковать черновики задачей с ETA точно в publish_at.
+# Ежеминутная проверка тогда нужна лишь как страховка и запускается реже.
+EVENT_PUBLISH_USE_ETA = os.environ.get("EVENT_PUBLISH_USE_ETA", "0") == "1"
+
 from celery.schedules import crontab
 
 CELERY_BEAT_SCHEDULE = {
-    # Проверять погоду каждые 30 минут
-    'update-weather-every-30-mins': {
+    # Каждые 10 минут: запуск обновляет только устаревшие показания
+    'update-weather-every-10-mins': {
         'task': 'events.tasks.update_weather_task',
-        'schedule': crontab(minute='*/30'),
+        'schedule': crontab(minute='*/10'),
     },
     # Проверять автопубликацию каждую минуту
     'check-pub-every-minute': {
         'task': 'events.tasks.check_for_publication',
+        'schedule': crontab(minute='*/15' if EVENT_PUBLISH_USE_ETA else '*'),
+    },
+    # Страховка: отправить уведомления, если отложенная задача потерялась
+    'flush-notifications-every-5-mins': {
+        'task': 'events.tasks.send_publication_emails_task',
+        'schedule': crontab(minute='*/5'),
+    },
+    # Прореживать историю погоды раз в сутки
+    'prune-weather-daily': {
+        'task': 'events.tasks.prune_weather_history',
+        'schedule': crontab(minute=15, hour=3),
+    },
+    # Удалять брошенные загрузки частями
+    'prune-uploads-hourly': {
+        'task': 'events.tasks.prune_upload_sessions',
+        'schedule': crontab(minute=45),
+    },
+    # Удалять готовые файлы фонового экспорта
+    'prune-exports-hourly': {
+        'task': 'events.tasks.prune_exports',
+        'schedule': crontab(minute=50),
+    },
+    # Сводная статистика мест: предстоящие — каждую минуту, полная сверка — раз в час
+    'roll-upcoming-stats-every-minute': {
+        'task': 'events.tasks.roll_upcoming_stats',
         'schedule': crontab(minute='*'),
     },
-}
\ No newline at end of file
+    'reconcile-location-stats-hourly': {
+        'task': 'events.tasks.reconcile_location_stats',
+        'schedule': crontab(minute=30),
+    },
+    # Записи об удалённых мероприятиях старше SYNC_TOMBSTONE_DAYS — ночью
+    'prune-event-tombstones-nightly': {
+        'task': 'events.tasks.prune_event_tombstones',
+        'schedule': crontab(minute=35, hour=3),
+    },
+}
+
+# Погода (Open-Meteo)
+WEATHER_API_URL = os.environ.get("WEATHER_API_URL", "https://api.open-meteo.com/v1/forecast")
+# Одновременных запросов к API
+WEATHER_MAX_WORKERS = int(os.environ.get("WEATHER_MAX_WORKERS", 16))
+WEATHER_TIMEOUT = float(os.environ.get("WEATHER_TIMEOUT", 10))
+# Повторы с экспоненциальной задержкой (backoff * 2^n секунд)
+WEATHER_RETRIES = int(os.environ.get("WEATHER_RETRIES", 3))
+WEATHER_BACKOFF = float(os.environ.get("WEATHER_BACKOFF", 0.5))
+
+# Обновление погоды: только места с мероприятиями, которые идут или начнутся
+# в пределах горизонта прогноза; за запуск не больше WEATHER_REFRESH_BUDGET
+# точек (пар координат), самые устаревшие — первыми
+WEATHER_FORECAST_DAYS = int(os.environ.get("WEATHER_FORECAST_DAYS", 16))
+WEATHER_REFRESH_BUDGET = int(os.environ.get("WEATHER_REFRESH_BUDGET", 1000))
+# Сколько закончившихся мероприятий за запуск получают зафиксированную погоду
+WEATHER_FREEZE_BATCH = int(os.environ.get("WEATHER_FREEZE_BATCH", 1000))
+
+# Периодические задачи делятся на пачки (группа Celery) и не запускаются
+# повторно, пока идёт предыдущий запуск. Блокировка упавшего запуска истекает
+# через *_LOCK_TIMEOUT секунд
+WEATHER_CHUNK_SIZE = int(os.environ.get("WEATHER_CHUNK_SIZE", 100))
+WEATHER_LOCK_TIMEOUT = int(os.environ.get("WEATHER_LOCK_TIMEOUT", 30 * 60))
+PUBLISH_CHUNK_SIZE = int(os.environ.get("PUBLISH_CHUNK_SIZE", 500))
+PUBLISH_LOCK_TIMEOUT = int(os.environ.get("PUBLISH_LOCK_TIMEOUT", 5 * 60))
+
+# Лента изменений /api/events/sync/: записей на страницу, сколько дней
+# хранить записи об удалённых (старше — нужна полная синхронизация) и
+# задержка, за которую успевают зафиксироваться транзакции
+SYNC_PAGE_SIZE = int(os.environ.get("SYNC_PAGE_SIZE", 500))
+SYNC_TOMBSTONE_DAYS = int(os.environ.get("SYNC_TOMBSTONE_DAYS", 30))
+SYNC_SETTLE_SECONDS = int(os.environ.get("SYNC_SETTLE_SECONDS", 2))
+
+# История погоды: сколько дней хранить и когда прореживать
+WEATHER_HISTORY_DAYS = int(os.environ.get("WEATHER_HISTORY_DAYS", 365))
+WEATHER_DOWNSAMPLE_AFTER_DAYS = int(os.environ.get("WEATHER_DOWNSAMPLE_AFTER_DAYS", 7))
+# Интервал прореживания: 'hour' или 'day'
+WEATHER_DOWNSAMPLE_TO = os.environ.get("WEATHER_DOWNSAMPLE_TO", "day")
@@ -0,0 +1,165 @@
+"""
+Async-представления для чтения мероприятий и мест (ASGI).
+
+Повторяют list/retrieve соответствующих ViewSet: аутентификация, права,
+фильтры и поиск в кэше выполняются синхронно одним вызовом sync_to_async,
+чтение из БД — через async ORM (acount, aget, async for). Пока запрос ждёт
+БД, поток воркера обслуживает другие запросы. Страницы читаются одним
+запросом, а не через aiterator(): в PostgreSQL он открывает серверный курсор
+(DECLARE, FETCH, CLOSE — лишние обращения к БД на каждую страницу).
+"""
+import math
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotAllowed
+from rest_framework import status
+from rest_framework.exceptions import NotFound
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from core.db_router import replica_scope
+from core.metrics import stage
+from .cache import CachedResponseMixin
+from .pagination import KeysetPagination
+from .views import EventViewSet, LocationViewSet
+
+
+class AsyncReadView:
+    """list и retrieve поверх viewset_class; записи остаются синхронными"""
+    viewset_class = None
+
+    def __init__(self, action):
+        self.action = action
+        self.cache_key = self.etag = None
+
+    @classmethod
+    def as_view(cls, action):
+        async def view(request, **kwargs):
+            return await cls(action).dispatch(request, **kwargs)
+        return view
+
+    async def dispatch(self, request, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return HttpResponseNotAllowed(['GET', 'HEAD'])
+        with replica_scope():
+            return await self.respond(request, kwargs)
+
+    async def respond(self, request, kwargs):
+        view, response = await sync_to_async(self.prepare)(request, kwargs)
+        if response is None:
+            try:
+                response = await getattr(self, self.action)(view, **kwargs)
+            except Exception as exc:
+                response = view.handle_exception(exc)
+            else:
+                if self.cache_key is not None and response.status_code == status.HTTP_200_OK:
+                    await cache.aset(self.cache_key, response.data, settings.API_CACHE_TIMEOUT)
+        if self.etag is not None and response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            view.patch_cached_response(response, self.etag)
+        return self.render(view, response)
+
+    def prepare(self, request, kwargs):
+        """Синхронная часть: права, фильтры, кэш. Готовый ответ, если БД не нужна"""
+        view = self.viewset_class(action_map={'get': self.action}, args=(), kwargs=kwargs, format_kwarg=None)
+        # Browsable API строит формы запросами к БД; здесь только JSON
+        view.renderer_classes = [JSONRenderer]
+        request = view.initialize_request(request, **kwargs)
+        view.request, view.args, view.kwargs = request, (), kwargs
+        view.headers = view.default_response_headers
+        try:
+            view.initial(request)
+            if isinstance(view, CachedResponseMixin) and not request.user.is_authenticated:
+                self.cache_key, self.etag, response = view.cached_lookup(request)
+                if response is not None:
+                    return view, response
+            self.queryset = self.get_queryset(view)
+        except Exception as exc:
+            return view, view.handle_exception(exc)
+        return view, None
+
+    def get_queryset(self, view):
+        if self.action == 'retrieve':
+            return view.get_queryset()
+        return view.filter_queryset(view.get_queryset())
+
+    async def retrieve(self, view, pk):
+        try:
+            instance = await self.queryset.aget(pk=pk)
+        except self.queryset.model.DoesNotExist:
+            raise NotFound()
+        view.check_object_permissions(view.request, instance)
+        return Response(view.get_serializer(instance).data)
+
+    async def list(self, view):
+        page, links = await self.paginate(view, self.queryset)
+        return Response({**links, 'results': view.get_serializer(page, many=True).data})
+
+    async def paginate(self, view, queryset):
+        """Как PageNumberPagination, но COUNT и страница — через async ORM"""
+        paginator, request = view.paginator, view.request
+        size = paginator.get_page_size(request)
+        count = await queryset.acount()
+        pages = max(1, math.ceil(count / size))
+
+        number = request.query_params.get(paginator.page_query_param) or 1
+        if number in paginator.last_page_strings:
+            number = pages
+        try:
+            number = int(number)
+        except ValueError:
+            number = 0
+        if not 1 <= number <= pages:
+            raise NotFound(paginator.invalid_page_message.format(page_number=number, message=''))
+
+        # Границы среза как у django.core.paginator.Paginator: тот же LIMIT — тот же план
+        offset = (number - 1) * size
+        page = [item async for item in queryset[offset:min(offset + size, count)]]
+
+        url = request.build_absolute_uri()
+        links = {'count': count, 'next': None, 'previous': None}
+        if number < pages:
+            links['next'] = replace_query_param(url, paginator.page_query_param, number + 1)
+        if number == 2:
+            links['previous'] = remove_query_param(url, paginator.page_query_param)
+        elif number > 2:
+            links['previous'] = replace_query_param(url, paginator.page_query_param, number - 1)
+        return page, links
+
+    def render(self, view, response):
+        response = view.finalize_response(view.request, response)
+        response.render()
+        # Обычный HttpResponse: обработчик ASGI не будет вызывать render в потоке
+        rendered = HttpResponse(response.content, status=response.status_code)
+        for header, value in response.items():
+            rendered[header] = value
+        return rendered
+
+
+class EventReadView(AsyncReadView):
+    viewset_class = EventViewSet
+
+    def get_queryset(self, view):
+        if self.action == 'retrieve':
+            return view.get_queryset()
+        self.listing, rows = view.listing_rows(view.request)
+        return rows
+
+    async def list(self, view):
+        # Как EventViewSet.fast_list: строки values() без создания моделей
+        if isinstance(view.paginator, KeysetPagination):
+            page = await sync_to_async(view.paginator.paginate_queryset)(self.queryset, view.request, view)
+            with stage('serialize'):
+                data = await self.listing.ato_representation(page)
+            return view.paginator.get_paginated_response(data)
+
+        page, links = await self.paginate(view, self.queryset)
+        with stage('serialize'):
+            results = await self.listing.ato_representation(page)
+        return Response({**links, 'results': results})
+
+
+class LocationReadView(AsyncReadView):
+    viewset_class = LocationViewSet
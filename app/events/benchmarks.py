@@ -0,0 +1,209 @@
+"""Синтетические данные и замеры для нагрузочных проверок."""
+import io
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import requests
+
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import Image
+
+from .geo import grid_cell
+from .models import Event, EventImage, Location, WeatherData
+
+# Частые слова плюс словарь из слогов: у реальных названий длинный хвост
+# редких слов, поэтому большинство поисковых запросов избирательны
+COMMON_WORDS = [
+    'концерт', 'выставка', 'фестиваль', 'лекция', 'спектакль', 'ярмарка',
+    'турнир', 'кинопоказ', 'экскурсия', 'джаз', 'театр', 'музей',
+]
+SYLLABLES = [
+    consonant + vowel for consonant in 'бвгдзклмнпрстфхцчшщ' for vowel in 'аеиоуыэюя'
+]
+PLACES = ['Дом культуры', 'Парк', 'Филармония', 'Стадион', 'Галерея', 'Клуб', 'Арена']
+
+
+def make_vocabulary(rng, size=20000):
+    words = {
+        ''.join(rng.choices(SYLLABLES, k=rng.randint(2, 4)))
+        for _ in range(size)
+    }
+    return sorted(words)
+
+
+def pick_words(rng, vocabulary, k):
+    """k слов: частые — с вероятностью 10%, остальные по закону Ципфа"""
+    return [
+        rng.choice(COMMON_WORDS) if rng.random() < 0.1
+        # Логарифмически равномерный ранг: P(r) ~ 1/r
+        else vocabulary[int(len(vocabulary) ** rng.random()) - 1]
+        for _ in range(k)
+    ]
+
+
+def generate_dataset(events, locations=1000, seed=0, batch_size=5000, author=None):
+    """
+    Создаёт locations мест и events опубликованных мероприятий.
+
+    Данные детерминированы seed; вставка — bulk_create пачками
+    по batch_size. Возвращает число созданных мероприятий.
+    """
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(rng)
+    rng.shuffle(vocabulary)
+    if author is None:
+        author, _ = User.objects.get_or_create(username='benchmark')
+
+    places = []
+    for _ in range(locations):
+        lat, lon = round(rng.uniform(41, 70), 4), round(rng.uniform(20, 180), 4)
+        places.append(Location(
+            name=f"{rng.choice(PLACES)} {' '.join(pick_words(rng, vocabulary, 1))}".capitalize(),
+            lat=lat,
+            lon=lon,
+            grid_cell=grid_cell(lat, lon),
+        ))
+    location_ids = [
+        location.id for location in Location.objects.bulk_create(places, batch_size=batch_size)
+    ]
+
+    start = timezone.now() - timedelta(days=365)
+    created = 0
+    while created < events:
+        batch = []
+        for _ in range(min(batch_size, events - created)):
+            begins = start + timedelta(minutes=rng.randrange(2 * 365 * 24 * 60))
+            batch.append(Event(
+                title=' '.join(pick_words(rng, vocabulary, 3)).capitalize(),
+                description=' '.join(pick_words(rng, vocabulary, 20)),
+                start_date=begins,
+                end_date=begins + timedelta(hours=rng.randint(1, 8)),
+                author=author,
+                location_id=rng.choice(location_ids),
+                rating=rng.randint(0, 25),
+                status='published',
+            ))
+        Event.objects.bulk_create(batch)
+        created += len(batch)
+    return created
+
+
+def generate_weather(seed=0):
+    """Текущее показание погоды для мест без него"""
+    rng = random.Random(seed)
+    locations = list(Location.objects.filter(current_weather__isnull=True).only('id'))
+    readings = WeatherData.objects.bulk_create([
+        WeatherData(
+            location=location,
+            temperature=round(rng.uniform(-25, 35), 1),
+            humidity=rng.randint(20, 100),
+            pressure=round(rng.uniform(730, 780), 1),
+            wind_direction=str(rng.randrange(0, 360, 10)),
+            wind_speed=round(rng.uniform(0, 15), 1),
+        )
+        for location in locations
+    ])
+    for location, reading in zip(locations, readings):
+        location.current_weather = reading
+    Location.objects.bulk_update(locations, ['current_weather'], batch_size=1000)
+    return len(readings)
+
+
+def generate_images(count, seed=0, size=(1600, 1200)):
+    """
+    count фотографий размера size (шум поверх цветного фона, чтобы JPEG
+    сжимался как снимок) у случайных мероприятий. Файлы — в default_storage.
+    """
+    rng = random.Random(seed)
+    event_ids = list(Event.objects.order_by('id').values_list('id', flat=True)[:max(count * 10, 1)])
+    images = []
+    for number in range(count):
+        color = tuple(rng.randrange(256) for _ in range(3))
+        noise = Image.effect_noise(size, 40).convert('RGB')
+        picture = Image.blend(Image.new('RGB', size, color), noise, 0.3)
+        content = io.BytesIO()
+        picture.save(content, 'JPEG', quality=90)
+        name = default_storage.save(f'events/benchmark_{seed}_{number}.jpg', ContentFile(content.getvalue()))
+        images.append(EventImage(event_id=rng.choice(event_ids), image=name))
+    return EventImage.objects.bulk_create(images)
+
+
+def measure(func, repeat=10, setup=None):
+    """
+    Время выполнения func в миллисекундах: медиана, p95 и максимум.
+    setup() вызывается перед каждым замером и не учитывается; его
+    результат передаётся в func.
+    """
+    timings = []
+    for _ in range(repeat):
+        args = (setup(),) if setup else ()
+        started = time.perf_counter()
+        func(*args)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {
+        'median_ms': round(statistics.median(timings), 2),
+        'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 2),
+        'max_ms': round(timings[-1], 2),
+    }
+
+
+def find_regressions(results, baseline, threshold, min_delta_ms=1.0):
+    """
+    Сценарии, медиана которых выросла больше чем на threshold (доля) и
+    больше чем на min_delta_ms относительно baseline: [(сценарий, было, стало)]
+    """
+    regressions = []
+    for name, timings in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        was, now = before['median_ms'], timings['median_ms']
+        if now > was * (1 + threshold) and now - was > min_delta_ms:
+            regressions.append((name, was, now))
+    return regressions
+
+
+def load_test(url, concurrency, total, headers=None, timeout=30):
+    """
+    total GET-запросов к url из concurrency потоков (у каждого своё
+    keep-alive соединение): пропускная способность и задержки ответа
+    """
+    local = threading.local()
+    timings, errors = [], []
+
+    def fetch(_):
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        started = time.perf_counter()
+        try:
+            response = session.get(url, headers=headers, timeout=timeout)
+            ok = response.status_code == 200
+        except requests.RequestException:
+            ok = False
+        elapsed = (time.perf_counter() - started) * 1000
+        (timings if ok else errors).append(elapsed)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(fetch, range(total)))
+    duration = time.perf_counter() - started
+
+    timings.sort()
+    result = {'concurrency': concurrency, 'requests': total, 'errors': len(errors),
+              'rps': round(len(timings) / duration, 1)}
+    if timings:
+        result.update(
+            median_ms=round(statistics.median(timings), 2),
+            p95_ms=round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 2),
+            max_ms=round(timings[-1], 2),
+        )
+    return result
@@ -0,0 +1,147 @@
+"""Пакетное создание, изменение и удаление мероприятий."""
+from django.conf import settings
+from django.db import transaction
+from rest_framework import serializers
+
+from .models import Event, Location
+from .notifications import notify_published
+from .serializers import EventBulkSerializer
+from .signals import bulk_changed
+from .tasks import schedule_publication
+
+OPERATIONS = ('create', 'update', 'delete')
+
+
+def _int_or_none(value):
+    if isinstance(value, bool):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class EventBulk:
+    """
+    Проверяет все операции за один проход и применяет их в одной транзакции:
+    создание — bulk_create, изменение — bulk_update, удаление — одним
+    DELETE. Места проведения и изменяемые мероприятия читаются одним
+    запросом каждые. Ошибочные операции пропускаются и попадают в отчёт
+    со своим индексом; уведомления о публикации — одной пачкой.
+    """
+
+    def __init__(self, author):
+        self.author = author
+        self.results = []
+        self.to_create = []
+        self.to_update = {}
+        self.update_fields = set()
+        self.to_delete = []
+        self.published = []
+        self.unpublished = []
+        # Прежние места перенесённых мероприятий (для сводной статистики)
+        self.moved_from = set()
+
+    def run(self, operations):
+        with transaction.atomic():
+            self.load(operations)
+            for index, operation in enumerate(operations):
+                try:
+                    self.results.append(self.validate(index, operation))
+                except serializers.ValidationError as e:
+                    self.results.append({'index': index, 'status': 'error', 'errors': e.detail})
+            self.apply()
+        return self.report()
+
+    def load(self, operations):
+        """Места проведения и изменяемые мероприятия — по запросу на всю пачку"""
+        location_ids, event_ids = set(), set()
+        for operation in operations:
+            if not isinstance(operation, dict):
+                continue
+            data = operation.get('data')
+            if isinstance(data, dict) and _int_or_none(data.get('location')) is not None:
+                location_ids.add(int(data['location']))
+            if operation.get('op') in ('update', 'delete') and _int_or_none(operation.get('id')) is not None:
+                event_ids.add(int(operation['id']))
+
+        self.locations = Location.objects.only('id').in_bulk(location_ids)
+        # Блокировка: параллельный пакет не перезапишет изменения
+        self.events = Event.objects.select_for_update().defer('search_vector').in_bulk(event_ids)
+        context = {'locations': self.locations}
+        self.creator = EventBulkSerializer(context=context)
+        self.updater = EventBulkSerializer(context=context, partial=True)
+        self.seen = set()
+
+    def validate(self, index, operation):
+        if not isinstance(operation, dict) or operation.get('op') not in OPERATIONS:
+            raise serializers.ValidationError({'op': f"Ожидается одно из: {', '.join(OPERATIONS)}"})
+        op = operation['op']
+        result = {'index': index, 'op': op}
+
+        if op == 'create':
+            # Поля проверяются одним экземпляром сериализатора на всю пачку
+            fields = self.creator.run_validation(operation.get('data'))
+            self.to_create.append((result, Event(**fields, author=self.author)))
+            return result
+
+        event_id = _int_or_none(operation.get('id'))
+        if event_id not in self.events:
+            raise serializers.ValidationError({'id': "Мероприятие не найдено"})
+        if event_id in self.seen:
+            raise serializers.ValidationError({'id': "Повторная операция над мероприятием"})
+        result['id'] = event_id
+
+        if op == 'update':
+            fields = self.updater.run_validation(operation.get('data'))
+            event = self.events[event_id]
+            was_published = event.status == 'published'
+            if 'location' in fields and fields['location'].id != event.location_id:
+                self.moved_from.add(event.location_id)
+            for name, value in fields.items():
+                setattr(event, name, value)
+            self.to_update[event_id] = event
+            self.update_fields.update(fields)
+            if event.status == 'published' and not was_published:
+                self.published.append(event_id)
+            elif was_published and event.status != 'published':
+                self.unpublished.append(event_id)
+        else:
+            self.to_delete.append(event_id)
+
+        self.seen.add(event_id)
+        result['status'] = f"{op}d"
+        return result
+
+    def apply(self):
+        batch_size = settings.IMPORT_BATCH_SIZE
+        created = Event.objects.bulk_create([event for _, event in self.to_create], batch_size=batch_size)
+        for (result, _), event in zip(self.to_create, created):
+            result.update(id=event.id, status='created')
+            if event.status == 'published':
+                self.published.append(event.id)
+
+        if self.to_update and self.update_fields:
+            Event.objects.bulk_update(self.to_update.values(), sorted(self.update_fields), batch_size=batch_size)
+        if self.to_delete:
+            Event.objects.filter(id__in=self.to_delete).delete()
+
+        changed = [event.id for event in created] + list(self.to_update)
+        if changed:
+            bulk_changed.send(sender=Event, ids=changed, locations=self.moved_from, unpublished=self.unpublished)
+        if self.published:
+            notify_published(self.published)
+        for event in [*created, *self.to_update.values()]:
+            schedule_publication(event)
+
+    def report(self):
+        counts = {status: 0 for status in ('created', 'updated', 'deleted', 'error')}
+        for result in self.results:
+            counts[result['status']] += 1
+        return {
+            'created': counts['created'],
+            'updated': counts['updated'],
+            'deleted': counts['deleted'],
+            'errors': counts['error'],
+            'results': self.results,
+        }
@@ -0,0 +1,97 @@
+"""Кэш ответов API для анонимных пользователей."""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from rest_framework import status
+from rest_framework.response import Response
+
+GENERATION_KEY = 'events:gen:{}'
+
+
+def _generation_key(model):
+    return GENERATION_KEY.format(model._meta.label_lower)
+
+
+def bump_generation(*models):
+    """Делает недействительными все закэшированные ответы, зависящие от моделей"""
+    for model in models:
+        key = _generation_key(model)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Счётчика нет (вытеснен): начинаем с метки времени, а не с 1,
+            # чтобы не совпасть со старыми ключами
+            cache.add(key, time.time_ns(), timeout=None)
+
+
+def get_generations(models):
+    keys = [_generation_key(model) for model in models]
+    generations = cache.get_many(keys)
+    for key in keys:
+        if key not in generations:
+            cache.add(key, time.time_ns(), timeout=None)
+            generations[key] = cache.get(key)
+    return tuple(generations[key] for key in keys)
+
+
+def response_cache_key(request, generations):
+    """Ключ из хоста, пути, формата, нормализованной строки запроса и поколений"""
+    query = sorted(
+        (name, sorted(values)) for name, values in request.query_params.lists()
+    )
+    raw = repr((
+        request.get_host(),
+        request.path,
+        request.accepted_renderer.format,
+        query,
+        generations,
+    ))
+    return 'events:response:' + hashlib.sha256(raw.encode()).hexdigest()
+
+
+class CachedResponseMixin:
+    """
+    Кэширует list и retrieve для анонимных пользователей.
+
+    Ключ включает счётчики поколений моделей из `cache_models`, которые
+    увеличиваются сигналами при любом изменении, поэтому явная очистка
+    не нужна. Ответ несёт строгий ETag, по If-None-Match отдаётся 304
+    без обращения к БД.
+    """
+    cache_models = ()
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return handler(request, *args, **kwargs)
+
+        key, etag, response = self.cached_lookup(request)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            cache.set(key, response.data, settings.API_CACHE_TIMEOUT)
+        return self.patch_cached_response(response, etag)
+
+    def cached_lookup(self, request):
+        """Ключ, ETag и готовый ответ (304 или из кэша) либо None"""
+        key = response_cache_key(request, get_generations(self.cache_models))
+        etag = f'"{key.rsplit(":", 1)[1][:32]}"'
+        if etag in request.headers.get('If-None-Match', ''):
+            return key, etag, Response(status=status.HTTP_304_NOT_MODIFIED)
+        data = cache.get(key)
+        return key, etag, Response(data) if data is not None else None
+
+    def patch_cached_response(self, response, etag):
+        response['ETag'] = etag
+        patch_cache_control(response, no_cache=True)
+        patch_vary_headers(response, ('Authorization', 'Cookie'))
+        return response
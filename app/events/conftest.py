@@ -0,0 +1,100 @@
+import os
+import pytest
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connections
+from rest_framework.test import APIClient
+from .models import Location, Event
+from core.celery import app as celery_app
+from core.metrics import registry
+
+# Результаты задач Celery — в памяти процесса, а не в Redis
+os.environ.setdefault('CELERY_RESULT_BACKEND', 'cache+memory://')
+celery_app.conf.task_store_eager_result = True
+
+@pytest.fixture(scope='session')
+def django_db_modify_db_settings(django_db_modify_db_settings_parallel_suffix):
+    """
+    Вторая тестовая БД 'replica' — отдельная, а не зеркало default: по
+    результату запроса видно, с какой БД он прочитан. Маршрутизация
+    включается в тесте через settings.DATABASE_REPLICAS
+    """
+    default = connections.settings['default']
+    connections.settings['replica'] = {
+        **default,
+        'NAME': f"{default['NAME']}_replica",
+        'TEST': {**default['TEST'], 'NAME': None, 'MIRROR': None},
+    }
+
+@pytest.fixture(autouse=True)
+def celery_eager():
+    """Задачи Celery выполняются синхронно, без брокера"""
+    celery_app.conf.task_always_eager = True
+    yield
+    celery_app.conf.task_always_eager = False
+
+@pytest.fixture
+def media_root(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    return tmp_path
+
+@pytest.fixture(autouse=True)
+def clear_cache(settings):
+    """Локальный кэш в памяти вместо Redis"""
+    settings.CACHES = {
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    }
+    cache.clear()
+    yield
+    cache.clear()
+
+@pytest.fixture(autouse=True)
+def local_metrics(settings):
+    """Метрики только в памяти процесса, каждый тест — с нуля"""
+    settings.METRICS_REDIS_URL = ''
+    registry.take()
+
+# Максимум SQL-запросов на один запрос к API, независимо от объёма данных
+QUERY_BUDGETS = {
+    'list': 3,       # COUNT + страница с местом и погодой + изображения
+    'retrieve': 2,   # мероприятие с местом и погодой + изображения
+    'export': 2,     # COUNT + потоковое чтение мероприятий с местами
+}
+
+@pytest.fixture
+def query_budget(django_assert_max_num_queries):
+    """
+    Проверка бюджета запросов:
+
+        with query_budget('list'):
+            api_client.get('/api/events/')
+    """
+    def check(name):
+        return django_assert_max_num_queries(QUERY_BUDGETS[name])
+    return check
+
+@pytest.fixture
+def api_client():
+    return APIClient()
+
+@pytest.fixture
+def admin_user(db):
+    return User.objects.create_superuser('admin', 'admin@test.com', 'password')
+
+@pytest.fixture
+def location(db):
+    return Location.objects.create(name="Loc", lat=55.75, lon=37.62)
+
+@pytest.fixture
+def make_event(admin_user, location):
+    """Фабрика мероприятий с разумными значениями по умолчанию"""
+    def make(**kwargs):
+        kwargs.setdefault('title', 'Event')
+        kwargs.setdefault('description', '')
+        kwargs.setdefault('author', admin_user)
+        kwargs.setdefault('location', location)
+        kwargs.setdefault('status', 'published')
+        kwargs.setdefault('start_date', "2026-01-01T00:00:00Z")
+        kwargs.setdefault('end_date', "2026-01-01T01:00:00Z")
+        return Event.objects.create(**kwargs)
+    return make
@@ -0,0 +1,57 @@
+"""Экспорт мероприятий в XLSX."""
+import openpyxl
+from django.conf import settings
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Шапка
+EXPORT_COLUMNS = [
+    'Название', 'Описание', 'Дата публикации',
+    'Дата начала', 'Дата завершения', 'Название места проведения',
+    'Гео-координаты', 'Рейтинг'
+]
+
+
+def _naive(value):
+    return value.replace(tzinfo=None) if value else ""
+
+
+def export_rows(queryset):
+    """Строки таблицы из БД порциями по EXPORT_CHUNK_SIZE, без создания моделей"""
+    rows = queryset.values_list(
+        'title', 'description', 'pub_date', 'start_date', 'end_date',
+        'location__name', 'location__lat', 'location__lon', 'rating',
+    ).iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+
+    for title, desc, pub_dt, start_dt, end_dt, loc_name, lat, lon, rating in rows:
+        yield [
+            title,
+            desc,
+            _naive(pub_dt),
+            _naive(start_dt),
+            _naive(end_dt),
+            loc_name,
+            f"{lat}, {lon}",
+            rating,
+        ]
+
+
+def write_events_xlsx(queryset, fileobj):
+    """
+    Пишет мероприятия в XLSX.
+
+    Книга в режиме write-only сбрасывает строки во временный файл по мере
+    добавления, поэтому память не зависит от количества строк.
+    Возвращает число записанных мероприятий.
+    """
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet("Events")
+    sheet.append(EXPORT_COLUMNS)
+
+    count = 0
+    for row in export_rows(queryset):
+        sheet.append(row)
+        count += 1
+
+    workbook.save(fileobj)
+    return count
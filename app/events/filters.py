@@ -1,6 +1,41 @@
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity
+from django.db import connections
+from django import forms
+from django.db.models import Case, F, Q, Value, When
 from django_filters import rest_framework as filters
+from rest_framework import filters as drf_filters
+from .geo import distance_expression, nearby_filter
 from .models import Event, Location
 
+
+class PointField(forms.Field):
+    """Точка "широта,долгота" -> (lat, lon)"""
+    default_error_messages = {
+        'invalid': 'Ожидается "широта,долгота" в допустимом диапазоне',
+    }
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        try:
+            lat, lon = (float(part) for part in value.split(','))
+        except ValueError:
+            raise forms.ValidationError(self.error_messages['invalid'], code='invalid')
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            raise forms.ValidationError(self.error_messages['invalid'], code='invalid')
+        return lat, lon
+
+
+class PointFilter(filters.Filter):
+    field_class = PointField
+
+
+DEFAULT_RADIUS_KM = 10
+MAX_RADIUS_KM = 1000
+
+
 class EventFilter(filters.FilterSet):
     # Диапазон даты начала
     start_date = filters.DateTimeFromToRangeFilter(
@@ -23,6 +58,109 @@ class EventFilter(filters.FilterSet):
         label='Места проведения (можно выбрать несколько ID)'
     )
 
+    # Мероприятия в радиусе radius км от точки near
+    near = PointFilter(
+        method='filter_near',
+        label='Точка "широта,долгота": мероприятия рядом (с полем distance, км)'
+    )
+    radius = filters.NumberFilter(
+        method='filter_radius',
+        min_value=0,
+        max_value=MAX_RADIUS_KM,
+        label=f'Радиус поиска рядом с near, км (по умолчанию {DEFAULT_RADIUS_KM})'
+    )
+
     class Meta:
         model = Event
-        fields = ['start_date', 'end_date', 'rating', 'location', 'status']
\ No newline at end of file
+        fields = ['start_date', 'end_date', 'rating', 'location', 'status']
+
+    def filter_near(self, queryset, name, value):
+        lat, lon = value
+        radius = self.form.cleaned_data.get('radius')
+        radius = float(radius) if radius is not None else DEFAULT_RADIUS_KM
+        return (
+            queryset
+            # Кандидаты по индексу ячеек сетки, затем точное расстояние
+            .filter(nearby_filter(lat, lon, radius, prefix='location__'))
+            .annotate(distance=distance_expression(lat, lon, prefix='location__'))
+            .filter(distance__lte=radius)
+        )
+
+    def filter_radius(self, queryset, name, value):
+        # Используется в filter_near
+        return queryset
+
+
+def is_postgresql(queryset):
+    return connections[queryset.db].vendor == 'postgresql'
+
+
+class EventSearchFilter(drf_filters.SearchFilter):
+    """
+    Поиск мероприятий.
+
+    В PostgreSQL — полнотекстовый поиск по search_vector (GIN-индекс) с
+    префиксами слов плюс триграммное сходство названия для опечаток;
+    результаты получают поле search_rank. На других СУБД (SQLite в
+    тестах) — стандартный ILIKE по search_fields.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        words = [word for term in terms for word in re.findall(r'\w+', term)]
+        if not words or not is_postgresql(queryset):
+            return super().filter_queryset(request, queryset, view)
+
+        text = ' '.join(words)
+        # Каждое слово как префикс: "конц:* & зал:*"
+        query = SearchQuery(
+            ' & '.join(f"{word}:*" for word in words),
+            search_type='raw',
+            config='simple',
+        )
+        return (
+            queryset
+            .filter(Q(search_vector=query) | Q(title__trigram_word_similar=text))
+            .annotate(search_rank=Case(
+                # Точные совпадения всегда выше нечётких; дорогое триграммное
+                # сходство считается только для строк, найденных по опечатке
+                When(search_vector=query, then=Value(1.0) + SearchRank(F('search_vector'), query)),
+                default=TrigramWordSimilarity(text, 'title'),
+            ))
+        )
+
+
+class NullsLastOrderingFilter(drf_filters.OrderingFilter):
+    """
+    Сортировка, при которой пустые значения (например, средний рейтинг
+    места без опубликованных) всегда в конце — в любом направлении и на
+    любой СУБД: в PostgreSQL по убыванию NULL иначе оказались бы первыми
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        ordering = self.get_ordering(request, queryset, view)
+        if not ordering:
+            return queryset
+        return queryset.order_by(*(
+            F(term[1:]).desc(nulls_last=True) if term.startswith('-') else F(term).asc(nulls_last=True)
+            for term in ordering
+        ))
+
+
+class EventOrderingFilter(drf_filters.OrderingFilter):
+    """
+    При поиске без явной сортировки — сначала самые релевантные.
+    Сортировка по distance доступна только вместе с фильтром near.
+    """
+
+    def remove_invalid_fields(self, queryset, fields, view, request):
+        valid = super().remove_invalid_fields(queryset, fields, view, request)
+        annotations = queryset.query.annotations
+        return [term for term in valid if term.lstrip('-') != 'distance' or 'distance' in annotations]
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        explicit = request.query_params.get(self.ordering_param)
+        if not explicit and 'search_rank' in queryset.query.annotations:
+            return ['-search_rank', *(ordering or [])]
+        return ordering
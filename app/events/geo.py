@@ -0,0 +1,100 @@
+"""Поиск мест проведения рядом с точкой без PostGIS."""
+import math
+
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.functions import ASin, Cast, Cos, Least, Power, Radians, Sin, Sqrt
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+# Сетка 0.1° (около 11 км по широте); номер ячейки хранится в Location.grid_cell.
+# При изменении размера нужна миграция, пересчитывающая grid_cell
+GRID_CELL_DEGREES = 0.1
+GRID_COLUMNS = round(360 / GRID_CELL_DEGREES)
+GRID_ROWS = round(180 / GRID_CELL_DEGREES)
+
+# Больше ячеек — фильтр по ним теряет смысл, хватает ограничивающего прямоугольника
+MAX_GRID_CELLS = 400
+
+
+def _row(lat):
+    return min(int((float(lat) + 90) // GRID_CELL_DEGREES), GRID_ROWS - 1)
+
+
+def _column(lon):
+    return int((float(lon) + 180) // GRID_CELL_DEGREES) % GRID_COLUMNS
+
+
+def grid_cell(lat, lon):
+    """Номер ячейки сетки, в которую попадает точка"""
+    return _row(lat) * GRID_COLUMNS + _column(lon)
+
+
+def bounding_box(lat, lon, radius_km):
+    """
+    Прямоугольник (min_lat, max_lat, [(min_lon, max_lon), ...]), содержащий
+    круг радиуса radius_km. Через антимеридиан — два диапазона долгот,
+    у полюса — все долготы.
+    """
+    dlat = radius_km / KM_PER_DEGREE
+    min_lat, max_lat = max(lat - dlat, -90.0), min(lat + dlat, 90.0)
+
+    cos_lat = math.cos(math.radians(max(abs(min_lat), abs(max_lat))))
+    if cos_lat < 1e-6 or radius_km / (KM_PER_DEGREE * cos_lat) >= 180:
+        return min_lat, max_lat, [(-180.0, 180.0)]
+
+    dlon = radius_km / (KM_PER_DEGREE * cos_lat)
+    min_lon, max_lon = lon - dlon, lon + dlon
+    if min_lon < -180:
+        return min_lat, max_lat, [(min_lon + 360, 180.0), (-180.0, max_lon)]
+    if max_lon > 180:
+        return min_lat, max_lat, [(min_lon, 180.0), (-180.0, max_lon - 360)]
+    return min_lat, max_lat, [(min_lon, max_lon)]
+
+
+def cells_in_box(min_lat, max_lat, lon_ranges):
+    """Ячейки сетки, покрывающие прямоугольник; None, если их слишком много"""
+    columns = set()
+    for min_lon, max_lon in lon_ranges:
+        first, last = _column(min_lon), _column(max_lon)
+        if max_lon >= 180:
+            last = GRID_COLUMNS - 1
+        columns.update(range(first, last + 1))
+
+    rows = range(_row(min_lat), _row(max_lat) + 1)
+    if len(rows) * len(columns) > MAX_GRID_CELLS:
+        return None
+    return [row * GRID_COLUMNS + column for row in rows for column in columns]
+
+
+def nearby_filter(lat, lon, radius_km, prefix=''):
+    """
+    Грубый отбор кандидатов: ячейки сетки (по индексу grid_cell) и
+    ограничивающий прямоугольник. Точное расстояние — distance_expression.
+    """
+    min_lat, max_lat, lon_ranges = bounding_box(lat, lon, radius_km)
+    condition = Q(**{f'{prefix}lat__range': (min_lat, max_lat)})
+
+    lon_condition = Q()
+    for min_lon, max_lon in lon_ranges:
+        lon_condition |= Q(**{f'{prefix}lon__range': (min_lon, max_lon)})
+    condition &= lon_condition
+
+    cells = cells_in_box(min_lat, max_lat, lon_ranges)
+    if cells is not None:
+        condition &= Q(**{f'{prefix}grid_cell__in': cells})
+    return condition
+
+
+def distance_expression(lat, lon, prefix=''):
+    """Расстояние (км) от точки до места по формуле гаверсинусов, считается в БД"""
+    point_lat = math.radians(lat)
+    place_lat = Radians(Cast(F(f'{prefix}lat'), FloatField()))
+    place_lon = Radians(Cast(F(f'{prefix}lon'), FloatField()))
+
+    half_chord = (
+        Power(Sin((place_lat - point_lat) / 2), 2)
+        + math.cos(point_lat) * Cos(place_lat) * Power(Sin((place_lon - math.radians(lon)) / 2), 2)
+    )
+    # Least: погрешность округления не должна вывести аргумент asin за 1
+    return 2 * EARTH_RADIUS_KM * ASin(Least(Sqrt(half_chord), Value(1.0)))
@@ -0,0 +1,160 @@
+"""Импорт мероприятий из XLSX."""
+from datetime import datetime
+
+import openpyxl
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .geo import grid_cell
+from .models import Event, Location
+from .notifications import notify_published
+from .signals import bulk_changed
+
+TEXT_LIMIT = Event._meta.get_field('title').max_length
+RATING_MAX = 25
+
+
+def _parse_datetime(value, column):
+    if isinstance(value, str):
+        value = parse_datetime(value.strip())
+    if not isinstance(value, datetime):
+        raise ValueError(f"{column}: ожидается дата и время")
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value
+
+
+def parse_row(row):
+    """Проверяет строку таблицы и возвращает поля мероприятия и места"""
+    if len(row) < 8:
+        raise ValueError("ожидается 8 столбцов")
+    title, desc, pub_dt, start_dt, end_dt, loc_name, loc_coords, rating = row[:8]
+
+    title = str(title).strip()
+    loc_name = str(loc_name or '').strip()
+    if len(title) > TEXT_LIMIT:
+        raise ValueError(f"Название длиннее {TEXT_LIMIT} символов")
+    if not loc_name or len(loc_name) > TEXT_LIMIT:
+        raise ValueError("Название места проведения пустое или слишком длинное")
+
+    # Парсим координаты "lat, lon"
+    try:
+        lat_raw, lon_raw = str(loc_coords).split(',')
+        lat, lon = float(lat_raw.strip()), float(lon_raw.strip())
+    except ValueError:
+        raise ValueError("Гео-координаты: ожидается \"широта, долгота\"")
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError("Гео-координаты вне допустимого диапазона")
+
+    try:
+        rating = int(rating) if rating is not None else 0
+    except (TypeError, ValueError):
+        raise ValueError("Рейтинг: ожидается целое число")
+    if not 0 <= rating <= RATING_MAX:
+        raise ValueError(f"Рейтинг: от 0 до {RATING_MAX}")
+
+    event = {
+        'title': title,
+        'description': desc or '',
+        'start_date': _parse_datetime(start_dt, "Дата начала"),
+        'end_date': _parse_datetime(end_dt, "Дата завершения"),
+        'rating': rating,
+    }
+    return event, (loc_name, lat, lon)
+
+
+class EventImporter:
+    """
+    Потоковый импорт: книга читается в режиме read-only, места проведения
+    ищутся через словарь в памяти, мероприятия вставляются bulk_create
+    пачками по IMPORT_BATCH_SIZE. Весь файл — одна транзакция; ошибочные
+    строки пропускаются и попадают в отчёт.
+    """
+
+    def __init__(self, author, progress=None):
+        self.author = author
+        self.progress = progress
+        # Название места -> id
+        self.locations = {}
+        self.created_ids = []
+        self.errors = []
+        self.processed = 0
+
+    def run(self, fileobj):
+        workbook = openpyxl.load_workbook(fileobj, read_only=True, data_only=True)
+        try:
+            with transaction.atomic():
+                batch = []
+                rows = workbook.active.iter_rows(min_row=2, values_only=True)
+                for row_number, row in enumerate(rows, start=2):
+                    if not row or not row[0]:
+                        continue  # Пропуск пустых строк
+                    try:
+                        batch.append(parse_row(row))
+                    except ValueError as e:
+                        self.errors.append({'row': row_number, 'error': str(e)})
+                    self.processed += 1
+
+                    if len(batch) >= settings.IMPORT_BATCH_SIZE:
+                        self.flush(batch)
+                        batch = []
+                self.flush(batch)
+        finally:
+            workbook.close()
+
+        if self.created_ids:
+            bulk_changed.send(sender=Location, ids=list(self.locations.values()))
+            bulk_changed.send(sender=Event, ids=self.created_ids)
+            # Одна пачка уведомлений на весь файл
+            notify_published(self.created_ids)
+        return self.report()
+
+    def flush(self, batch):
+        if not batch:
+            return
+        self.resolve_locations([place for _, place in batch])
+
+        events = Event.objects.bulk_create([
+            Event(
+                **fields,
+                location_id=self.locations[name],
+                author=self.author,
+                status='published',
+            )
+            for fields, (name, _, _) in batch
+        ])
+        self.created_ids += [event.id for event in events]
+
+        if self.progress:
+            self.progress(self.processed, len(self.created_ids))
+
+    def resolve_locations(self, places):
+        """Находит или создаёт места проведения одним-двумя запросами на пачку"""
+        missing = {name: (lat, lon) for name, lat, lon in places if name not in self.locations}
+        if not missing:
+            return
+
+        # Названия мест не уникальны: берём первое по id, как get_or_create
+        for location_id, name in (
+            Location.objects.filter(name__in=missing)
+            .order_by('-id')
+            .values_list('id', 'name')
+        ):
+            self.locations[name] = location_id
+
+        new = [
+            Location(name=name, lat=lat, lon=lon, grid_cell=grid_cell(lat, lon))
+            for name, (lat, lon) in missing.items()
+            if name not in self.locations
+        ]
+        for location in Location.objects.bulk_create(new):
+            self.locations[location.name] = location.id
+
+    def report(self):
+        return {
+            'processed': self.processed,
+            'created': len(self.created_ids),
+            'errors': self.errors,
+        }
@@ -0,0 +1,168 @@
+"""Быстрая сериализация списка мероприятий."""
+from types import SimpleNamespace
+
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.relations import PKOnlyObject
+
+from .models import EventImage
+
+# Поле ответа -> столбец values(); остальные поля совпадают со столбцами
+COLUMNS = {
+    'author': 'author_id',
+    'location': 'location_id',
+}
+LOCATION_PREFIX = 'location__'
+WEATHER_PREFIX = 'location__current_weather__'
+FROZEN_WEATHER_PREFIX = 'frozen_weather__'
+IMAGE_FILE_FIELDS = ('image', 'thumbnail')
+
+
+def requested_fields(request, available):
+    """Поля из ?fields=id,title,...; None — все поля. Поля только для записи недоступны"""
+    raw = request.query_params.get('fields')
+    if not raw:
+        return None
+    names = [name.strip() for name in raw.split(',') if name.strip()]
+    unknown = [name for name in names if name not in available or available[name].write_only]
+    if unknown:
+        raise ValidationError({'fields': f"Неизвестные поля: {', '.join(unknown)}"})
+    return set(names)
+
+
+def to_representation(field, value):
+    """Как в Serializer.to_representation: None остаётся None"""
+    check_for_none = value.pk if isinstance(value, PKOnlyObject) else value
+    return None if check_for_none is None else field.to_representation(value)
+
+
+def readable_fields(serializer):
+    """Поля сериализатора, попадающие в ответ (без полей только для записи)"""
+    return [field for field in serializer.fields.values() if not field.write_only]
+
+
+def represent(fields, values):
+    """Словарь ответа по готовым значениям полей"""
+    return {field.field_name: to_representation(field, values[field.field_name]) for field in fields}
+
+
+class EventListing:
+    """
+    Ответ списка мероприятий без создания моделей и вложенных сериализаторов.
+
+    Строки читаются через values() одним запросом с местом и погодой,
+    изображения страницы — вторым. Каждое значение проходит через
+    to_representation соответствующего поля EventSerializer, поэтому
+    результат совпадает с сериализатором; `fields` ограничивает набор полей.
+    """
+
+    def __init__(self, serializer, queryset, fields=None):
+        annotations = queryset.query.annotations
+        self.fields = [
+            field for field in readable_fields(serializer)
+            # distance есть только при фильтре near
+            if (field.field_name != 'distance' or 'distance' in annotations)
+            and (fields is None or field.field_name in fields)
+        ]
+        self.nested = {
+            name: serializer.fields[name]
+            for name in ('location_details', 'weather', 'images')
+            if any(field.field_name == name for field in self.fields)
+        }
+
+    def columns(self, extra=()):
+        """Столбцы для values(): поля ответа плюс extra (ключ постраничного вывода)"""
+        columns = {'id', *extra}
+        for field in self.fields:
+            name = field.field_name
+            if name in self.nested:
+                continue
+            columns.add(COLUMNS.get(name, name))
+        if 'location_details' in self.nested:
+            columns.update(
+                LOCATION_PREFIX + field.field_name
+                for field in readable_fields(self.nested['location_details'])
+            )
+        if 'weather' in self.nested:
+            # Как Event.weather: у прошедших — зафиксированное показание
+            columns.update(('end_date', 'frozen_weather_id', 'location__current_weather_id'))
+            columns.update(
+                prefix + field.field_name
+                for prefix in (WEATHER_PREFIX, FROZEN_WEATHER_PREFIX)
+                for field in readable_fields(self.nested['weather'])
+            )
+        return sorted(columns)
+
+    def rows(self, queryset, extra=()):
+        return queryset.prefetch_related(None).values(*self.columns(extra))
+
+    def to_representation(self, rows):
+        self.now = timezone.now()
+        images = self.images([row['id'] for row in rows]) if 'images' in self.nested else {}
+        return [self.represent_row(row, images) for row in rows]
+
+    async def ato_representation(self, rows):
+        """То же для async-представлений: изображения читаются через async ORM"""
+        self.now = timezone.now()
+        images = {}
+        if 'images' in self.nested:
+            queryset = self.image_rows([row['id'] for row in rows])
+            images = self.represent_images([image async for image in queryset])
+        return [self.represent_row(row, images) for row in rows]
+
+    def represent_row(self, row, images):
+        ret = {}
+        for field in self.fields:
+            name = field.field_name
+            if name == 'location_details':
+                ret[name] = self.represent_nested(name, row, LOCATION_PREFIX)
+            elif name == 'weather':
+                ret[name] = self.represent_weather(row)
+            elif name == 'images':
+                ret[name] = images.get(row['id'], [])
+            elif name in COLUMNS:
+                ret[name] = to_representation(field, PKOnlyObject(pk=row[COLUMNS[name]]))
+            else:
+                ret[name] = to_representation(field, row[name])
+        return ret
+
+    def represent_weather(self, row):
+        if row['frozen_weather_id'] is not None and row['end_date'] < self.now:
+            return self.represent_nested('weather', row, FROZEN_WEATHER_PREFIX)
+        if row['location__current_weather_id'] is not None:
+            return self.represent_nested('weather', row, WEATHER_PREFIX)
+        return None
+
+    def represent_nested(self, name, row, prefix):
+        fields = readable_fields(self.nested[name])
+        return represent(fields, {field.field_name: row[prefix + field.field_name] for field in fields})
+
+    def images(self, event_ids):
+        """Изображения страницы одним запросом: {event_id: [...]}"""
+        return self.represent_images(self.image_rows(event_ids))
+
+    def image_rows(self, event_ids):
+        return (
+            EventImage.objects
+            .filter(event_id__in=event_ids)
+            .order_by('id')
+            .values('event_id', 'id', 'status', 'variants', *IMAGE_FILE_FIELDS)
+        )
+
+    def represent_images(self, rows):
+        serializer = self.nested['images'].child
+        fields = readable_fields(serializer)
+        model_fields = {name: EventImage._meta.get_field(name) for name in IMAGE_FILE_FIELDS}
+
+        result = {}
+        for row in rows:
+            values = {
+                'id': row['id'],
+                'status': row['status'],
+                # SerializerMethodField получает объект целиком
+                'variants': SimpleNamespace(variants=row['variants']),
+            }
+            for name, model_field in model_fields.items():
+                values[name] = model_field.attr_class(None, model_field, row[name])
+            result.setdefault(row['event_id'], []).append(represent(fields, values))
+        return result
@@ -0,0 +1,64 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from rest_framework import filters as drf_filters
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from events.benchmarks import generate_dataset, measure
+from events.filters import EventOrderingFilter, EventSearchFilter
+from events.models import Event
+from events.views import EventViewSet
+
+DEFAULT_TERMS = ['концерт', 'конц', 'фестивал джаз', 'филармония', 'выстовка']
+
+
+class Command(BaseCommand):
+    help = (
+        "Замер поиска мероприятий: индексный поиск PostgreSQL против ILIKE. "
+        "Недостающие мероприятия создаются в текущей БД"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=1_000_000, help="Размер набора данных")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--repeat', type=int, default=10, help="Повторов на запрос")
+        parser.add_argument('--term', action='append', dest='terms', help="Поисковый запрос (можно несколько)")
+        parser.add_argument('--no-ilike', action='store_true', help="Не замерять ILIKE (долго на больших данных)")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("Индексный поиск доступен только в PostgreSQL")
+
+        missing = options['events'] - Event.objects.count()
+        if missing > 0:
+            self.stdout.write(f"Creating {missing} events...")
+            generate_dataset(missing, seed=options['seed'])
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE events_event")
+
+        view = EventViewSet(action='list', format_kwarg=None)
+        factory = APIRequestFactory()
+        backends = {'indexed': EventSearchFilter}
+        if not options['no_ilike']:
+            backends['ilike'] = drf_filters.SearchFilter
+
+        results = []
+        for term in options['terms'] or DEFAULT_TERMS:
+            request = Request(factory.get('/api/events/', {'search': term}))
+            for name, backend in backends.items():
+                def first_page():
+                    queryset = backend().filter_queryset(request, Event.objects.all(), view)
+                    queryset = EventOrderingFilter().filter_queryset(request, queryset, view)
+                    return list(queryset.values_list('id', flat=True)[:20])
+
+                results.append({
+                    'term': term,
+                    'mode': name,
+                    'matches': len(first_page()),
+                    **measure(first_page, options['repeat']),
+                })
+                self.stdout.write(json.dumps(results[-1], ensure_ascii=False))
+
+        self.stdout.write(self.style.SUCCESS(f"Events: {Event.objects.count()}"))
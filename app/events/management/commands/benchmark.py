@@ -0,0 +1,260 @@
+import io
+import json
+import subprocess
+import tempfile
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from events.benchmarks import (
+    find_regressions, generate_dataset, generate_images, generate_weather, measure,
+)
+from events.exports import XLSX_CONTENT_TYPE, write_events_xlsx
+from events.models import Event, EventImage, Location
+from events.tasks import generate_thumbnails_task, publish_events_chunk, update_weather_chunk
+from events.testing import StubOpenMeteoServer
+
+SCENARIOS = [
+    'list', 'list_filtered', 'search', 'retrieve', 'export_xlsx', 'import_xlsx',
+    'thumbnails', 'check_for_publication', 'update_weather',
+]
+# Строк в файле импорта и черновиков, публикуемых за один замер
+IMPORT_ROWS = 1000
+PUBLISH_DRAFTS = 200
+
+
+class Command(BaseCommand):
+    help = (
+        "Воспроизводимые замеры основных операций на синтетических данных "
+        "(seed): список, фильтры, поиск, карточка, экспорт и импорт XLSX, "
+        "превью, автопубликация, обновление погоды (через локальную заглушку "
+        "Open-Meteo). По умолчанию данные создаются в отдельной тестовой БД. "
+        "Результат — JSON; с --baseline команда завершается ошибкой, если "
+        "медиана какого-либо сценария выросла больше чем на --threshold"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=10_000, help="Мероприятий в наборе данных")
+        parser.add_argument('--locations', type=int, default=1000, help="Мест проведения")
+        parser.add_argument('--images', type=int, default=20, help="Изображений (для превью и карточек)")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--repeat', type=int, default=5, help="Замеров на сценарий")
+        parser.add_argument('--scenario', action='append', dest='scenarios', choices=SCENARIOS,
+                            help="Только указанные сценарии (можно несколько)")
+        parser.add_argument('--output', help="Файл для результатов JSON (по умолчанию — stdout)")
+        parser.add_argument('--baseline', help="JSON предыдущего запуска для сравнения")
+        parser.add_argument('--threshold', type=float, default=0.25,
+                            help="Допустимый рост медианы относительно baseline (доля)")
+        parser.add_argument('--min-delta-ms', type=float, default=1.0,
+                            help="Меньший рост медианы не считается регрессией (шум)")
+        parser.add_argument('--keepdb', action='store_true',
+                            help="Не удалять тестовую БД: следующий запуск не создаёт данные заново")
+        parser.add_argument('--current-db', action='store_true',
+                            help="Замерять на текущей БД, дописав недостающие данные (нужен --allow-writes)")
+        parser.add_argument('--allow-writes', action='store_true',
+                            help="Подтверждение для --current-db: синтетические мероприятия, погода и "
+                                 "пользователь benchmark-admin останутся в текущей БД")
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+
+        if options['current_db']:
+            if not options['allow_writes']:
+                raise CommandError(
+                    "--current-db навсегда добавляет в текущую БД синтетические данные и "
+                    "пользователя benchmark-admin; подтвердите флагом --allow-writes"
+                )
+            report = self.run(options)
+        else:
+            old_name = connection.settings_dict['NAME']
+            connection.creation.create_test_db(
+                verbosity=0, autoclobber=True, serialize=False, keepdb=options['keepdb'],
+            )
+            try:
+                report = self.run(options)
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+
+        output = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+        if baseline is not None:
+            self.compare(report, baseline, options)
+
+    def run(self, options):
+        scenarios = options['scenarios'] or SCENARIOS
+        with tempfile.TemporaryDirectory() as media_root, override_settings(
+            MEDIA_ROOT=media_root,
+            ALLOWED_HOSTS=['testserver'],
+            EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+            # Замеряется обработка запроса, а не кэш ответов
+            CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+            EXPORT_ASYNC_THRESHOLD=10 ** 9,
+            IMPORT_ASYNC_THRESHOLD=10 ** 12,
+            WEATHER_BACKOFF=0,
+            METRICS_REDIS_URL='',
+        ):
+            self.prepare(options)
+            images = generate_images(options['images'], seed=options['seed'])
+            try:
+                results = {}
+                for name in scenarios:
+                    results[name] = getattr(self, f'bench_{name}')(options['repeat'], images)
+                    self.stderr.write(f"{name}: {results[name]['median_ms']} ms")
+            finally:
+                EventImage.objects.filter(id__in=[image.id for image in images]).delete()
+
+        return {
+            'meta': {
+                'commit': self.git_commit(),
+                'vendor': connection.vendor,
+                'events': options['events'],
+                'locations': options['locations'],
+                'images': options['images'],
+                'seed': options['seed'],
+                'repeat': options['repeat'],
+                'created_at': timezone.now().isoformat(),
+            },
+            'results': results,
+        }
+
+    def prepare(self, options):
+        missing = options['events'] - Event.objects.count()
+        if missing > 0:
+            self.stderr.write(f"Creating {missing} events...")
+            generate_dataset(missing, locations=options['locations'], seed=options['seed'])
+            generate_weather(seed=options['seed'])
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute("ANALYZE")
+
+        self.anonymous = APIClient()
+        self.admin = APIClient()
+        user, _ = User.objects.get_or_create(
+            username='benchmark-admin', defaults={'is_staff': True, 'is_superuser': True},
+        )
+        self.admin.force_authenticate(user)
+        # Окно в месяц от начала данных: фильтры и экспорт не зависят от даты запуска
+        first = Event.objects.order_by('start_date').values_list('start_date', flat=True).first()
+        window = first + timedelta(days=180)
+        self.month = {
+            'start_date_after': window.date().isoformat(),
+            'start_date_before': (window + timedelta(days=30)).date().isoformat(),
+        }
+
+    def git_commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def get(self, client, url, params=None):
+        response = client.get(url, params)
+        if response.status_code != 200:
+            raise CommandError(f"{url}: HTTP {response.status_code}")
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response
+
+    def rolled_back(self, func, repeat, setup=None):
+        """Замеры в транзакции, которая откатывается: данные не меняются между сценариями"""
+        with transaction.atomic():
+            result = measure(func, repeat, setup)
+            transaction.set_rollback(True)
+        return result
+
+    def bench_list(self, repeat, images):
+        return measure(lambda: self.get(self.anonymous, '/api/events/'), repeat)
+
+    def bench_list_filtered(self, repeat, images):
+        params = {**self.month, 'rating_min': 20, 'ordering': '-start_date'}
+        return measure(lambda: self.get(self.anonymous, '/api/events/', params), repeat)
+
+    def bench_search(self, repeat, images):
+        return measure(lambda: self.get(self.anonymous, '/api/events/', {'search': 'концерт'}), repeat)
+
+    def bench_retrieve(self, repeat, images):
+        event_id = images[0].event_id if images else Event.objects.values_list('id', flat=True).first()
+        return measure(lambda: self.get(self.anonymous, f'/api/events/{event_id}/'), repeat)
+
+    def bench_export_xlsx(self, repeat, images):
+        return measure(lambda: self.get(self.admin, '/api/events/export-xlsx/', self.month), repeat)
+
+    def bench_import_xlsx(self, repeat, images):
+        content = io.BytesIO()
+        write_events_xlsx(Event.objects.order_by('id')[:IMPORT_ROWS], content)
+
+        def upload():
+            return SimpleUploadedFile('events.xlsx', content.getvalue(), content_type=XLSX_CONTENT_TYPE)
+
+        def run(file):
+            response = self.admin.post('/api/events/import-xlsx/', {'file': file}, format='multipart')
+            if response.status_code != 200:
+                raise CommandError(f"import-xlsx: HTTP {response.status_code}")
+
+        return self.rolled_back(run, repeat, setup=upload)
+
+    def bench_thumbnails(self, repeat, images):
+        def run():
+            for image in images:
+                generate_thumbnails_task(image.id)
+        return measure(run, repeat)
+
+    def bench_check_for_publication(self, repeat, images):
+        event = Event.objects.first()
+
+        def drafts():
+            due = timezone.now() - timedelta(minutes=1)
+            Event.objects.bulk_create([
+                Event(
+                    title=f"Черновик {number}", description='', author_id=event.author_id,
+                    location_id=event.location_id, start_date=event.start_date, end_date=event.end_date,
+                    status='draft', publish_at=due,
+                )
+                for number in range(PUBLISH_DRAFTS)
+            ])
+
+        def publish(_):
+            # Работа пачек без брокера: все наступившие черновики одной пачкой
+            due = Event.objects.filter(status='draft', publish_at__lte=timezone.now()).values_list('id', flat=True)
+            publish_events_chunk(list(due))
+
+        return self.rolled_back(publish, repeat, setup=drafts)
+
+    def bench_update_weather(self, repeat, images):
+        location_ids = list(Location.objects.filter(events__status='published').distinct().values_list('id', flat=True))
+        with StubOpenMeteoServer() as server, override_settings(WEATHER_API_URL=server.url):
+            return self.rolled_back(lambda: update_weather_chunk(location_ids), repeat)
+
+    def compare(self, report, baseline, options):
+        regressions = find_regressions(
+            report['results'], baseline.get('results', {}), options['threshold'], options['min_delta_ms'],
+        )
+        base_meta = baseline.get('meta', {})
+        for key in ('vendor', 'events', 'seed'):
+            if base_meta.get(key) != report['meta'][key]:
+                self.stderr.write(self.style.WARNING(
+                    f"Baseline {key} differs: {base_meta.get(key)} != {report['meta'][key]}"
+                ))
+        for name, was, now in regressions:
+            self.stderr.write(self.style.ERROR(f"{name}: {was} ms -> {now} ms"))
+        if regressions:
+            raise CommandError(f"Регрессия производительности: {', '.join(name for name, _, _ in regressions)}")
+        self.stderr.write(self.style.SUCCESS(
+            f"No regressions against baseline {base_meta.get('commit') or ''}".rstrip()
+        ))
@@ -0,0 +1,136 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory
+
+from events.pagination import KeysetPagination
+from events.views import EventViewSet
+
+# Запросы анонимного списка мероприятий, которые должны обслуживаться индексами:
+# (название, параметры, страница читается в порядке индекса без сортировки)
+SCENARIOS = [
+    ("список (по названию)", {}, True),
+    ("сортировка по дате начала", {'ordering': '-start_date'}, True),
+    ("сортировка по дате завершения", {'ordering': 'end_date'}, True),
+    ("диапазон дат начала", {'start_date_after': '2026-01-01', 'start_date_before': '2026-02-01'}, False),
+    ("диапазон дат завершения", {'end_date_after': '2026-01-01', 'end_date_before': '2026-02-01'}, False),
+    ("диапазон рейтинга", {'rating_min': 20, 'rating_max': 25}, False),
+    ("курсор по дате начала", {'pagination': 'cursor', 'ordering': '-start_date'}, True),
+    ("рядом с точкой", {'near': '55.75,37.62', 'radius': 5, 'ordering': 'distance'}, False),
+]
+# Полнотекстовый индекс есть только в PostgreSQL; результаты сортируются по релевантности
+POSTGRES_SCENARIOS = [
+    ("поиск", {'search': 'концерт'}, False),
+]
+TABLE = 'events_event'
+
+
+class Command(BaseCommand):
+    help = (
+        "EXPLAIN для запросов списка мероприятий с основными фильтрами и "
+        "сортировками; сообщает о последовательном чтении таблицы мероприятий "
+        "и о сортировке страницы, которую должен был обслужить индекс"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fail', action='store_true', help="Код ошибки, если найдено последовательное чтение")
+
+    def handle(self, *args, **options):
+        scenarios = SCENARIOS
+        if connection.vendor == 'postgresql':
+            scenarios = SCENARIOS + POSTGRES_SCENARIOS
+
+        flagged = []
+        for name, params, ordered in scenarios:
+            for label, queryset in self.listing_queries(params):
+                plan = self.explain(queryset)
+                problem = None
+                if self.is_seq_scan(plan):
+                    problem = "SEQ SCAN"
+                elif ordered and label != "подсчёт" and self.is_sorted(plan):
+                    # Страница сортируется целиком: подходящего индекса нет
+                    problem = "SORT"
+                elif label == "страница по курсору" and not self.is_range_scan(plan, params['ordering']):
+                    # Индекс читается с начала, строки до курсора отбрасываются фильтром
+                    problem = "INDEX SCAN FROM START"
+                if problem:
+                    flagged.append(name)
+                if problem or options['verbosity'] > 1:
+                    style = self.style.ERROR if problem else self.style.SUCCESS
+                    self.stdout.write(style(f"{name}, {label}: {problem or 'OK'}"))
+                    self.stdout.write("\n".join(f"    {line}" for line in plan.splitlines()))
+
+        if flagged:
+            message = f"Запросы без подходящего индекса: {', '.join(sorted(set(flagged)))}"
+            if options['fail']:
+                raise CommandError(message)
+            self.stdout.write(self.style.WARNING(message))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Checked {len(scenarios)} scenarios, all served by indexes"))
+
+    def listing_queries(self, params):
+        """
+        Запросы, которые список мероприятий выполнит для анонимного запроса
+        с параметрами params: подсчёт и страница (или страница по курсору).
+        """
+        view = EventViewSet(action_map={'get': 'list'}, args=(), kwargs={}, format_kwarg=None)
+        request = view.initialize_request(APIRequestFactory().get('/api/events/', params))
+        view.request = request
+        queryset = view.filter_queryset(view.get_queryset())
+
+        paginator = view.paginator
+        if isinstance(paginator, KeysetPagination):
+            paginator.ordering = paginator.get_ordering(request, view)
+            tie_break = '-id' if paginator.ordering.startswith('-') else 'id'
+            page = queryset.order_by(paginator.ordering, tie_break)
+            # Глубокая страница: курсор посреди каталога
+            field = queryset.model._meta.get_field(paginator.ordering.lstrip('-'))
+            value = timezone.now() if field.get_internal_type() == 'DateTimeField' else 'м'
+            return [
+                ("страница", page[:paginator.page_size]),
+                ("страница по курсору", paginator.after(page, value, 0)[:paginator.page_size]),
+            ]
+        return [
+            # COUNT(*) читает те же строки, что и выборка без сортировки
+            ("подсчёт", queryset.order_by().values('pk')),
+            ("страница", queryset[:paginator.page_size]),
+        ]
+
+    def explain(self, queryset):
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                # На маленькой таблице планировщик и так выберет Seq Scan;
+                # с запретом он останется в плане, только если индекса нет
+                with connection.cursor() as cursor:
+                    cursor.execute("SET LOCAL enable_seqscan = off")
+            return queryset.explain()
+
+    def is_seq_scan(self, plan):
+        for line in plan.splitlines():
+            if f"Seq Scan on {TABLE}" in line:
+                return True
+            # SQLite: "SCAN events_event" без "USING ... INDEX"
+            if f"SCAN {TABLE}" in line and 'INDEX' not in line:
+                return True
+        return False
+
+    def is_range_scan(self, plan, ordering):
+        """
+        Чтение индекса начинается с ключа курсора, а не с начала индекса:
+        граница со стороны курсора (> при возрастании, < при убывании) —
+        условие индекса (PostgreSQL) или поиска по индексу (SQLite)
+        """
+        field = ordering.lstrip('-')
+        bound = '<' if ordering.startswith('-') else '>'
+        return any(
+            ('Index Cond' in line and f"{field} {bound}" in line)
+            or (f"SEARCH {TABLE}" in line and f"{field}{bound}" in line)
+            for line in plan.splitlines()
+        )
+
+    def is_sorted(self, plan):
+        return any(
+            line.strip().lstrip('->').strip().startswith(('Sort ', 'Incremental Sort '))
+            or 'TEMP B-TREE FOR ORDER BY' in line
+            for line in plan.splitlines()
+        )
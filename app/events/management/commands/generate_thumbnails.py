@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from events.models import EventImage
+from events.tasks import generate_thumbnails_task
+
+
+class Command(BaseCommand):
+    help = "Ставит в очередь создание превью для необработанных изображений"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="Пересоздать превью всех изображений")
+
+    def handle(self, *args, **options):
+        images = EventImage.objects.all()
+        if not options['all']:
+            images = images.exclude(status='ready')
+
+        count = 0
+        for image_id in images.values_list('id', flat=True).iterator():
+            generate_thumbnails_task.delay(image_id)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f"Queued {count} images"))
@@ -0,0 +1,51 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from events.benchmarks import load_test
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагрузочный тест запущенного сервера: GET-запросы к каждому URL при "
+        "разной конкурентности. Например, синхронный список на WSGI против "
+        "async-списка на ASGI: "
+        "loadtest http://localhost:8000/api/events/ http://localhost:8001/api/async/events/"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('urls', nargs='+', help="Адреса для сравнения")
+        parser.add_argument('--concurrency', default='1,8,32,64',
+                            help="Уровни конкурентности через запятую")
+        parser.add_argument('--requests', type=int, default=500, help="Запросов на каждый уровень")
+        parser.add_argument('--header', action='append', default=[],
+                            help="Заголовок запроса \"Имя: значение\" (можно несколько)")
+        parser.add_argument('--output', help="Файл для результатов JSON")
+
+    def handle(self, *args, **options):
+        try:
+            levels = [int(level) for level in options['concurrency'].split(',')]
+        except ValueError:
+            raise CommandError("--concurrency: ожидаются целые числа через запятую")
+        headers = dict(
+            (name.strip(), value.strip())
+            for name, _, value in (header.partition(':') for header in options['header'])
+        )
+
+        results = []
+        for url in options['urls']:
+            # Прогрев: соединения с БД, импорт модулей в воркерах
+            load_test(url, max(levels), max(levels), headers)
+            for level in levels:
+                result = {'url': url, **load_test(url, level, options['requests'], headers)}
+                results.append(result)
+                self.stdout.write(json.dumps(result))
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+        failed = sum(result['errors'] for result in results)
+        if failed:
+            self.stdout.write(self.style.WARNING(f"{failed} requests failed"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Completed {len(results)} runs"))
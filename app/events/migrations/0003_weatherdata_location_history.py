@@ -0,0 +1,41 @@
+# Generated by Django 4.2 on 2026-10-17 10:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def move_weather_to_locations(apps, schema_editor):
+    """Оставляет одно (последнее) показание на место проведения"""
+    WeatherData = apps.get_model('events', 'WeatherData')
+    Location = apps.get_model('events', 'Location')
+    db = schema_editor.connection.alias
+
+    latest = {}
+    for weather in WeatherData.objects.using(db).select_related('event').order_by('created_at', 'id'):
+        latest[weather.event.location_id] = weather.id
+
+    WeatherData.objects.using(db).exclude(id__in=latest.values()).delete()
+    for location_id, weather_id in latest.items():
+        WeatherData.objects.using(db).filter(id=weather_id).update(location_id=location_id)
+        Location.objects.using(db).filter(id=location_id).update(current_weather_id=weather_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0002_eventimage_thumbnail_alter_event_rating_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='weatherdata',
+            name='location',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='weather_history', to='events.location'),
+        ),
+        migrations.AddField(
+            model_name='location',
+            name='current_weather',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='events.weatherdata'),
+        ),
+        migrations.RunPython(move_weather_to_locations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2 on 2026-10-17 10:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0003_weatherdata_location_history'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='weatherdata',
+            name='event',
+        ),
+        migrations.AlterField(
+            model_name='weatherdata',
+            name='location',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='weather_history', to='events.location'),
+        ),
+        migrations.AddIndex(
+            model_name='weatherdata',
+            index=models.Index(fields=['location', 'created_at'], name='weather_location_time_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2 on 2026-10-17 11:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0004_remove_weatherdata_event_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='publish_at',
+            field=models.DateTimeField(blank=True, help_text='Черновик будет опубликован автоматически в указанное время', null=True, verbose_name='Дата автопубликации'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(condition=models.Q(('status', 'draft')), fields=['publish_at'], name='event_draft_publish_at_idx'),
+        ),
+    ]
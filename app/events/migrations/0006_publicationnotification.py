@@ -0,0 +1,27 @@
+# Generated by Django 4.2 on 2026-10-17 13:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0005_event_publish_at_event_event_draft_publish_at_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PublicationNotification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='Отправлено')),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to='events.event')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='publicationnotification',
+            constraint=models.UniqueConstraint(condition=models.Q(('sent_at__isnull', True)), fields=('event',), name='unique_pending_notification'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2 on 2026-10-17 16:20
+
+from django.db import migrations, models
+
+
+def mark_existing_ready(apps, schema_editor):
+    """Изображения со старыми превью уже обработаны"""
+    EventImage = apps.get_model('events', 'EventImage')
+    EventImage.objects.using(schema_editor.connection.alias).exclude(thumbnail__isnull=True).exclude(thumbnail='').update(status='ready')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0006_publicationnotification'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='eventimage',
+            name='status',
+            field=models.CharField(choices=[('processing', 'Обработка'), ('ready', 'Готово'), ('failed', 'Ошибка')], default='processing', max_length=10, verbose_name='Статус обработки'),
+        ),
+        migrations.AddField(
+            model_name='eventimage',
+            name='variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='{размер: {формат: файл}}', verbose_name='Превью всех размеров'),
+        ),
+        migrations.RunPython(mark_existing_ready, migrations.RunPython.noop),
+    ]
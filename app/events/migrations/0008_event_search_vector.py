@@ -0,0 +1,78 @@
+# Generated by Django 4.2 on 2026-10-17 17:45
+
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+# Только PostgreSQL: на других СУБД (SQLite в тестах) поиск идёт через ILIKE.
+# Расширение pg_trgm создаёт TrigramExtension; если у роли приложения нет прав
+# на CREATE EXTENSION, администратор БД заранее выполняет
+# "CREATE EXTENSION pg_trgm;" (см. README), и операция его пропускает.
+SEARCH_SQL = """
+CREATE OR REPLACE FUNCTION events_event_search_vector() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('simple', coalesce(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(
+            (SELECT name FROM events_location WHERE id = NEW.location_id), '')), 'B') ||
+        setweight(to_tsvector('simple', coalesce(NEW.description, '')), 'C');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER events_event_search_vector_update
+    BEFORE INSERT OR UPDATE OF title, description, location_id ON events_event
+    FOR EACH ROW EXECUTE FUNCTION events_event_search_vector();
+
+-- Переименование места пересчитывает векторы его мероприятий
+CREATE OR REPLACE FUNCTION events_location_search_vector() RETURNS trigger AS $$
+BEGIN
+    IF NEW.name IS DISTINCT FROM OLD.name THEN
+        UPDATE events_event SET title = title WHERE location_id = NEW.id;
+    END IF;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER events_location_search_vector_update
+    AFTER UPDATE OF name ON events_location
+    FOR EACH ROW EXECUTE FUNCTION events_location_search_vector();
+
+UPDATE events_event SET title = title;
+
+CREATE INDEX event_search_vector_idx ON events_event USING gin (search_vector);
+CREATE INDEX event_title_trgm_idx ON events_event USING gin (title gin_trgm_ops);
+"""
+
+DROP_SEARCH_SQL = """
+DROP INDEX IF EXISTS event_title_trgm_idx;
+DROP INDEX IF EXISTS event_search_vector_idx;
+DROP TRIGGER IF EXISTS events_location_search_vector_update ON events_location;
+DROP FUNCTION IF EXISTS events_location_search_vector();
+DROP TRIGGER IF EXISTS events_event_search_vector_update ON events_event;
+DROP FUNCTION IF EXISTS events_event_search_vector();
+"""
+
+
+def postgres_only(sql):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor == 'postgresql':
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0007_eventimage_status_eventimage_variants'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='event',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(postgres_only(SEARCH_SQL), postgres_only(DROP_SEARCH_SQL)),
+    ]
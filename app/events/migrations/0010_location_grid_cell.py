@@ -0,0 +1,40 @@
+# Generated by Django 4.2 on 2026-10-17 19:40
+
+from django.db import migrations, models
+
+# Сетка на момент миграции (events.geo): 0.1°, 3600 столбцов, 1800 строк.
+# Копия, а не импорт — миграция не должна меняться вместе с кодом приложения
+GRID_CELL_DEGREES = 0.1
+GRID_COLUMNS = 3600
+GRID_ROWS = 1800
+
+
+def grid_cell(lat, lon):
+    row = min(int((float(lat) + 90) // GRID_CELL_DEGREES), GRID_ROWS - 1)
+    column = int((float(lon) + 180) // GRID_CELL_DEGREES) % GRID_COLUMNS
+    return row * GRID_COLUMNS + column
+
+
+def fill_grid_cells(apps, schema_editor):
+    Location = apps.get_model('events', 'Location')
+    db = schema_editor.connection.alias
+    locations = list(Location.objects.using(db).only('id', 'lat', 'lon'))
+    for location in locations:
+        location.grid_cell = grid_cell(location.lat, location.lon)
+    Location.objects.using(db).bulk_update(locations, ['grid_cell'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0009_event_published_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='location',
+            name='grid_cell',
+            field=models.IntegerField(db_index=True, editable=False, null=True),
+        ),
+        migrations.RunPython(fill_grid_cells, migrations.RunPython.noop),
+    ]
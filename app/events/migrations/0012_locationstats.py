@@ -0,0 +1,25 @@
+# Generated by Django 4.2 on 2026-10-17 21:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0011_uploadsession'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LocationStats',
+            fields=[
+                ('location', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='events.location')),
+                ('published', models.IntegerField(default=0, verbose_name='Опубликовано')),
+                ('drafts', models.IntegerField(default=0, verbose_name='Черновиков')),
+                ('upcoming', models.IntegerField(default=0, verbose_name='Предстоящих')),
+                ('rating_sum', models.BigIntegerField(default=0, verbose_name='Сумма рейтингов')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
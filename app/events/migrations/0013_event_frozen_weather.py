@@ -0,0 +1,19 @@
+# Generated by Django 4.2 on 2026-10-17 22:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0012_locationstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='frozen_weather',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='events.weatherdata'),
+        ),
+    ]
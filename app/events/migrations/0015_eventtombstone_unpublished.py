@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-17 22:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0014_event_updated_at_eventtombstone'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='eventtombstone',
+            name='unpublished',
+            field=models.BooleanField(default=False),
+        ),
+    ]
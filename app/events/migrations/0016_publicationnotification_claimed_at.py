@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-17 22:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0015_eventtombstone_unpublished'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='publicationnotification',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Взято в отправку'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-17 23:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0016_publicationnotification_claimed_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(condition=models.Q(('frozen_weather__isnull', True), ('status', 'published')), fields=['end_date', 'id'], name='event_unfrozen_end_date_idx'),
+        ),
+    ]
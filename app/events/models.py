@@ -1,10 +1,12 @@
-import os
-from django.db import models
+import uuid
+from django.db import connections, models
+from django.utils import timezone
+from .signals import bulk_changed
 from django.contrib.auth.models import User
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator, MaxValueValidator
-from io import BytesIO
-from django.core.files.base import ContentFile
-from PIL import Image
+from .thumbnails import generate_variants
+from .geo import grid_cell
 
 class Location(models.Model):
     name = models.CharField("Название места", max_length=255)
@@ -20,10 +22,64 @@ class Location(models.Model):
         decimal_places=6,
         help_text="Географическая широта/долгота в десятичном формате"        
         )
+    # Последнее показание погоды из истории WeatherData
+    current_weather = models.ForeignKey(
+        'WeatherData',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name='+',
+    )
+    # Ячейка сетки по координатам (см. geo.py) для поиска мест рядом с точкой
+    grid_cell = models.IntegerField(null=True, editable=False, db_index=True)
+
+    def save(self, *args, **kwargs):
+        self.grid_cell = grid_cell(self.lat, self.lon)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'lat', 'lon'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'grid_cell'}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.name
 
+class EventManager(models.Manager):
+    def publish_due(self, now=None, ids=None):
+        """
+        Публикует черновики, у которых наступило время publish_at.
+
+        Один запрос UPDATE ... RETURNING по частичному индексу черновиков;
+        возвращает список id опубликованных мероприятий. Сигналы модели
+        не отправляются. Метод менеджера, а не QuerySet: условия выборки
+        в запрос не попадают, ограничить публикацию можно только через ids.
+        """
+        connection = connections[self.db]
+        qn = connection.ops.quote_name
+        now = connection.ops.adapt_datetimefield_value(now or timezone.now())
+
+        sql = (
+            f"UPDATE {qn(self.model._meta.db_table)} SET {qn('status')} = %s "
+            f"WHERE {qn('status')} = %s AND {qn('publish_at')} <= %s"
+        )
+        params = ['published', 'draft', now]
+        if ids is not None:
+            ids = list(ids)
+            if not ids:
+                return []
+            sql += f" AND {qn('id')} IN ({', '.join(['%s'] * len(ids))})"
+            params += ids
+        sql += f" RETURNING {qn('id')}"
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            published = [row[0] for row in cursor.fetchall()]
+
+        if published:
+            bulk_changed.send(sender=self.model, ids=published)
+        return published
+
+
 class Event(models.Model):
     STATUS_CHOICES = [
         ('draft', 'Черновик'),
@@ -35,6 +91,15 @@ class Event(models.Model):
     
     
     pub_date = models.DateTimeField("Дата публикации", auto_now_add=True)
+    # Любое изменение, видимое в API: также изображения, место и его погода
+    # (см. sync.py). Массовые изменения обновляют его через bulk_changed
+    updated_at = models.DateTimeField("Изменено", auto_now=True)
+    publish_at = models.DateTimeField(
+        "Дата автопубликации",
+        null=True,
+        blank=True,
+        help_text="Черновик будет опубликован автоматически в указанное время"
+    )
     start_date = models.DateTimeField("Дата начала проведения")
     end_date = models.DateTimeField("Дата завершения проведения")
     
@@ -55,53 +120,114 @@ class Event(models.Model):
         help_text="Опубликованные мероприятия видны всем, черновики — только админам"
     )
 
+    # Последнее показание погоды до окончания: у прошедшего мероприятия
+    # погода больше не обновляется (см. weather_refresh.py)
+    frozen_weather = models.ForeignKey(
+        'WeatherData',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name='+',
+    )
+
+    # Поддерживается триггером PostgreSQL (миграция 0008): название, место, описание
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = EventManager()
+
+    # Поля, от которых зависит сводная статистика мест (см. stats.py)
+    STATS_FIELDS = ('status', 'location_id', 'rating', 'start_date')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Значения на момент загрузки: при сохранении статистика меняется на разницу
+        if instance.get_deferred_fields().isdisjoint(cls.STATS_FIELDS):
+            instance._stats_loaded = tuple(getattr(instance, name) for name in cls.STATS_FIELDS)
+        return instance
+
+    class Meta:
+        indexes = [
+            # Только черновики: индекс для автопубликации остаётся маленьким
+            models.Index(
+                fields=['publish_at'],
+                name='event_draft_publish_at_idx',
+                condition=models.Q(status='draft'),
+            ),
+            # Анонимы видят только опубликованные: индексы под сортировки
+            # списка (id — для постраничного вывода по ключу) и фильтры EventFilter
+            models.Index(
+                fields=['title', 'id'],
+                name='event_pub_title_idx',
+                condition=models.Q(status='published'),
+            ),
+            models.Index(
+                fields=['start_date', 'id'],
+                name='event_pub_start_date_idx',
+                condition=models.Q(status='published'),
+            ),
+            models.Index(
+                fields=['end_date', 'id'],
+                name='event_pub_end_date_idx',
+                condition=models.Q(status='published'),
+            ),
+            models.Index(
+                fields=['rating', 'start_date'],
+                name='event_pub_rating_idx',
+                condition=models.Q(status='published'),
+            ),
+            # Закончившиеся мероприятия, которым ещё нужно зафиксировать погоду
+            models.Index(
+                fields=['end_date', 'id'],
+                name='event_unfrozen_end_date_idx',
+                condition=models.Q(status='published', frozen_weather__isnull=True),
+            ),
+            # Лента изменений (sync): по всем статусам — скрытые анонимам
+            # мероприятия отдаются им как удалённые
+            models.Index(fields=['updated_at', 'id'], name='event_updated_at_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
+    @property
+    def weather(self):
+        """У прошедшего мероприятия — зафиксированное показание, иначе текущее в месте проведения"""
+        if self.frozen_weather_id is not None and self.end_date < timezone.now():
+            return self.frozen_weather
+        return self.location.current_weather
+
 class EventImage(models.Model):
+    STATUS_CHOICES = [
+        ('processing', 'Обработка'),
+        ('ready', 'Готово'),
+        ('failed', 'Ошибка'),
+    ]
+
     event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='images')
     image = models.ImageField("Изображение", upload_to='events/')
     thumbnail = models.ImageField("Превью", upload_to='events/thumbnails/', editable=False, null=True)
+    # Превью создаются в фоне задачей generate_thumbnails_task
+    status = models.CharField("Статус обработки", max_length=10, choices=STATUS_CHOICES, default='processing')
+    variants = models.JSONField(
+        "Превью всех размеров",
+        default=dict,
+        blank=True,
+        editable=False,
+        help_text="{размер: {формат: файл}}"
+    )
 
-    def save(self, *args, **kwargs):
-        if self.image and not self.thumbnail:
-            self.thumbnail = self.make_thumbnail(self.image)
-        super().save(*args, **kwargs)
+    def make_thumbnails(self):
+        variants = generate_variants(self.image)
+        smallest = variants[min(variants, key=int)]
+        self.variants = variants
+        self.thumbnail = next(name for ext, name in smallest.items() if ext != 'webp')
+        self.status = 'ready'
 
-    def make_thumbnail(self, image):
-        img = Image.open(image)
-        
-        # Уменьшение до 200px
-        width, height = img.size
-        if width < height:
-            new_width = 200
-            new_height = int(height * (200 / width))
-        else:
-            new_height = 200
-            new_width = int(width * (200 / height))
-            
-        img.thumbnail((new_width, new_height), Image.LANCZOS)
-
-        thumb_name, thumb_extension = os.path.splitext(image.name)
-        thumb_extension = thumb_extension.lower()
-        thumb_filename = f"{thumb_name}_thumb{thumb_extension}"
-
-        if thumb_extension in ['.jpg', '.jpeg']:
-            FTYPE = 'JPEG'
-        elif thumb_extension == '.png':
-            FTYPE = 'PNG'
-        else:
-            return None
-
-        temp_thumb = BytesIO()
-        img.save(temp_thumb, FTYPE)
-        temp_thumb.seek(0)
-
-        # Сохранение в thumbnail
-        return ContentFile(temp_thumb.read(), name=thumb_filename)
-    
 class WeatherData(models.Model):
-    event = models.OneToOneField(Event, on_delete=models.CASCADE, related_name='weather')
+    """Показание погоды в месте проведения (временной ряд)"""
+    location = models.ForeignKey(Location, on_delete=models.CASCADE, related_name='weather_history')
     temperature = models.FloatField("Температура (°C)")
     humidity = models.FloatField("Влажность (%)")
     pressure = models.FloatField("Давление (мм рт. ст.)")
@@ -109,5 +235,99 @@ class WeatherData(models.Model):
     wind_speed = models.FloatField("Скорость ветра (м/с)")
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['location', 'created_at'], name='weather_location_time_idx'),
+        ]
+
+    def __str__(self):
+        return f"Погода для {self.location.name}"
+
+class LocationStats(models.Model):
+    """
+    Сводка по мероприятиям места: обновляется на разницу при каждом
+    изменении мероприятия и сверяется с таблицей мероприятий задачей
+    reconcile_location_stats
+    """
+    location = models.OneToOneField(Location, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    # Счётчики без CHECK >= 0: расхождение не должно ломать сохранение мероприятия
+    published = models.IntegerField("Опубликовано", default=0)
+    drafts = models.IntegerField("Черновиков", default=0)
+    # Опубликованные, которые ещё не начались (с точностью до запуска roll_upcoming_stats)
+    upcoming = models.IntegerField("Предстоящих", default=0)
+    # Сумма рейтингов опубликованных: средний рейтинг = rating_sum / published
+    rating_sum = models.BigIntegerField("Сумма рейтингов", default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Статистика {self.location_id}"
+
+class EventTombstone(models.Model):
+    """
+    Запись об удалённом или снятом с публикации мероприятии для ленты
+    изменений; хранится SYNC_TOMBSTONE_DAYS дней (задача prune_event_tombstones)
+    """
+    # Не ForeignKey: мероприятия уже нет
+    event_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now)
+    # Снято с публикации, а не удалено: исчезает только у анонимов
+    unpublished = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['deleted_at', 'id'], name='tombstone_deleted_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"Удалено мероприятие {self.event_id}"
+
+class PublicationNotification(models.Model):
+    """Очередь уведомлений о публикации мероприятий"""
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='notifications')
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField("Отправлено", null=True, blank=True)
+    # Взято отправителем: письмо отправляется вне транзакции, другие его не берут
+    claimed_at = models.DateTimeField("Взято в отправку", null=True, blank=True, editable=False)
+
+    class Meta:
+        constraints = [
+            # Не больше одного неотправленного уведомления на мероприятие
+            models.UniqueConstraint(
+                fields=['event'],
+                condition=models.Q(sent_at__isnull=True),
+                name='unique_pending_notification',
+            ),
+        ]
+
+    def __str__(self):
+        return f"Уведомление для {self.event_id}"
+
+class UploadSession(models.Model):
+    """Загрузка изображения мероприятия частями с возможностью продолжения"""
+    STATUS_CHOICES = [
+        ('uploading', 'Загружается'),
+        ('complete', 'Завершена'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='upload_sessions')
+    created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    filename = models.CharField("Имя файла", max_length=255)
+    content_type = models.CharField("Тип содержимого", max_length=100)
+    size = models.PositiveBigIntegerField("Размер (байт)")
+    # Сколько байт уже записано: следующая часть начинается с этого смещения
+    offset = models.PositiveBigIntegerField("Получено (байт)", default=0, editable=False)
+    status = models.CharField("Статус", max_length=10, choices=STATUS_CHOICES, default='uploading')
+    image = models.OneToOneField(
+        EventImage,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name='upload_session',
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
     def __str__(self):
-        return f"Погода для {self.event.title}"
\ No newline at end of file
+        return f"Загрузка {self.filename} ({self.offset}/{self.size})"
@@ -0,0 +1,110 @@
+"""Уведомления о публикации мероприятий."""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import PublicationNotification
+
+FLUSH_SCHEDULED_KEY = 'events:notifications:flush-scheduled'
+
+
+def notify_published(event_ids):
+    """
+    Ставит в очередь уведомления о публикации мероприятий.
+
+    Повторные вызовы для одного мероприятия не создают дублей, пока
+    уведомление не отправлено. Отправка планируется после коммита.
+    """
+    PublicationNotification.objects.bulk_create(
+        [PublicationNotification(event_id=event_id) for event_id in event_ids],
+        ignore_conflicts=True,
+    )
+    transaction.on_commit(schedule_flush)
+
+
+def schedule_flush():
+    """Одна отложенная отправка на все уведомления за EMAIL_BATCH_DELAY секунд"""
+    from .tasks import send_publication_emails_task
+
+    if cache.add(FLUSH_SCHEDULED_KEY, 1, timeout=settings.EMAIL_BATCH_DELAY):
+        send_publication_emails_task.apply_async(countdown=settings.EMAIL_BATCH_DELAY)
+
+
+def build_message(event):
+    return EmailMessage(
+        subject=f"Опубликовано: {event.title}",
+        body=f"Мероприятие {event.title} теперь доступно для всех.",
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=settings.EVENT_NOTIFICATION_RECIPIENTS,
+    )
+
+
+def claim_batch():
+    """
+    До EMAIL_BATCH_SIZE неотправленных уведомлений, отмеченных как взятые
+    в отправку. Транзакция короткая и не ждёт почтовый сервер; пачки,
+    взятые больше EMAIL_CLAIM_TIMEOUT секунд назад (отправитель упал),
+    берутся снова
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.EMAIL_CLAIM_TIMEOUT)
+    with transaction.atomic():
+        # skip_locked: параллельные отправители не берут одни и те же письма
+        batch = list(
+            PublicationNotification.objects
+            .filter(Q(claimed_at__isnull=True) | Q(claimed_at__lt=stale), sent_at__isnull=True)
+            .select_related('event')
+            .select_for_update(skip_locked=True, of=('self',))
+            .order_by('id')[:settings.EMAIL_BATCH_SIZE]
+        )
+        PublicationNotification.objects.filter(id__in=[n.id for n in batch]).update(claimed_at=now)
+    return batch
+
+
+def send_pending_notifications():
+    """
+    Отправляет накопившиеся уведомления пачками по EMAIL_BATCH_SIZE.
+
+    Все письма уходят через одно соединение с почтовым бэкендом, вне
+    транзакции; перед каждым письмом темп ограничивается EMAIL_RATE_LIMIT
+    писем в секунду (0 — без ограничения). Отправленные отмечаются, даже
+    если почтовый сервер отказал посреди пачки, остальные возвращаются в
+    очередь. Возвращает количество отправленных писем.
+    """
+    # Уведомления, пришедшие во время отправки, запланируют новую
+    cache.delete(FLUSH_SCHEDULED_KEY)
+
+    sent = 0
+    started = time.monotonic()
+    connection = None
+    try:
+        while batch := claim_batch():
+            # Соединение открывается один раз и только если есть что отправлять
+            if connection is None:
+                connection = get_connection(fail_silently=False)
+                connection.open()
+            delivered = []
+            try:
+                for notification in batch:
+                    if settings.EMAIL_RATE_LIMIT:
+                        ahead = sent / settings.EMAIL_RATE_LIMIT - (time.monotonic() - started)
+                        if ahead > 0:
+                            time.sleep(ahead)
+                    connection.send_messages([build_message(notification.event)])
+                    delivered.append(notification.id)
+                    sent += 1
+            finally:
+                PublicationNotification.objects.filter(id__in=delivered).update(sent_at=timezone.now())
+                PublicationNotification.objects.filter(
+                    id__in=[n.id for n in batch]
+                ).exclude(id__in=delivered).update(claimed_at=None)
+    finally:
+        if connection is not None:
+            connection.close()
+    return sent
@@ -0,0 +1,139 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def item_value(item, name):
+    """Значение поля из модели или из строки values()"""
+    return item[name] if isinstance(item, dict) else getattr(item, name)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Постраничный вывод по ключу (поле сортировки, id).
+
+    Следующая страница выбирается условием WHERE по последней строке
+    предыдущей, без COUNT(*) и OFFSET: чтение индекса (поле, id) начинается
+    с этой строки, поэтому стоимость страницы не зависит от глубины. Сортировка берётся из параметра `ordering`
+    (только поля из `ordering_fields` представления), id разрешает
+    совпадения значений.
+    """
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    cursor_query_param = 'cursor'
+    ordering_param = api_settings.ORDERING_PARAM
+    invalid_cursor_message = 'Неверный курсор'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.size = self.get_page_size(request)
+        self.ordering = self.get_ordering(request, view)
+        field = self.ordering.lstrip('-')
+        descending = self.ordering.startswith('-')
+        self.field = queryset.model._meta.get_field(field)
+
+        queryset = queryset.order_by(self.ordering, '-id' if descending else 'id')
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            queryset = self.after(queryset, *cursor)
+
+        # Одна лишняя строка показывает, есть ли следующая страница
+        results = list(queryset[:self.size + 1])
+        self.has_next = len(results) > self.size
+        results = results[:self.size]
+        self.last = results[-1] if results else None
+        return results
+
+    def after(self, queryset, value, last_id):
+        """
+        Строки после ключа (value, last_id) в порядке self.ordering. Условие
+        на само поле (>= или <=) — граница диапазона чтения индекса; по OR
+        СУБД отбрасывает лишь строки с тем же значением, а не всё начало индекса
+        """
+        field = self.ordering.lstrip('-')
+        descending = self.ordering.startswith('-')
+        lookup = 'lt' if descending else 'gt'
+        return queryset.filter(
+            Q(**{f'{field}__{lookup}e': value}),
+            Q(**{f'{field}__{lookup}': value}) | Q(**{field: value, f'id__{lookup}': last_id}),
+        )
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def get_ordering(self, request, view):
+        # Только поля модели: по вычисляемым (distance) ключ не построить
+        model = view.queryset.model
+        allowed = [
+            name for name in getattr(view, 'ordering_fields', None) or []
+            if any(field.name == name for field in model._meta.concrete_fields)
+        ]
+        for term in request.query_params.get(self.ordering_param, '').split(','):
+            term = term.strip()
+            if term.lstrip('-') in allowed:
+                return term
+        default = getattr(view, 'ordering', None) or ['id']
+        return default[0]
+
+    def encode_cursor(self, item):
+        value = item_value(item, self.ordering.lstrip('-'))
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        payload = json.dumps({'o': self.ordering, 'v': value, 'i': item_value(item, 'id')})
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            if payload['o'] != self.ordering:
+                raise ValueError
+            value = self.field.to_python(payload['v'])
+            last_id = int(payload['i'])
+        except (binascii.Error, ValidationError, ValueError, TypeError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        if value is None:
+            raise NotFound(self.invalid_cursor_message)
+        return value, last_id
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.last))
+
+    def get_first_link(self):
+        return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'first': self.get_first_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'first': {'type': 'string', 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,93 @@
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core.db_router import note_write
+from . import stats, sync
+from .cache import bump_generation
+from .models import Event, EventImage, Location, WeatherData
+from .signals import bulk_changed
+
+CACHED_MODELS = (Event, Location, EventImage, WeatherData)
+
+
+@receiver(post_save)
+@receiver(post_delete)
+@receiver(bulk_changed)
+def invalidate_api_cache(sender, **kwargs):
+    if sender in CACHED_MODELS:
+        # После фиксации: чтение между сменой поколения и фиксацией закэшировало
+        # бы старые данные под новым поколением
+        transaction.on_commit(lambda: (bump_generation(sender), note_write()))
+
+
+@receiver(post_save, sender=Event)
+def update_stats_on_save(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        stats.event_saved(instance, created)
+
+
+@receiver(post_delete, sender=Event)
+def update_stats_on_delete(sender, instance, **kwargs):
+    stats.event_deleted(instance)
+
+
+@receiver(bulk_changed, sender=Event)
+def refresh_stats_on_bulk_change(sender, ids=(), locations=(), **kwargs):
+    # Текущие места изменённых мероприятий и прежние (при переносе) — подзапросом
+    location_ids = Location.objects.filter(Q(events__id__in=ids) | Q(id__in=locations)).values('id')
+    stats.refresh_location_stats(location_ids)
+
+
+# Лента изменений: updated_at мероприятий меняется вместе со всем, что видно
+# в их представлении, удаление и снятие с публикации оставляют запись
+# EventTombstone. Всё пишется после фиксации транзакции (см. sync.py)
+
+@receiver(pre_save, sender=Event)
+def note_unpublishing(sender, instance, raw=False, **kwargs):
+    # Статус при загрузке; неизвестен — считаем, что мероприятие было видно
+    loaded = getattr(instance, '_stats_loaded', None)
+    instance._unpublishing = (
+        not raw and instance.pk is not None and instance.status != 'published'
+        and (loaded is None or loaded[0] == 'published')
+    )
+
+
+@receiver(post_save, sender=Event)
+def touch_saved_event(sender, instance, raw=False, **kwargs):
+    if not raw:
+        # auto_now — время сохранения, а не фиксации
+        sync.touch([instance.id])
+    if getattr(instance, '_unpublishing', False):
+        sync.record_deletion([instance.id], unpublished=True)
+
+
+@receiver(bulk_changed, sender=Event)
+def touch_events_on_bulk_change(sender, ids=(), unpublished=(), **kwargs):
+    sync.touch(ids)
+    if unpublished:
+        sync.record_deletion(unpublished, unpublished=True)
+
+
+@receiver(post_delete, sender=Event)
+def record_event_deletion(sender, instance, **kwargs):
+    sync.record_deletion([instance.id])
+
+
+@receiver(post_save, sender=EventImage)
+@receiver(post_delete, sender=EventImage)
+def touch_event_on_image_change(sender, instance, raw=False, **kwargs):
+    if not raw:
+        sync.touch([instance.event_id])
+
+
+@receiver(post_save, sender=Location)
+def touch_events_on_location_change(sender, instance, created, raw=False, **kwargs):
+    if not (created or raw):
+        sync.touch(locations=[instance.id])
+
+
+@receiver(bulk_changed, sender=Location)
+def touch_events_on_weather_change(sender, ids=(), **kwargs):
+    sync.touch(weather=ids)
@@ -1,6 +1,10 @@
 from rest_framework import serializers
 from drf_spectacular.utils import extend_schema_field, OpenApiTypes
-from .models import Location, Event, EventImage, WeatherData
+from django.conf import settings
+from django.core.files.storage import default_storage
+from .models import Location, LocationStats, Event, EventImage, WeatherData, UploadSession
+from .tasks import process_images
+from core.metrics import TimedSerializerMixin
 
 class WeatherSerializer(serializers.ModelSerializer):
     class Meta:
@@ -10,20 +14,38 @@ class WeatherSerializer(serializers.ModelSerializer):
             'wind_direction', 'wind_speed', 'created_at'
         ]
 
-class LocationSerializer(serializers.ModelSerializer):
+class LocationSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Location
         fields = ['id', 'name', 'lat', 'lon']
 
-class EventImageSerializer(serializers.ModelSerializer):
+class EventImageSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    variants = serializers.SerializerMethodField()
+
     class Meta:
         model = EventImage
-        fields = ['id', 'image', 'thumbnail']
+        fields = ['id', 'image', 'thumbnail', 'status', 'variants']
+
+    @extend_schema_field({
+        'type': 'object',
+        'additionalProperties': {'type': 'object', 'additionalProperties': {'type': 'string', 'format': 'uri'}},
+    })
+    def get_variants(self, obj):
+        """Ссылки на превью: {размер: {формат: url}}"""
+        request = self.context.get('request')
+        return {
+            size: {
+                ext: request.build_absolute_uri(default_storage.url(name)) if request else default_storage.url(name)
+                for ext, name in files.items()
+            }
+            for size, files in obj.variants.items()
+        }
 
-class EventSerializer(serializers.ModelSerializer):
+class EventSerializer(TimedSerializerMixin, serializers.ModelSerializer):
 
     images = EventImageSerializer(many=True, read_only=True)
-    weather = WeatherSerializer(read_only=True) 
+    # Последнее показание погоды в месте проведения (у прошедших — на момент окончания)
+    weather = WeatherSerializer(read_only=True)
 
     uploaded_images = serializers.ListField(
         child=serializers.ImageField(allow_empty_file=False, use_url=False),
@@ -33,13 +55,15 @@ class EventSerializer(serializers.ModelSerializer):
     )
 
     location_details = LocationSerializer(source='location', read_only=True)
+    # Только с фильтром near: расстояние до места проведения, км
+    distance = serializers.FloatField(read_only=True, required=False)
 
     class Meta:
         model = Event
         fields = [
             'id', 'title', 'description', 'images', 'uploaded_images', 
-            'pub_date', 'start_date', 'end_date', 'author', 
-            'location', 'location_details', 'weather',
+            'pub_date', 'updated_at', 'publish_at', 'start_date', 'end_date', 'author', 
+            'location', 'location_details', 'distance', 'weather',
             'rating', 'status'
         ]
         read_only_fields = ['author', 'pub_date', 'weather']
@@ -47,6 +71,66 @@ class EventSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         uploaded_images = validated_data.pop('uploaded_images', [])
         event = Event.objects.create(**validated_data)
-        for image in uploaded_images:
-            EventImage.objects.create(event=event, image=image)
-        return event
\ No newline at end of file
+        images = [EventImage.objects.create(event=event, image=image) for image in uploaded_images]
+        # Превью создаются в фоне, в ответе изображения в статусе processing
+        process_images(image.id for image in images)
+        return event
+
+class CachedLocationField(serializers.PrimaryKeyRelatedField):
+    """Место проведения из словаря context['locations'] вместо запроса на каждую строку"""
+
+    def to_internal_value(self, data):
+        locations = self.context.get('locations')
+        if locations is None:
+            return super().to_internal_value(data)
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            return locations[int(data)]
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        except KeyError:
+            self.fail('does_not_exist', pk_value=data)
+
+
+class EventBulkSerializer(serializers.ModelSerializer):
+    """Проверка одной операции пакетного изменения мероприятий"""
+    location = CachedLocationField(queryset=Location.objects.all())
+
+    class Meta:
+        model = Event
+        fields = [
+            'title', 'description', 'publish_at', 'start_date', 'end_date',
+            'location', 'rating', 'status',
+        ]
+
+
+class UploadSessionSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """Начало загрузки частями: размер и тип проверяются до получения данных"""
+
+    class Meta:
+        model = UploadSession
+        fields = ['id', 'event', 'filename', 'content_type', 'size', 'offset', 'status', 'image', 'created_at']
+        read_only_fields = ['status', 'image']
+
+    def validate_content_type(self, value):
+        if value not in settings.UPLOAD_ALLOWED_TYPES:
+            raise serializers.ValidationError(
+                f"Разрешены типы: {', '.join(settings.UPLOAD_ALLOWED_TYPES)}"
+            )
+        return value
+
+    def validate_size(self, value):
+        if not 0 < value <= settings.UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(f"Размер файла — от 1 до {settings.UPLOAD_MAX_SIZE} байт")
+        return value
+
+
+class LocationStatsSerializer(serializers.ModelSerializer):
+    """Сводка по месту проведения из LocationStats"""
+    name = serializers.CharField(source='location.name', read_only=True)
+    average_rating = serializers.FloatField(read_only=True, allow_null=True)
+
+    class Meta:
+        model = LocationStats
+        fields = ['location', 'name', 'published', 'drafts', 'upcoming', 'average_rating', 'updated_at']
@@ -0,0 +1,7 @@
+from django.dispatch import Signal
+
+# Массовые изменения в обход save()/delete(): bulk_create, bulk_update,
+# QuerySet.update и сырой SQL. sender — класс модели, ids — изменённые
+# записи; для Event необязательные locations — места, откуда мероприятия
+# были перенесены, и unpublished — снятые с публикации.
+bulk_changed = Signal()
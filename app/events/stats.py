@@ -0,0 +1,157 @@
+"""
+Сводная статистика мест проведения (LocationStats).
+
+Сохранение или удаление мероприятия меняет счётчики его места (и прежнего
+места при переносе) одним UPDATE ... SET x = x + d на разницу между
+значениями при загрузке и новыми. Массовые изменения (bulk_changed)
+пересчитывают только затронутые места. «Предстоящие» считаются
+относительно отметки времени: задача roll_upcoming_stats вычитает
+мероприятия, начавшиеся после неё, и сдвигает отметку. Пропавшая отметка
+(сброс кэша) и любые расхождения исправляются полной сверкой.
+"""
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from .models import Event, LocationStats
+
+UPCOMING_SINCE_KEY = 'stats:upcoming-since'
+COUNTERS = ('published', 'drafts', 'upcoming', 'rating_sum')
+
+
+def upcoming_since():
+    """Мероприятия, начинающиеся позже этой отметки, считаются предстоящими"""
+    return cache.get(UPCOMING_SINCE_KEY) or timezone.now()
+
+
+def current_state(event):
+    """Значения STATS_FIELDS; дата может быть строкой, если объект создан из неё"""
+    status, location_id, rating, start_date = (getattr(event, name) for name in Event.STATS_FIELDS)
+    return status, location_id, int(rating), Event._meta.get_field('start_date').to_python(start_date)
+
+
+def contribution(state, since):
+    """Вклад мероприятия в счётчики места: {поле: приращение}"""
+    status, _, rating, start_date = state
+    if status != 'published':
+        return {'drafts': 1}
+    return {'published': 1, 'rating_sum': rating, 'upcoming': int(start_date > since)}
+
+
+def apply_deltas(deltas, create_missing=True):
+    """
+    deltas: {location_id: {поле: приращение}}. Строки, которой ещё нет,
+    при create_missing пересчитываются целиком
+    """
+    missing = []
+    for location_id, changes in deltas.items():
+        changes = {name: F(name) + value for name, value in changes.items() if value}
+        if not changes:
+            continue
+        changes['updated_at'] = timezone.now()
+        if not LocationStats.objects.filter(location_id=location_id).update(**changes):
+            missing.append(location_id)
+    if missing and create_missing:
+        refresh_location_stats(missing)
+
+
+def event_saved(event, created):
+    new = current_state(event)
+    old = None if created else getattr(event, '_stats_loaded', None)
+    if not created and old is None:
+        # Прежние значения неизвестны (объект не из БД или с отложенными полями)
+        refresh_location_stats([event.location_id])
+    elif old != new:
+        since = upcoming_since()
+        deltas = defaultdict(lambda: defaultdict(int))
+        if old is not None:
+            for name, value in contribution(old, since).items():
+                deltas[old[1]][name] -= value
+        for name, value in contribution(new, since).items():
+            deltas[new[1]][name] += value
+        apply_deltas(deltas)
+    event._stats_loaded = new
+
+
+def event_deleted(event):
+    state = getattr(event, '_stats_loaded', None) or current_state(event)
+    changes = {name: -value for name, value in contribution(state, upcoming_since()).items()}
+    # Строки нет, если место удаляется вместе с мероприятиями: создавать её нельзя
+    apply_deltas({state[1]: changes}, create_missing=False)
+
+
+def aggregate(location_ids, since):
+    """Счётчики по таблице мероприятий: {location_id: {поле: значение}}"""
+    events = Event.objects.all()
+    if location_ids is not None:
+        events = events.filter(location_id__in=location_ids)
+    published = Q(status='published')
+    rows = events.order_by().values('location_id').annotate(
+        published=Count('id', filter=published),
+        drafts=Count('id', filter=~published),
+        upcoming=Count('id', filter=published & Q(start_date__gt=since)),
+        rating_sum=Sum('rating', filter=published, default=0),
+    )
+    return {row.pop('location_id'): row for row in rows}
+
+
+def refresh_location_stats(location_ids=None, since=None):
+    """
+    Пересчитывает строки указанных мест (список или подзапрос id; None —
+    все) и исправляет отличающиеся. Возвращает число исправленных строк
+    """
+    since = since or upcoming_since()
+    actual = aggregate(location_ids, since)
+    stats = LocationStats.objects.all()
+    if location_ids is not None:
+        stats = stats.filter(location_id__in=location_ids)
+    existing = stats.in_bulk()
+
+    now = timezone.now()
+    to_create, to_update = [], []
+    for location_id in actual.keys() - existing.keys():
+        to_create.append(LocationStats(location_id=location_id, **actual[location_id]))
+    for location_id, row in existing.items():
+        # Места без мероприятий нет в actual: счётчики обнуляются
+        values = actual.get(location_id, dict.fromkeys(COUNTERS, 0))
+        if any(getattr(row, name) != values[name] for name in COUNTERS):
+            for name in COUNTERS:
+                setattr(row, name, values[name])
+            row.updated_at = now
+            to_update.append(row)
+
+    # Параллельное сохранение могло создать строку: она будет исправлена сверкой
+    LocationStats.objects.bulk_create(to_create, batch_size=1000, ignore_conflicts=True)
+    LocationStats.objects.bulk_update(to_update, [*COUNTERS, 'updated_at'], batch_size=1000)
+    return len(to_create) + len(to_update)
+
+
+def reconcile(now=None):
+    """Полная сверка; предстоящие — относительно now, отметка сдвигается на now"""
+    now = now or timezone.now()
+    fixed = refresh_location_stats(since=now)
+    cache.set(UPCOMING_SINCE_KEY, now, timeout=None)
+    return fixed
+
+
+def roll_upcoming(now=None):
+    """
+    Вычитает из предстоящих мероприятия, начавшиеся после отметки: один
+    запрос по индексу опубликованных по start_date. Возвращает число
+    вычтенных или None, если отметки не было и понадобилась полная сверка
+    """
+    now = now or timezone.now()
+    since = cache.get(UPCOMING_SINCE_KEY)
+    if since is None:
+        reconcile(now)
+        return None
+    started = (
+        Event.objects.filter(status='published', start_date__gt=since, start_date__lte=now)
+        .order_by().values('location_id').annotate(count=Count('id'))
+    )
+    deltas = {row['location_id']: {'upcoming': -row['count']} for row in started}
+    apply_deltas(deltas)
+    cache.set(UPCOMING_SINCE_KEY, now, timeout=None)
+    return sum(-changes['upcoming'] for changes in deltas.values())
@@ -0,0 +1,205 @@
+"""
+Лента изменений мероприятий для синхронизации клиентов.
+
+Клиент хранит курсор из последнего ответа и получает только то, что
+изменилось после него: мероприятия по (updated_at, id) и удалённые — по
+записям EventTombstone. Снятие с публикации тоже оставляет запись (с
+unpublished): анонимам такое мероприятие отдаётся как удалённое, а
+черновики, которые никогда не публиковались, в ленту анонимов не попадают.
+Стоимость запроса зависит от числа изменений, а не от размера каталога.
+
+Отметки ставятся после фиксации транзакции (transaction.on_commit):
+изменения длинной транзакции получают время фиксации и не оказываются
+позади уже выданных курсоров. Изменения транзакции копятся в буфере
+соединения и записываются пачкой — одним UPDATE и одним INSERT. Лента
+отдаёт изменения не новее SYNC_SETTLE_SECONDS секунд назад: столько
+остаётся на сами запросы после фиксации. Записи об удалённых хранятся
+SYNC_TOMBSTONE_DAYS дней; более старый курсор отклоняется — клиенту
+нужна полная синхронизация. Клиент применяет сначала deleted, затем results.
+"""
+import base64
+import binascii
+import heapq
+import json
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotFound
+
+from .models import Event, EventTombstone
+
+# Вид записи в ключе курсора (отметка, вид, id): при равных отметках
+# сначала мероприятия, затем надгробия; ALL — всё до отметки включительно
+EVENT, TOMBSTONE, ALL = 0, 1, 2
+
+class CursorExpired(APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = "Курсор устарел: нужна полная синхронизация"
+    default_code = 'cursor_expired'
+
+
+class PendingChanges:
+    """Изменения, ещё не записанные в ленту: копятся до фиксации транзакции"""
+
+    def __init__(self):
+        self.touched = set()
+        # Места, изменения которых видны во всех их мероприятиях
+        self.locations = set()
+        # Места с новой погодой: прошедшие с зафиксированной погодой не меняются
+        self.weather = set()
+        self.deleted = set()
+        self.unpublished = set()
+
+    def flush(self):
+        changes = vars(self).copy()
+        self.__init__()
+        now = timezone.now()
+
+        touched = (
+            Q(id__in=changes['touched'])
+            | Q(location_id__in=changes['locations'])
+            | Q(location_id__in=changes['weather']) & ~Q(frozen_weather__isnull=False, end_date__lt=now)
+        )
+        if changes['touched'] or changes['locations'] or changes['weather']:
+            Event.objects.filter(touched).update(updated_at=now)
+
+        # Откат точки сохранения мог отменить удаление: записываются только
+        # действительно удалённые и всё ещё скрытые мероприятия
+        ids = changes['deleted'] | changes['unpublished']
+        if ids:
+            remaining = dict(Event.objects.filter(id__in=ids).values_list('id', 'status'))
+            EventTombstone.objects.bulk_create([
+                EventTombstone(event_id=event_id, deleted_at=now, unpublished=event_id in remaining)
+                for event_id in sorted(ids)
+                if remaining.get(event_id) != 'published'
+            ])
+
+
+def pending():
+    """
+    Буфер изменений текущей транзакции (соединения с основной БД). Буфер,
+    обратные вызовы которого отброшены откатом, заменяется новым
+    """
+    connection = transaction.get_connection()
+    changes = getattr(connection, 'sync_pending', None)
+    if changes is None or not any(entry[1] == changes.flush for entry in connection.run_on_commit):
+        changes = connection.sync_pending = PendingChanges()
+    return changes
+
+
+def after_commit(changes):
+    # Обратных вызовов может быть много — первый записывает весь буфер,
+    # остальные находят его пустым
+    transaction.on_commit(changes.flush)
+
+
+def touch(event_ids=(), locations=(), weather=()):
+    """
+    Отметка изменения после фиксации транзакции: мероприятия event_ids,
+    все мероприятия мест locations и показывающие текущую погоду мест weather
+    """
+    changes = pending()
+    changes.touched.update(event_ids)
+    changes.locations.update(locations)
+    changes.weather.update(weather)
+    after_commit(changes)
+
+
+def record_deletion(event_ids, unpublished=False):
+    """Запись в ленту об удалённых (или снятых с публикации) после фиксации"""
+    changes = pending()
+    (changes.unpublished if unpublished else changes.deleted).update(event_ids)
+    after_commit(changes)
+
+
+def encode_cursor(position):
+    moment, kind, last_id = position
+    payload = json.dumps({'t': moment.isoformat(), 'k': kind, 'i': last_id})
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_cursor(encoded):
+    """(отметка, вид, id) или None без курсора; устаревший — CursorExpired"""
+    if not encoded:
+        return None
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+        moment = datetime.fromisoformat(payload['t'])
+        kind, last_id = int(payload['k']), int(payload['i'])
+        if timezone.is_naive(moment) or kind not in (EVENT, TOMBSTONE, ALL):
+            raise ValueError
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise NotFound('Неверный курсор')
+    if moment < timezone.now() - timedelta(days=settings.SYNC_TOMBSTONE_DAYS):
+        raise CursorExpired()
+    return moment, kind, last_id
+
+
+def after(field, cursor, kind):
+    """
+    Условие «строка вида kind после курсора» по (field, id). Условие >= —
+    граница чтения индекса (field, id): страница из середины ленты не
+    перебирает всё начало индекса, OR уточняет лишь строки с той же отметкой
+    """
+    moment, cursor_kind, last_id = cursor
+    condition = Q(**{f'{field}__gt': moment})
+    if cursor_kind < kind:
+        condition |= Q(**{field: moment})
+    elif cursor_kind == kind:
+        condition |= Q(**{field: moment, 'id__gt': last_id})
+    return Q(**{f'{field}__gte': moment}) & condition
+
+
+class ChangeFeed:
+    """
+    Страница ленты: visible — строки values() мероприятий, видимых клиенту
+    (с id и updated_at), tombstones — записи об удалённых для него. Каждый
+    поток читается по индексу не больше чем на size + 1 строк и сливается
+    по ключу курсора
+    """
+
+    def __init__(self, visible, tombstones, size):
+        self.visible, self.tombstones, self.size = visible, tombstones, size
+
+    def page(self, cursor):
+        """(изменённые строки, id удалённых, курсор следующего запроса, есть ли ещё)"""
+        until = timezone.now() - timedelta(seconds=settings.SYNC_SETTLE_SECONDS)
+        streams = [self.changed(cursor, until)]
+        # Первая синхронизация: у клиента ещё ничего нет, удалять нечего
+        if cursor is not None:
+            streams.append(self.deleted(cursor, until))
+
+        items = list(heapq.merge(*streams, key=lambda item: item[0]))
+        more = len(items) > self.size
+        items = items[:self.size]
+
+        changed = [value for _, deleted, value in items if not deleted]
+        deleted = list(dict.fromkeys(value for _, deleted, value in items if deleted))
+        # Всё до until отдано: следующий запрос начнётся с него
+        position = items[-1][0] if more else (until, ALL, 0)
+        return changed, deleted, position, more
+
+    def changed_rows(self, cursor, until):
+        rows = self.visible.filter(updated_at__lte=until)
+        if cursor is not None:
+            rows = rows.filter(after('updated_at', cursor, EVENT))
+        return rows.order_by('updated_at', 'id')[:self.size + 1]
+
+    def deleted_rows(self, cursor, until):
+        return (
+            self.tombstones.filter(after('deleted_at', cursor, TOMBSTONE), deleted_at__lte=until)
+            .order_by('deleted_at', 'id').values_list('deleted_at', 'id', 'event_id')[:self.size + 1]
+        )
+
+    def changed(self, cursor, until):
+        return [((row['updated_at'], EVENT, row['id']), False, row) for row in self.changed_rows(cursor, until)]
+
+    def deleted(self, cursor, until):
+        return [
+            ((moment, TOMBSTONE, pk), True, event_id)
+            for moment, pk, event_id in self.deleted_rows(cursor, until)
+        ]
@@ -1,68 +1,350 @@
-import requests
-from celery import shared_task
+import logging
+import tempfile
+from datetime import timedelta
+
+from celery import chord, group, shared_task
 from django.utils import timezone
-from django.core.mail import send_mail
 from django.conf import settings
-from .models import Event, WeatherData
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Max
+from django.db.models.functions import Trunc
+from core.locks import acquire, release, single_flight
+from .models import Event, EventImage, EventTombstone, Location, UploadSession, WeatherData
+from .signals import bulk_changed
+from .exports import write_events_xlsx
+from .imports import EventImporter
+from .notifications import notify_published, send_pending_notifications
+from .stats import reconcile, roll_upcoming
+from .weather import fetch_weather_bulk
+from .weather_refresh import due_points, freeze_past_weather
+
+logger = logging.getLogger(__name__)
+
 
 @shared_task
-def send_event_email_task(event_id, recipient_list, subject, message):
-    """Задача 1: Отправка Email при публикации"""
-    send_mail(
-        subject=subject,
-        message=message,
-        from_email=settings.DEFAULT_FROM_EMAIL,
-        recipient_list=recipient_list,
-        fail_silently=False,
-    )
+@single_flight('send_publication_emails', timeout=10 * 60)
+def send_publication_emails_task():
+    """Задача 1: Отправка накопившихся уведомлений о публикации пачками"""
+    sent = send_pending_notifications()
+    return {'sent': sent}
 
 @shared_task
 def check_for_publication():
-    """Задача 2: Автопубликация мероприятий при наступлении даты"""
+    """
+    Задача 2: Автопубликация мероприятий при наступлении даты.
+    Черновики публикуются пачками по PUBLISH_CHUNK_SIZE параллельно на всех
+    воркерах; следующий запуск ждёт, пока не завершатся все пачки
+    """
+    token = acquire('check_for_publication', settings.PUBLISH_LOCK_TIMEOUT)
+    if token is None:
+        logger.info("Publication check is already running, skipped")
+        return {'skipped': 1}
+
+    try:
+        due = list(
+            Event.objects.filter(status='draft', publish_at__lte=timezone.now())
+            .order_by('publish_at').values_list('id', flat=True)
+        )
+    except Exception:
+        release('check_for_publication', token)
+        raise
+    chunks = chunked(due, settings.PUBLISH_CHUNK_SIZE)
+    dispatch_chunks('check_for_publication', token, [publish_events_chunk.s(ids) for ids in chunks],
+                    finish_publication.s(token))
+    return {'due': len(due), 'chunks': len(chunks)}
+
+@shared_task(acks_late=True)
+def publish_events_chunk(event_ids):
+    """Пачка черновиков: повторное выполнение ничего не меняет"""
+    published = Event.objects.publish_due(ids=event_ids)
+    if published:
+        notify_published(published)
+    return {'published': len(published)}
+
+@shared_task
+def finish_publication(reports, token):
+    release('check_for_publication', token)
+    published = sum(report['published'] for report in reports)
+    logger.info("Events published automatically: %s", published)
+    return {'published': published}
+
+@shared_task
+def publish_event_task(event_id):
+    """Публикация одного мероприятия точно в срок (ETA)"""
+    published = Event.objects.publish_due(ids=[event_id])
+    if published:
+        notify_published(published)
+    return {'published': len(published)}
+
+def schedule_publication(event):
+    """Ставит задачу публикации на время publish_at (EVENT_PUBLISH_USE_ETA)"""
+    if not settings.EVENT_PUBLISH_USE_ETA:
+        return
+    if event.status != 'draft' or event.publish_at is None:
+        return
+    # Задача идемпотентна: если publish_at перенесли, она ничего не сделает
+    transaction.on_commit(
+        lambda: publish_event_task.apply_async(args=[event.id], eta=event.publish_at)
+    )
+
+@shared_task
+def update_weather_task():
+    """
+    Задача 3: Обновление устаревшей погоды мест проведения.
+    Точки выбираются по срокам мероприятий (см. weather_refresh.py) и
+    делятся на пачки по WEATHER_CHUNK_SIZE, пачки выполняются параллельно
+    на воркерах очереди weather
+    """
+    token = acquire('update_weather', settings.WEATHER_LOCK_TIMEOUT)
+    if token is None:
+        logger.info("Weather update is already running, skipped")
+        return {'skipped': 1}
+
     now = timezone.now()
+    try:
+        frozen = freeze_past_weather(now)
+        points = due_points(now)
+    except Exception:
+        release('update_weather', token)
+        raise
+    # Места с одинаковыми координатами — в одной пачке: один запрос к API на точку
+    chunks = [
+        [location_id for ids in point_ids for location_id in ids]
+        for point_ids in chunked(points, settings.WEATHER_CHUNK_SIZE)
+    ]
+    dispatch_chunks('update_weather', token, [update_weather_chunk.s(ids) for ids in chunks],
+                    finish_weather_update.s(token))
+    return {
+        'frozen': frozen,
+        'points': len(points),
+        'locations': sum(len(ids) for ids in chunks),
+        'chunks': len(chunks),
+    }
+
+@shared_task(acks_late=True)
+def update_weather_chunk(location_ids):
+    """Погода для пачки мест; повтор пачки лишь добавит точку в историю"""
+    locations = list(Location.objects.filter(id__in=location_ids).values_list('id', 'lat', 'lon'))
 
-    events_to_publish = Event.objects.filter(
-        status='draft', 
-        pub_date__lte=now
+    # Один запрос на пару координат, а не на каждое место или мероприятие
+    coords = {(lat, lon) for _, lat, lon in locations}
+    readings = fetch_weather_bulk(coords)
+
+    # Новые точки временного ряда и ссылки на них из мест проведения
+    weather = WeatherData.objects.bulk_create([
+        WeatherData(location_id=location_id, **readings[(lat, lon)])
+        for location_id, lat, lon in locations
+        if (lat, lon) in readings
+    ])
+    Location.objects.bulk_update(
+        [Location(id=w.location_id, current_weather=w) for w in weather],
+        ['current_weather'],
     )
-    
-    for event in events_to_publish:
-        event.status = 'published'
-        event.save()
+    if weather:
+        bulk_changed.send(sender=WeatherData, ids=[w.id for w in weather])
+        bulk_changed.send(sender=Location, ids=[w.location_id for w in weather])
 
-        print(f"Event '{event.title}' has been published automatically.")
+    return {
+        'fetches': len(coords),
+        'failed': len(coords) - len(readings),
+        'writes': len(weather),
+    }
 
 @shared_task
-def update_weather_task():
-    """Задача 3: Получение погоды для мест проведения"""
-    events = Event.objects.filter(status='published')
-    
-    for event in events:
-        loc = event.location
-        url = (f"https://api.open-meteo.com/v1/forecast?"
-               f"latitude={loc.lat}&longitude={loc.lon}&current_weather=true"
-               f"&hourly=surface_pressure,relativehumidity_2m")
-        
-        try:
-            response = requests.get(url, timeout=10)
-            data = response.json()
-            current = data['current_weather']
-            
-            # Конвертация данных
-            pressure_hpa = data['hourly']['surface_pressure'][0]
-            pressure_mmhg = round(pressure_hpa * 0.75006, 1)
-            
-            humidity = data['hourly']['relativehumidity_2m'][0]
-            
-            WeatherData.objects.update_or_create(
-                event=event,
-                defaults={
-                    'temperature': current['temperature'],
-                    'wind_speed': current['windspeed'],
-                    'wind_direction': str(current['winddirection']),
-                    'humidity': humidity,
-                    'pressure': pressure_mmhg,
-                }
-            )
-        except Exception as e:
-            print(f"Weather error for {event.title}: {e}")
\ No newline at end of file
+def finish_weather_update(reports, token):
+    release('update_weather', token)
+    report = {key: sum(r[key] for r in reports) for key in ('fetches', 'failed', 'writes')}
+    logger.info("Weather updated: %s", report)
+    return report
+
+@shared_task
+def release_lock(lock_name, token):
+    """Обработчик ошибки chord: следующий запуск не ждёт истечения блокировки"""
+    release(lock_name, token)
+
+def chunked(items, size):
+    return [items[start:start + size] for start in range(0, len(items), size)]
+
+def dispatch_chunks(lock_name, token, chunks, callback):
+    """
+    Пачки — группой Celery, итог и снятие блокировки — в callback после всех
+    пачек (chord). Если пачка упала, callback не выполнится: блокировку
+    снимает его обработчик ошибок
+    """
+    if not chunks:
+        release(lock_name, token)
+        return
+    callback.on_error(release_lock.si(lock_name, token))
+    try:
+        chord(chunks)(callback)
+    except Exception:
+        release(lock_name, token)
+        raise
+
+@shared_task
+@single_flight('prune_weather_history', timeout=60 * 60)
+def prune_weather_history():
+    """Задача 4: Прореживание и очистка истории погоды"""
+    now = timezone.now()
+    # Текущие показания мест и зафиксированные у прошедших мероприятий не удаляются никогда
+    current = Location.objects.filter(current_weather__isnull=False).values('current_weather')
+    frozen = Event.objects.filter(frozen_weather__isnull=False).values('frozen_weather')
+
+    expired, _ = (
+        WeatherData.objects
+        .filter(created_at__lt=now - timedelta(days=settings.WEATHER_HISTORY_DAYS))
+        .exclude(id__in=current)
+        .exclude(id__in=frozen)
+        .delete()
+    )
+
+    # Старые точки: по одной (последней) на интервал WEATHER_DOWNSAMPLE_TO
+    old = WeatherData.objects.filter(
+        created_at__lt=now - timedelta(days=settings.WEATHER_DOWNSAMPLE_AFTER_DAYS)
+    )
+    keep = (
+        old.annotate(bucket=Trunc('created_at', settings.WEATHER_DOWNSAMPLE_TO))
+        .values('location', 'bucket')
+        .annotate(keep_id=Max('id'))
+        .values('keep_id')
+    )
+    downsampled, _ = old.exclude(id__in=keep).exclude(id__in=current).exclude(id__in=frozen).delete()
+
+    report = {'expired': expired, 'downsampled': downsampled}
+    logger.info("Weather history pruned: %s", report)
+    return report
+
+@shared_task(bind=True)
+def export_events_xlsx_task(self, params, user_id=None):
+    """Задача 5: Фоновый экспорт мероприятий в XLSX в медиа-хранилище"""
+    queryset = export_queryset(params, user_id)
+
+    with tempfile.TemporaryFile() as export_file:
+        rows = write_events_xlsx(queryset, export_file)
+        export_file.seek(0)
+        name = default_storage.save(f'exports/{self.request.id}.xlsx', File(export_file))
+
+    return {'rows': rows, 'file': name, 'url': default_storage.url(name)}
+
+def export_queryset(params, user_id=None):
+    """
+    Queryset экспорта с теми же фильтрами, поиском и сортировкой, что
+    применило бы EventViewSet к запросу с параметрами `params`.
+    """
+    from types import SimpleNamespace
+    from django.contrib.auth.models import User
+    from django.http import QueryDict
+    from .filters import EventFilter, EventOrderingFilter, EventSearchFilter
+    from .views import EventViewSet
+
+    query = QueryDict(mutable=True)
+    for key, values in params:
+        query.setlist(key, values)
+
+    queryset = Event.objects.select_related('location__current_weather', 'frozen_weather').defer('search_vector')
+    user = User.objects.filter(pk=user_id).first() if user_id else None
+    if not (user is not None and user.is_staff):
+        queryset = queryset.filter(status='published')
+
+    queryset = EventFilter(query, queryset).qs
+    # Поиску и сортировке нужны только параметры запроса и настройки представления
+    request = SimpleNamespace(query_params=query, user=user)
+    for backend in (EventSearchFilter, EventOrderingFilter):
+        queryset = backend().filter_queryset(request, queryset, EventViewSet)
+    return queryset
+
+@shared_task
+@single_flight('prune_exports', timeout=60 * 60)
+def prune_exports():
+    """Задача 12: Удаление файлов фонового экспорта старше EXPORT_FILE_TTL_HOURS"""
+    if not default_storage.exists('exports'):
+        return {'removed': 0}
+    expired = timezone.now() - timedelta(hours=settings.EXPORT_FILE_TTL_HOURS)
+    _, files = default_storage.listdir('exports')
+    removed = 0
+    for filename in files:
+        name = f'exports/{filename}'
+        if default_storage.get_modified_time(name) < expired:
+            default_storage.delete(name)
+            removed += 1
+    return {'removed': removed}
+
+@shared_task(bind=True)
+def import_events_xlsx_task(self, name, user_id):
+    """Задача 6: Фоновый импорт мероприятий из XLSX с отчётом о прогрессе"""
+    from django.contrib.auth.models import User
+
+    def progress(processed, created):
+        self.update_state(state='PROGRESS', meta={'processed': processed, 'created': created})
+
+    try:
+        with default_storage.open(name) as import_file:
+            report = EventImporter(User.objects.get(pk=user_id), progress=progress).run(import_file)
+    finally:
+        default_storage.delete(name)
+
+    logger.info("Events imported: %s created, %s errors", report['created'], len(report['errors']))
+    return report
+
+@shared_task
+def generate_thumbnails_task(image_id):
+    """Задача 7: Превью всех размеров для одного изображения"""
+    image = EventImage.objects.filter(pk=image_id).first()
+    if image is None:
+        return {'status': 'missing'}
+
+    try:
+        image.make_thumbnails()
+    except Exception as e:
+        logger.warning("Thumbnail error for image %s: %s", image_id, e)
+        image.status = 'failed'
+    image.save(update_fields=['thumbnail', 'variants', 'status'])
+    return {'status': image.status}
+
+@shared_task
+@single_flight('prune_upload_sessions', timeout=60 * 60)
+def prune_upload_sessions():
+    """Задача 8: Удаление брошенных загрузок частями вместе с недописанными файлами"""
+    from .uploads import remove_partial
+
+    stale = UploadSession.objects.filter(
+        updated_at__lt=timezone.now() - timedelta(hours=settings.UPLOAD_SESSION_TTL_HOURS)
+    )
+    for session in stale.filter(status='uploading'):
+        remove_partial(session)
+    removed, _ = stale.delete()
+    return {'removed': removed}
+
+@shared_task
+@single_flight('reconcile_location_stats', timeout=60 * 60)
+def reconcile_location_stats():
+    """Задача 9: Сверка сводной статистики мест с таблицей мероприятий"""
+    return {'fixed': reconcile()}
+
+@shared_task
+@single_flight('roll_upcoming_stats', timeout=5 * 60)
+def roll_upcoming_stats():
+    """Задача 10: Начавшиеся мероприятия перестают быть предстоящими в статистике мест"""
+    return {'started': roll_upcoming() or 0}
+
+@shared_task
+@single_flight('prune_event_tombstones', timeout=60 * 60)
+def prune_event_tombstones():
+    """Задача 11: Удаление записей об удалённых мероприятиях старше SYNC_TOMBSTONE_DAYS"""
+    removed, _ = EventTombstone.objects.filter(
+        deleted_at__lt=timezone.now() - timedelta(days=settings.SYNC_TOMBSTONE_DAYS)
+    ).delete()
+    return {'removed': removed}
+
+def process_images(image_ids):
+    """
+    После коммита ставит по задаче на изображение: пачка загрузок
+    обрабатывается параллельно всеми процессами воркеров.
+    """
+    image_ids = list(image_ids)
+    if image_ids:
+        transaction.on_commit(
+            lambda: group(generate_thumbnails_task.s(image_id) for image_id in image_ids).apply_async()
+        )
@@ -1,15 +1,34 @@
+import io
+import threading
+from datetime import timedelta
+from io import StringIO
+import openpyxl
 import pytest
-from rest_framework.test import APIClient
-from django.contrib.auth.models import User
-from .models import Location, Event
-
-@pytest.fixture
-def api_client():
-    return APIClient()
-
-@pytest.fixture
-def admin_user(db):
-    return User.objects.create_superuser('admin', 'admin@test.com', 'password')
+from PIL import Image
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction, OperationalError
+from django.http import HttpResponse
+from django.utils import timezone
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, APIClient
+from .exports import EXPORT_COLUMNS
+from .management.commands.explain_queries import Command
+from .models import Location, Event, WeatherData, EventImage, UploadSession, EventTombstone
+from .serializers import EventSerializer
+from .sync import ALL, encode_cursor, ChangeFeed, decode_cursor
+from .tasks import (
+    prune_exports, prune_upload_sessions, check_for_publication, send_publication_emails_task, prune_event_tombstones,
+)
+from .views import EventViewSet
+from core import metrics
+from core.db_router import PIN_KEY, WRITE_KEY
+from . import filters, uploads, views
 
 @pytest.mark.django_db
 def test_anonymous_user_cannot_create_location(api_client):
@@ -28,4 +47,767 @@ def test_only_published_events_visible_to_anon(api_client, admin_user):
     
     response = api_client.get('/api/events/')
     assert len(response.data['results']) == 1
-    assert response.data['results'][0]['title'] == "Pub"
\ No newline at end of file
+    assert response.data['results'][0]['title'] == "Pub"
+
+@pytest.mark.django_db
+def test_event_weather_resolved_through_location(api_client, make_event, location,
+                                                  django_capture_on_commit_callbacks):
+    """Проверка: погода мероприятия — текущее показание места проведения"""
+    event = make_event()
+    location.current_weather = WeatherData.objects.create(
+        location=location, temperature=5, humidity=80, pressure=750,
+        wind_direction='90', wind_speed=2,
+    )
+    location.save()
+
+    response = api_client.get(f'/api/events/{event.id}/')
+    assert response.data['weather']['temperature'] == 5
+
+    # Прошедшее мероприятие показывает зафиксированное показание
+    with django_capture_on_commit_callbacks(execute=True):
+        Event.objects.filter(id=event.id).update(frozen_weather=WeatherData.objects.create(
+            location=location, temperature=-3, humidity=80, pressure=750, wind_direction='90', wind_speed=2,
+        ))
+    assert api_client.get(f'/api/events/{event.id}/').data['weather']['temperature'] == -3
+    assert api_client.get('/api/events/').data['results'][0]['weather']['temperature'] == -3
+
+@pytest.mark.django_db
+def test_publication_email_only_on_transition(api_client, admin_user, make_event, mailoutbox,
+                                              django_capture_on_commit_callbacks):
+    """Проверка: письмо только при переходе черновик -> опубликовано"""
+    event = make_event(status='draft')
+    api_client.force_authenticate(admin_user)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        api_client.patch(f'/api/events/{event.id}/', {'status': 'published'}, format='json')
+    with django_capture_on_commit_callbacks(execute=True):
+        api_client.patch(f'/api/events/{event.id}/', {'rating': 5}, format='json')
+
+    assert [m.subject for m in mailoutbox] == [f"Опубликовано: {event.title}"]
+
+@pytest.fixture
+def populated(make_event, location):
+    """Каждому мероприятию — изображения, месту — погода"""
+    def populate(events_count, places=3):
+        for i in range(events_count):
+            loc = location if i % places == 0 else Location.objects.create(name=f"L{i}", lat=i, lon=i)
+            loc.current_weather = WeatherData.objects.create(
+                location=loc, temperature=1, humidity=1, pressure=1, wind_direction='0', wind_speed=1,
+            )
+            loc.save()
+            event = make_event(title=f"E{i}", location=loc)
+            for n in range(2):
+                EventImage.objects.create(event=event, image=f"events/{i}_{n}.jpg", thumbnail=f"events/thumbnails/{i}_{n}.jpg")
+    return populate
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('events_count,page_size', [(3, 10), (30, 10), (30, 25)])
+def test_event_endpoints_within_query_budget(api_client, admin_user, monkeypatch, populated, query_budget,
+                                             events_count, page_size):
+    """Проверка: число запросов не зависит от объёма данных и размера страницы"""
+    monkeypatch.setattr(PageNumberPagination, 'page_size', page_size)
+    populated(events_count)
+    event_id = Event.objects.values_list('id', flat=True).first()
+
+    with query_budget('list'):
+        response = api_client.get('/api/events/')
+    assert len(response.data['results']) == min(events_count, page_size)
+
+    with query_budget('retrieve'):
+        api_client.get(f'/api/events/{event_id}/')
+
+    api_client.force_authenticate(admin_user)
+    with query_budget('export'):
+        api_client.get('/api/events/export-xlsx/')
+
+@pytest.mark.django_db
+def test_fast_list_matches_serializer(api_client, admin_user, populated, make_event):
+    """Проверка: быстрый список байт в байт совпадает с EventSerializer"""
+    populated(4)
+    make_event(title="Draft", status='draft', publish_at="2026-02-01T10:00:00Z", description="Черновик")
+    EventImage.objects.filter(id=EventImage.objects.first().id).update(
+        thumbnail='', status='ready', variants={'200': {'jpg': 'events/thumbnails/a_200.jpg'}},
+    )
+    api_client.force_authenticate(admin_user)
+
+    response = api_client.get('/api/events/', {'ordering': '-start_date,title'})
+    request = Request(APIRequestFactory().get('/api/events/'))
+    expected = EventSerializer(
+        Event.objects.order_by('-start_date', 'title'), many=True, context={'request': request},
+    ).data
+    assert JSONRenderer().render(response.data['results']) == JSONRenderer().render(expected)
+
+    sparse = api_client.get('/api/events/', {'fields': 'id,title,start_date', 'pagination': 'cursor'})
+    assert [list(item) for item in sparse.data['results']] == [['id', 'title', 'start_date']] * 5
+    assert api_client.get('/api/events/', {'fields': 'id,secret'}).status_code == 400
+    assert api_client.get('/api/events/', {'fields': 'id,uploaded_images'}).status_code == 400
+
+@pytest.mark.django_db
+def test_anonymous_listing_cached_with_etag(api_client, make_event, django_assert_num_queries,
+                                            django_capture_on_commit_callbacks):
+    """Проверка: повторный запрос из кэша, 304 по ETag, сброс при изменении"""
+    event = make_event(title="Old")
+    first = api_client.get('/api/events/', {'ordering': 'title', 'page': 1})
+    etag = first['ETag']
+
+    # Тот же запрос с другим порядком параметров — из кэша, без БД
+    with django_assert_num_queries(0):
+        cached = api_client.get('/api/events/', {'page': 1, 'ordering': 'title'})
+        not_modified = api_client.get('/api/events/?ordering=title&page=1', HTTP_IF_NONE_MATCH=etag)
+    assert cached.data == first.data and cached['ETag'] == etag
+    assert not_modified.status_code == 304
+
+    # Кэш сбрасывается после фиксации изменения
+    with django_capture_on_commit_callbacks() as callbacks:
+        event.title = "New"
+        event.save()
+        assert api_client.get('/api/events/?ordering=title&page=1', HTTP_IF_NONE_MATCH=etag).status_code == 304
+    for callback in callbacks:
+        callback()
+    changed = api_client.get('/api/events/?ordering=title&page=1', HTTP_IF_NONE_MATCH=etag)
+    assert changed.status_code == 200
+    assert changed['ETag'] != etag
+    assert changed.data['results'][0]['title'] == "New"
+
+@pytest.mark.django_db
+def test_cursor_pagination_walks_all_events(api_client, make_event, django_assert_max_num_queries):
+    """Проверка: курсор проходит все мероприятия без пропусков и повторов"""
+    for i in range(23):
+        # Совпадающие даты: порядок внутри них задаёт id
+        make_event(title=f"E{i}", start_date=f"2026-01-0{i % 4 + 1}T00:00:00Z")
+    expected = list(Event.objects.order_by('-start_date', '-id').values_list('id', flat=True))
+
+    seen = []
+    url = '/api/events/?pagination=cursor&ordering=-start_date&page_size=5'
+    while url:
+        with django_assert_max_num_queries(2):
+            response = api_client.get(url)
+        assert 'count' not in response.data
+        seen += [item['id'] for item in response.data['results']]
+        url = response.data['next']
+    assert seen == expected
+
+    capped = api_client.get('/api/events/?pagination=cursor&page_size=100000')
+    assert len(capped.data['results']) == 23
+    assert api_client.get('/api/events/?pagination=cursor&cursor=broken').status_code == 404
+
+@pytest.mark.django_db
+def test_search_by_title_and_location(api_client, make_event, location):
+    """Проверка: поиск по названию и месту; в PostgreSQL — ранжирование и опечатки"""
+    hall = Location.objects.create(name="Филармония", lat=0, lon=0)
+    make_event(title="Джазовый концерт", location=hall)
+    make_event(title="Концерт", description="концерт концерт")
+    make_event(title="Выставка")
+
+    by_place = api_client.get('/api/events/?search=Филармония')
+    assert [e['title'] for e in by_place.data['results']] == ["Джазовый концерт"]
+
+    if connection.vendor != 'postgresql':
+        return
+    # Без явной сортировки — по релевантности; префиксы и опечатки тоже находятся
+    ranked = api_client.get('/api/events/?search=концерт')
+    assert [e['title'] for e in ranked.data['results']] == ["Концерт", "Джазовый концерт"]
+    assert api_client.get('/api/events/?search=конц').data['count'] == 2
+    assert [e['title'] for e in api_client.get('/api/events/?search=выстовка').data['results']] == ["Выставка"]
+
+    hall.name = "Консерватория"
+    hall.save()
+    assert api_client.get('/api/events/?search=консерватория').data['count'] == 1
+
+@pytest.mark.django_db
+def test_search_falls_back_to_ilike_outside_postgresql(api_client, make_event, monkeypatch):
+    """Проверка: вне PostgreSQL поиск — ILIKE по названию и месту, без search_rank"""
+    monkeypatch.setattr(filters, 'is_postgresql', lambda queryset: False)
+    hall = Location.objects.create(name="Philharmonic Hall", lat=0, lon=0)
+    make_event(title="Jazz concert", location=hall)
+    make_event(title="Concert")
+    make_event(title="Exhibition")
+
+    by_place = api_client.get('/api/events/?search=philharmonic')
+    assert [e['title'] for e in by_place.data['results']] == ["Jazz concert"]
+    by_title = api_client.get('/api/events/?search=CONCERT&ordering=title')
+    assert [e['title'] for e in by_title.data['results']] == ["Concert", "Jazz concert"]
+    assert 'search_rank' not in by_title.data['results'][0]
+
+@pytest.mark.django_db
+def test_events_near_point(api_client, make_event):
+    """Проверка: мероприятия в радиусе, расстояние и сортировка по нему"""
+    places = {
+        "Кремль": (55.7520, 37.6175),      # ~0.3 км от точки
+        "Лужники": (55.7158, 37.5537),     # ~6.0 км
+        "Шереметьево": (55.9726, 37.4146), # ~28 км
+        "Фиджи": (-17.7134, 178.0650),
+    }
+    for title, (lat, lon) in places.items():
+        make_event(title=title, location=Location.objects.create(name=title, lat=lat, lon=lon))
+
+    response = api_client.get('/api/events/', {'near': '55.7539,37.6208', 'radius': 10, 'ordering': '-distance'})
+    assert [e['title'] for e in response.data['results']] == ["Лужники", "Кремль"]
+    assert response.data['results'][0]['distance'] == pytest.approx(5.97, abs=0.01)
+    assert 'distance' not in api_client.get('/api/events/', {'ordering': 'distance'}).data['results'][0]
+
+    # Радиус по умолчанию 10 км; через антимеридиан
+    assert api_client.get('/api/events/', {'near': '-17.7,-179.9'}).data['count'] == 0
+    assert api_client.get('/api/events/', {'near': '-17.7,-179.9', 'radius': 250}).data['count'] == 1
+    assert api_client.get('/api/events/', {'near': '95,10'}).status_code == 400
+
+@pytest.mark.django_db
+def test_listing_queries_served_by_indexes():
+    """Проверка: фильтры и сортировки списка не читают таблицу целиком"""
+    out = StringIO()
+    call_command('explain_queries', '--fail', stdout=out)
+    assert "all served by indexes" in out.getvalue()
+
+@pytest.mark.django_db
+def test_bulk_operations_in_one_transaction(api_client, admin_user, make_event, location, mailoutbox,
+                                           django_capture_on_commit_callbacks, django_assert_max_num_queries):
+    """Проверка: пакет проверяется за проход, ошибки по индексам, одна пачка писем"""
+    draft = make_event(title="Draft", status='draft')
+    doomed = make_event(title="Doomed")
+    new = {'title': 'New', 'description': 'd', 'location': location.id, 'status': 'published',
+           'start_date': '2026-03-01T00:00:00Z', 'end_date': '2026-03-01T02:00:00Z'}
+    operations = [{'op': 'create', 'data': {**new, 'title': f'New {i}'}} for i in range(30)] + [
+        {'op': 'create', 'data': {**new, 'location': 999999}},
+        {'op': 'update', 'id': draft.id, 'data': {'status': 'published', 'rating': 7}},
+        {'op': 'update', 'id': draft.id, 'data': {'rating': 1}},
+        {'op': 'delete', 'id': doomed.id},
+        {'op': 'delete', 'id': 999999},
+        {'op': 'rename'},
+    ]
+    api_client.force_authenticate(admin_user)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        # + сводная статистика мест: пересчёт затронутых мест и удаление (4 запроса)
+        with django_assert_max_num_queries(16):
+            response = api_client.post('/api/events/bulk/', {'operations': operations}, format='json')
+
+    assert response.status_code == 200
+    assert (response.data['created'], response.data['updated'], response.data['deleted'],
+            response.data['errors']) == (30, 1, 1, 4)
+    results = response.data['results']
+    assert results[0]['status'] == 'created' and Event.objects.get(id=results[0]['id']).title == 'New 0'
+    assert [r['index'] for r in results if r['status'] == 'error'] == [30, 32, 34, 35]
+    assert 'location' in results[30]['errors']
+
+    draft.refresh_from_db()
+    assert (draft.status, draft.rating) == ('published', 7)
+    assert not Event.objects.filter(id=doomed.id).exists()
+    # 30 созданных и 1 опубликованный черновик — одна отправка
+    assert len(mailoutbox) == 31
+
+    api_client.force_authenticate(None)
+    assert api_client.post('/api/events/bulk/', {'operations': operations}, format='json').status_code == 403
+
+@pytest.mark.django_db
+def test_export_streams_filtered_rows(api_client, make_event):
+    """Проверка: экспорт учитывает фильтры и поиск списка"""
+    make_event(title="Concert", rating=20)
+    make_event(title="Concert low", rating=1)
+    make_event(title="Lecture", rating=20)
+
+    response = api_client.get('/api/events/export-xlsx/', {'search': 'Concert', 'rating_min': 10})
+    sheet = openpyxl.load_workbook(io.BytesIO(b''.join(response.streaming_content))).active
+
+    rows = list(sheet.iter_rows(values_only=True))
+    assert rows[0][0] == 'Название'
+    assert [row[0] for row in rows[1:]] == ["Concert"]
+    assert rows[1][6] == "55.750000, 37.620000"
+
+@pytest.mark.django_db
+def test_large_export_runs_as_background_job(api_client, make_event, settings, media_root):
+    """Проверка: большой экспорт — фоновая задача с файлом в медиа-хранилище"""
+    settings.EXPORT_ASYNC_THRESHOLD = 2
+    for i in range(3):
+        make_event(title=f"E{i}")
+
+    response = api_client.get('/api/events/export-xlsx/', {'ordering': '-title'})
+    assert response.status_code == 202
+
+    status = api_client.get(f"/api/events/export-xlsx/{response.data['job_id']}/")
+    assert status.data['status'] == 'success'
+    assert status.data['rows'] == 3
+    assert status.data['url'].startswith('http://testserver/media/exports/')
+    assert (media_root / status.data['file']).exists()
+
+    # Файлы экспорта удаляются через EXPORT_FILE_TTL_HOURS
+    assert prune_exports() == {'removed': 0}
+    settings.EXPORT_FILE_TTL_HOURS = -1
+    assert prune_exports() == {'removed': 1}
+    assert not (media_root / status.data['file']).exists()
+
+def make_xlsx(rows):
+    workbook = openpyxl.Workbook()
+    workbook.active.append(EXPORT_COLUMNS)
+    for row in rows:
+        workbook.active.append(row)
+    content = io.BytesIO()
+    workbook.save(content)
+    content.seek(0)
+    content.name = 'events.xlsx'
+    return content
+
+IMPORT_ROWS = [
+    ["A", "", None, "2026-03-01T10:00:00Z", "2026-03-01T12:00:00Z", "Loc", "1, 2", 5],
+    ["B", "", None, "2026-03-02T10:00:00Z", "2026-03-02T12:00:00Z", "Hall", "3.5, 4.5", None],
+    ["C", "", None, "2026-03-03T10:00:00Z", "2026-03-03T12:00:00Z", "Hall", "3.5, 4.5", 30],
+    ["D", "", None, "2026-03-04T10:00:00Z", "2026-03-04T12:00:00Z", "Park", "not coords", 1],
+    ["E", "", None, "2026-03-05T10:00:00Z", "2026-03-05T12:00:00Z", "Park", "7, 8", 1],
+]
+
+@pytest.mark.django_db
+def test_import_reports_bad_rows_and_batches_inserts(api_client, admin_user, location, settings,
+                                                     django_assert_max_num_queries):
+    """Проверка: ошибочные строки в отчёте, места переиспользуются, вставка пачками"""
+    settings.IMPORT_BATCH_SIZE = 2
+    api_client.force_authenticate(admin_user)
+
+    # 2 пачки: поиск мест + создание мест + мероприятия; плюс сессия и уведомления
+    with django_assert_max_num_queries(12):
+        response = api_client.post('/api/events/import-xlsx/', {'file': make_xlsx(IMPORT_ROWS)}, format='multipart')
+
+    assert response.status_code == 200
+    assert response.data['created'] == 3
+    assert [e['row'] for e in response.data['errors']] == [4, 5]
+    assert sorted(Location.objects.values_list('name', flat=True)) == ["Hall", "Loc", "Park"]
+    assert Event.objects.get(title="A").location == location
+    assert Event.objects.filter(status='published').count() == 3
+
+@pytest.mark.django_db
+def test_large_import_runs_as_background_job(api_client, admin_user, settings, media_root):
+    """Проверка: большой файл импортируется фоновой задачей"""
+    settings.IMPORT_ASYNC_THRESHOLD = 0
+    api_client.force_authenticate(admin_user)
+
+    response = api_client.post('/api/events/import-xlsx/', {'file': make_xlsx(IMPORT_ROWS)}, format='multipart')
+    assert response.status_code == 202
+
+    status = api_client.get(f"/api/events/import-xlsx/{response.data['job_id']}/")
+    assert status.data['status'] == 'success'
+    assert status.data['created'] == 3
+    assert not any((media_root / 'imports').iterdir())
+
+    # Анониму недоступны ни импорт, ни статус задачи
+    api_client.force_authenticate(None)
+    response = api_client.post('/api/events/import-xlsx/', {'file': make_xlsx(IMPORT_ROWS), 'async': '1'},
+                               format='multipart')
+    assert response.status_code == 403
+    assert not any((media_root / 'imports').iterdir())
+    assert api_client.get(f"/api/events/import-xlsx/{status.data['job_id']}/").status_code == 403
+
+def image_file(name, fmt, size=(1200, 900), mode='RGB', color='red'):
+    content = io.BytesIO()
+    Image.new(mode, size, color).save(content, fmt)
+    return SimpleUploadedFile(name, content.getvalue())
+
+@pytest.mark.django_db
+def test_uploaded_images_processed_in_background(api_client, admin_user, location, media_root, settings,
+                                                 django_capture_on_commit_callbacks):
+    """Проверка: ответ сразу со статусом processing, затем превью всех размеров"""
+    settings.THUMBNAIL_SIZES = [200, 800]
+    api_client.force_authenticate(admin_user)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        response = api_client.post('/api/events/', {
+            'title': 'Photos', 'description': 'Gallery', 'location': location.id,
+            'start_date': '2026-01-01T00:00:00Z', 'end_date': '2026-01-01T01:00:00Z',
+            'uploaded_images': [
+                image_file('big.jpg', 'JPEG'), image_file('anim.gif', 'GIF'),
+                image_file('clear.png', 'PNG', mode='RGBA', color=(0, 0, 0, 0)),
+            ],
+        }, format='multipart')
+        assert [image['status'] for image in response.data['images']] == ['processing'] * 3
+
+    jpeg, gif, png = EventImage.objects.order_by('id')
+    assert jpeg.status == gif.status == 'ready'
+    assert set(jpeg.variants) == {'200', '800'}
+    assert set(jpeg.variants['200']) == {'jpg', 'webp'}
+    with Image.open(media_root / jpeg.variants['200']['webp']) as thumb:
+        assert thumb.format == 'WEBP' and min(thumb.size) == 200
+    # Форматы кроме JPEG/PNG получают превью в JPEG
+    assert gif.thumbnail.name.endswith('_200.jpg')
+    # Прозрачность сохраняется в WebP
+    with Image.open(media_root / png.variants['200']['webp']) as thumb:
+        assert thumb.mode == 'RGBA' and thumb.getpixel((0, 0))[3] == 0
+
+    detail = api_client.get(f"/api/events/{response.data['id']}/")
+    assert detail.data['images'][0]['variants']['800']['jpg'].startswith('http://testserver/media/')
+
+@pytest.mark.django_db
+def test_chunked_upload_resumes_and_attaches_image(api_client, admin_user, make_event, media_root, settings,
+                                                   django_capture_on_commit_callbacks):
+    """Проверка: части по смещению, продолжение после ошибки, перенос файла без копии"""
+    settings.THUMBNAIL_SIZES = [200]
+    settings.UPLOAD_MAX_SIZE = 1024 * 1024
+    api_client.force_authenticate(admin_user)
+    event = make_event()
+    content = image_file('photo.jpg', 'JPEG', size=(640, 480)).read()
+
+    def start(**kwargs):
+        data = {'event': event.id, 'filename': '../photo.jpg', 'content_type': 'image/jpeg', 'size': len(content)}
+        return api_client.post('/api/uploads/', {**data, **kwargs}, format='json')
+
+    def send(upload_id, offset, chunk):
+        return api_client.generic('PATCH', f'/api/uploads/{upload_id}/', chunk,
+                                  content_type='application/offset+octet-stream', HTTP_UPLOAD_OFFSET=str(offset))
+
+    # Размер и тип проверяются до передачи данных
+    assert start(content_type='application/pdf').status_code == 400
+    assert start(size=settings.UPLOAD_MAX_SIZE + 1).status_code == 400
+
+    upload_id = start().data['id']
+    assert send(upload_id, 0, b'%PDF-1.4' + content[8:100]).status_code == 415
+    assert send(upload_id, 0, content[:1000]).data['offset'] == 1000
+    # Повтор уже принятой части: 409 и смещение, с которого продолжать
+    response = send(upload_id, 0, content[:1000])
+    assert response.status_code == 409 and response['Upload-Offset'] == '1000'
+    assert send(upload_id, 1000, content[1000:] + b'extra').status_code == 413
+    assert api_client.post(f'/api/uploads/{upload_id}/finalize/').status_code == 409
+
+    assert api_client.head(f'/api/uploads/{upload_id}/')['Upload-Offset'] == '1000'
+    assert send(upload_id, 1000, content[1000:]).data['offset'] == len(content)
+    with django_capture_on_commit_callbacks(execute=True):
+        response = api_client.post(f'/api/uploads/{upload_id}/finalize/')
+    assert response.status_code == 201
+
+    image = EventImage.objects.get(event=event)
+    assert image.status == 'ready'
+    assert image.image.name.startswith('events/') and image.image.name.endswith('_photo.jpg')
+    assert (media_root / image.image.name).read_bytes() == content
+    assert not (media_root / 'uploads' / f'{upload_id}.part').exists()
+    assert api_client.post(f'/api/uploads/{upload_id}/finalize/').status_code == 409
+
+    # Брошенная загрузка удаляется вместе с недописанным файлом
+    abandoned = start().data['id']
+    send(abandoned, 0, content[:500])
+    UploadSession.objects.filter(id=abandoned).update(updated_at="2000-01-01T00:00:00Z")
+    assert prune_upload_sessions() == {'removed': 1}
+    assert not (media_root / 'uploads' / f'{abandoned}.part').exists()
+
+@pytest.mark.django_db
+def test_chunk_received_before_lock_and_finalize_rollback_keeps_file(api_client, admin_user, make_event,
+                                                                     media_root, monkeypatch):
+    """Проверка: часть читается вне транзакции, откат завершения не теряет файл"""
+    api_client.force_authenticate(admin_user)
+    content = image_file('photo.jpg', 'JPEG', size=(64, 48)).read()
+    upload_id = api_client.post('/api/uploads/', {
+        'event': make_event().id, 'filename': 'photo.jpg', 'content_type': 'image/jpeg', 'size': len(content),
+    }, format='json').data['id']
+
+    depth = len(connection.savepoint_ids)
+    depths = []
+
+    def receive_chunk(*args):
+        depths.append(len(connection.savepoint_ids))
+        return uploads.receive_chunk(*args)
+
+    monkeypatch.setattr(views, 'receive_chunk', receive_chunk)
+    response = api_client.generic('PATCH', f'/api/uploads/{upload_id}/', content,
+                                  content_type='application/offset+octet-stream', HTTP_UPLOAD_OFFSET='0')
+    assert response.data['offset'] == len(content)
+    assert depths == [depth]
+    assert list((media_root / 'uploads').iterdir()) == [media_root / 'uploads' / f'{upload_id}.part']
+
+    session = UploadSession.objects.get(id=upload_id)
+    with pytest.raises(RuntimeError):
+        with transaction.atomic():
+            uploads.finalize_upload(session)
+            raise RuntimeError("commit failed")
+    session.refresh_from_db()
+    assert session.status == 'uploading'
+    assert (media_root / 'uploads' / f'{upload_id}.part').read_bytes() == content
+
+@pytest.mark.django_db
+def test_metrics_endpoint_reports_views_and_tasks(api_client, admin_user, make_event, mailoutbox, settings):
+    """Проверка: /metrics в формате Prometheus — время, SQL и этапы по представлению, итоги задач"""
+    make_event()
+    make_event(status='draft', publish_at="2020-01-01T00:00:00Z")
+    api_client.get('/api/events/')
+    api_client.get('/api/events/?ordering=-start_date')
+    check_for_publication.delay()
+    send_publication_emails_task.delay()
+
+    # Без METRICS_TOKEN — только персонал
+    settings.METRICS_TOKEN = ''
+    assert api_client.get('/metrics').status_code == 403
+    api_client.force_login(admin_user)
+    response = api_client.get('/metrics')
+    assert response['Content-Type'].startswith('text/plain; version=0.0.4')
+    samples = dict(line.rsplit(' ', 1) for line in response.content.decode().splitlines()
+                   if not line.startswith('#'))
+
+    assert samples['http_requests_total{view="event-list",method="GET",status="200"}'] == '2'
+    assert samples['http_request_duration_seconds_count{view="event-list",method="GET"}'] == '2'
+    assert samples['http_request_duration_seconds_bucket{view="event-list",method="GET",le="+Inf"}'] == '2'
+    # COUNT + страница + изображения
+    assert samples['http_request_db_queries_bucket{view="event-list",le="3.0"}'] == '2'
+    assert float(samples['http_request_db_duration_seconds_sum{view="event-list"}']) > 0
+    for stage in ('filter', 'serialize'):
+        assert samples[f'http_request_stage_duration_seconds_count{{view="event-list",stage="{stage}"}}'] == '2'
+
+    task = 'events.tasks.check_for_publication'
+    assert samples[f'celery_tasks_total{{task="{task}",state="success"}}'] == '1'
+    assert samples[f'celery_task_items_total{{task="{task}",item="due"}}'] == '1'
+    # Итог пачек — в задаче-callback
+    assert samples['celery_task_items_total{task="events.tasks.finish_publication",item="published"}'] == '1'
+    assert samples[f'celery_task_duration_seconds_count{{task="{task}"}}'] == '1'
+    assert samples['celery_task_items_total{task="events.tasks.send_publication_emails_task",item="sent"}'] == '1'
+
+    api_client.logout()
+    settings.METRICS_TOKEN = 'secret'
+    assert api_client.get('/metrics').status_code == 403
+    assert api_client.get('/metrics', HTTP_AUTHORIZATION='Bearer secre').status_code == 403
+    assert api_client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret').status_code == 200
+
+def test_async_metrics_flush_runs_off_event_loop(rf, monkeypatch, settings):
+    """Проверка: в ASGI отправка метрик в Redis не блокирует цикл событий"""
+    settings.METRICS_FLUSH_INTERVAL = 0
+    threads = {}
+    monkeypatch.setattr(metrics, 'flush', lambda force=False: threads.setdefault('flush', threading.get_ident()))
+
+    async def view(request):
+        threads['loop'] = threading.get_ident()
+        return HttpResponse()
+
+    assert async_to_sync(metrics.MetricsMiddleware(view))(rf.get('/')).status_code == 200
+    assert threads['flush'] != threads['loop']
+
+@pytest.mark.django_db
+def test_async_read_endpoints_match_sync(api_client, admin_user, make_event, location, media_root):
+    """Проверка: async list/retrieve отдают то же, что и синхронные, с теми же правами и кэшем"""
+    for number in range(12):
+        make_event(title=f"Event {number:02}", rating=number)
+    make_event(title="Draft", status='draft')
+    event = make_event(title="With image")
+    image = EventImage(event=event, status='ready', variants={'200': {'jpg': 'events/thumbnails/a_200.jpg'}})
+    image.image.save('a.jpg', ContentFile(b'data'))
+
+    for params in [{}, {'page': 2}, {'rating_min': 5, 'ordering': '-start_date', 'fields': 'id,title,images'},
+                   {'pagination': 'cursor', 'page_size': 5}, {'search': 'image'}]:
+        sync, async_ = api_client.get('/api/events/', params), api_client.get('/api/async/events/', params)
+        assert async_.status_code == 200
+        # Ссылки next/previous ведут на тот же вариант эндпоинта
+        assert async_.content.replace(b'/api/async/', b'/api/') == sync.content, params
+
+    detail = api_client.get(f'/api/async/events/{event.id}/')
+    assert detail.content == api_client.get(f'/api/events/{event.id}/').content
+    assert api_client.get('/api/async/events/999999/').status_code == 404
+    assert api_client.get('/api/async/events/', {'page': 9}).status_code == 404
+    assert api_client.get('/api/async/events/', {'rating_min': 'x'}).status_code == 400
+    # Только чтение: записи идут через синхронный API
+    assert api_client.post('/api/async/events/', {}).status_code == 405
+    assert api_client.delete(f'/api/async/events/{event.id}/').status_code == 405
+
+    # Ответы анонимам кэшируются с тем же ETag
+    etag = detail['ETag']
+    assert api_client.get(f'/api/async/events/{event.id}/', HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+    # Места — только администратору, как в LocationViewSet
+    assert api_client.get('/api/async/locations/').status_code == 403
+    api_client.force_authenticate(admin_user)
+    assert api_client.get('/api/async/locations/').content == api_client.get('/api/locations/').content
+    assert api_client.get(f'/api/async/locations/{location.id}/').json()['name'] == location.name
+    drafts = api_client.get('/api/async/events/', {'status': 'draft'}).json()
+    assert [item['title'] for item in drafts['results']] == ["Draft"]
+
+
+@pytest.mark.django_db(databases=['default', 'replica'])
+def test_reads_go_to_replica_except_right_after_writes(settings, api_client, admin_user, make_event, location,
+                                                       django_capture_on_commit_callbacks):
+
+    settings.DATABASE_REPLICAS = ['replica']
+    event = make_event(title="Only on primary")
+    api_client.force_authenticate(admin_user)
+
+    # Репликации в тестах нет: реплика пуста, и чтение с неё видно по результату
+    assert api_client.get('/api/events/').data['count'] == 0
+    assert api_client.get(f'/api/events/{event.id}/').status_code == 404
+    assert api_client.get('/api/locations/').data['count'] == 0
+
+    with django_capture_on_commit_callbacks(execute=True):
+        response = api_client.post('/api/events/', {
+            'title': 'New', 'description': 'Written', 'location': location.id,
+            'start_date': '2026-01-01T00:00:00Z', 'end_date': '2026-01-01T01:00:00Z',
+        }, format='json')
+    assert response.status_code == 201
+    assert not Event.objects.using('replica').exists()
+    # Свои изменения клиент сразу видит: чтение с основной БД
+    assert api_client.get('/api/events/').data['count'] == 2
+
+    # Анонимный ответ попадёт в общий кэш — после записи он строится по основной БД
+    assert APIClient().get(f'/api/events/{event.id}/').status_code == 200
+
+    cache.delete_many([PIN_KEY.format(admin_user.pk), WRITE_KEY])
+    assert api_client.get('/api/events/').data['count'] == 0
+    assert api_client.get('/api/async/events/').json()['count'] == 0
+    assert APIClient().get('/api/events/', {'page_size': 1}).data['count'] == 0
+
+
+@pytest.mark.django_db(databases=['default', 'replica'])
+def test_replica_choice_reset_after_unhandled_error(settings, api_client, make_event, monkeypatch):
+    """Проверка: ошибка чтения с реплики не оставляет следующие запросы потока на реплике"""
+
+    settings.DATABASE_REPLICAS = ['replica']
+    event = make_event()
+
+    def replica_down(self, request, *args, **kwargs):
+        raise OperationalError("replica is down")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(EventViewSet, 'fast_list', replica_down)
+        with pytest.raises(OperationalError):
+            api_client.get('/api/events/')
+
+    # Чтения вне представлений с репликами — снова с основной БД
+    assert Event.objects.filter(id=event.id).exists()
+    settings.DATABASE_REPLICAS = []
+    assert api_client.get('/api/events/').data['count'] == 1
+
+
+@pytest.mark.django_db
+def test_location_stats_endpoint_reads_summary_table(api_client, admin_user, make_event, location,
+                                                     django_assert_max_num_queries):
+    other = Location.objects.create(name="Other", lat=59.93, lon=30.31)
+    make_event(rating=10)
+    make_event(rating=20)
+    make_event(status='draft')
+    make_event(location=other, rating=5)
+    empty = Location.objects.create(name="Empty", lat=55.0, lon=37.0)
+    make_event(location=empty, status='draft')
+
+    assert api_client.get('/api/stats/locations/').status_code == 403
+    api_client.force_authenticate(admin_user)
+    # Сессия, COUNT и страница — без чтения мероприятий
+    with django_assert_max_num_queries(3):
+        response = api_client.get('/api/stats/locations/', {'ordering': '-average_rating'})
+    assert [(row['name'], row['published'], row['drafts'], row['average_rating'])
+            for row in response.data['results']] == [("Loc", 2, 1, 15.0), ("Other", 1, 0, 5.0), ("Empty", 0, 1, None)]
+    # Место без опубликованных — в конце при любом направлении сортировки
+    response = api_client.get('/api/stats/locations/', {'ordering': 'average_rating'})
+    assert [row['name'] for row in response.data['results']] == ["Other", "Loc", "Empty"]
+
+    summary = api_client.get('/api/stats/locations/summary/').data
+    assert summary == {'locations': 3, 'published': 3, 'drafts': 2, 'upcoming': 0, 'average_rating': 35 / 3}
+
+
+@pytest.mark.django_db
+def test_timeline_buckets_in_database_and_caches_past_ranges(api_client, admin_user, make_event, location,
+                                                             django_assert_num_queries):
+    other = Location.objects.create(name="Other", lat=59.93, lon=30.31)
+    for day, hour, place in [(1, 10, location), (1, 23, location), (2, 12, other), (20, 12, location)]:
+        start = f"2026-01-{day:02}T{hour}:00:00Z"
+        make_event(start_date=start, end_date=start, location=place)
+    make_event(start_date="2026-01-03T10:00:00Z", status='draft')
+
+    params = {'start_date_after': '2026-01-01T00:00:00Z', 'start_date_before': '2026-01-31T23:59:59Z'}
+    with django_assert_num_queries(1):
+        response = api_client.get('/api/events/timeline/', params)
+    assert response.data == {'interval': 'day', 'buckets': [['2026-01-01', 2], ['2026-01-02', 1], ['2026-01-20', 1]]}
+
+    # Прошедший диапазон — из кэша, без запросов к БД
+    with django_assert_num_queries(0):
+        assert api_client.get('/api/events/timeline/', params).data == response.data
+
+    # Границы периодов в часовом поясе клиента и фильтры списка
+    moscow = api_client.get('/api/events/timeline/', {**params, 'tz': 'Europe/Moscow'}).data
+    assert moscow['buckets'][:2] == [['2026-01-01', 1], ['2026-01-02', 2]]
+    monthly = api_client.get('/api/events/timeline/', {**params, 'interval': 'month', 'group': 'location'}).data
+    assert monthly == {'interval': 'month', 'locations': {str(location.id): [['2026-01-01', 3]],
+                                                          str(other.id): [['2026-01-01', 1]]}}
+    weekly = api_client.get('/api/events/timeline/', {**params, 'interval': 'week', 'location': other.id}).data
+    assert weekly['buckets'] == [['2025-12-29', 1]]
+    assert api_client.get('/api/events/timeline/', {'interval': 'year'}).status_code == 400
+    assert api_client.get('/api/events/timeline/', {'tz': 'Mars/Olympus'}).status_code == 400
+
+    # Администратор тоже видит в календаре только опубликованные, черновики — по status=draft
+    api_client.force_authenticate(admin_user)
+    assert api_client.get('/api/events/timeline/', params).data == response.data
+    drafts = api_client.get('/api/events/timeline/', {**params, 'status': 'draft'}).data
+    assert drafts['buckets'] == [['2026-01-03', 1]]
+
+@pytest.mark.django_db
+def test_sync_returns_only_changes_since_cursor(api_client, admin_user, make_event, location, settings,
+                                                django_assert_max_num_queries, django_capture_on_commit_callbacks):
+    """Проверка: лента отдаёт изменённые после курсора, удалённые и снятые с публикации"""
+    settings.SYNC_SETTLE_SECONDS = 0
+    settings.SYNC_PAGE_SIZE = 2
+    with django_capture_on_commit_callbacks(execute=True):
+        edited, hidden, deleted = (make_event(title=title) for title in ("Edited", "Hidden", "Deleted"))
+        untouched = make_event(title="Untouched")
+        draft = make_event(title="Draft", status='draft', location=Location.objects.create(name="Other", lat=1, lon=1))
+
+    # Первая синхронизация — все видимые мероприятия постранично
+    synced, cursor, more = [], None, True
+    while more:
+        data = api_client.get('/api/events/sync/', {'cursor': cursor} if cursor else {}).data
+        synced += [event['id'] for event in data['results']]
+        cursor, more = data['cursor'], data['more']
+    assert sorted(synced) == sorted([edited.id, hidden.id, deleted.id, untouched.id])
+
+    with django_capture_on_commit_callbacks(execute=True):
+        edited.title = "Renamed"
+        edited.save()
+        # Отметка времени внутри транзакции (долгой) не учитывается: важна фиксация
+        Event.objects.filter(id=edited.id).update(updated_at=timezone.now() - timedelta(hours=1))
+        hidden.status = 'draft'
+        hidden.save()
+        deleted_id = deleted.id
+        deleted.delete()
+        EventImage.objects.create(event=untouched, image="events/new.jpg")
+        # Черновик, который никогда не публиковался, анонимам не виден и в ленте
+        draft.title = "Draft 2"
+        draft.save()
+    settings.SYNC_PAGE_SIZE = 10
+
+    with django_assert_max_num_queries(4):
+        data = api_client.get('/api/events/sync/', {'cursor': cursor}).data
+    assert {event['id']: event['title'] for event in data['results']} == {edited.id: "Renamed", untouched.id: "Untouched"}
+    assert sorted(data['deleted']) == sorted([hidden.id, deleted_id])
+    assert not data['more']
+
+    # Повтор с новым курсором — пусто; администратор видит черновик как изменение
+    assert api_client.get('/api/events/sync/', {'cursor': data['cursor']}).data['results'] == []
+    api_client.force_authenticate(admin_user)
+    data = api_client.get('/api/events/sync/', {'cursor': cursor}).data
+    assert hidden.id in [event['id'] for event in data['results']]
+    assert data['deleted'] == [deleted_id]
+
+    # Курсор старше хранения записей об удалённых — нужна полная синхронизация
+    expired = encode_cursor((timezone.now() - timedelta(days=settings.SYNC_TOMBSTONE_DAYS + 1), ALL, 0))
+    assert api_client.get('/api/events/sync/', {'cursor': expired}).status_code == 410
+    assert api_client.get('/api/events/sync/', {'cursor': 'garbage'}).status_code == 404
+    EventTombstone.objects.update(deleted_at=timezone.now() - timedelta(days=settings.SYNC_TOMBSTONE_DAYS + 1))
+    assert prune_event_tombstones() == {'removed': 2}
+
+@pytest.mark.django_db
+def test_sync_deep_pages_read_indexes_from_cursor(api_client, make_event, settings, django_assert_max_num_queries):
+    """Проверка: полная синхронизация — те же запросы на каждой странице, индексы читаются с курсора"""
+    settings.SYNC_SETTLE_SECONDS = 0
+    settings.SYNC_PAGE_SIZE = 10
+    events = [make_event(title=f"E{i}") for i in range(60)]
+    start = timezone.now() - timedelta(hours=1)
+    for i, event in enumerate(events):
+        Event.objects.filter(id=event.id).update(updated_at=start + timedelta(seconds=i))
+    EventTombstone.objects.bulk_create([
+        EventTombstone(event_id=10 ** 6 + i, deleted_at=start + timedelta(seconds=i)) for i in range(60)
+    ])
+
+    synced, cursors, more = [], [None], True
+    while more:
+        with django_assert_max_num_queries(4):
+            data = api_client.get('/api/events/sync/', {'cursor': cursors[-1]} if cursors[-1] else {}).data
+        synced += [event['id'] for event in data['results']]
+        cursors.append(data['cursor'])
+        more = data['more']
+    assert synced == [event.id for event in events]
+
+    # Страница из середины ленты читает индексы (отметка, id) по порядку,
+    # начиная с курсора, без сортировки найденных строк
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as db:
+            db.execute("ANALYZE events_event, events_eventtombstone")
+    feed = ChangeFeed(Event.objects.values('id', 'updated_at'), EventTombstone.objects.all(), settings.SYNC_PAGE_SIZE)
+    cursor, explain = decode_cursor(cursors[3]), Command()
+    for queryset, field in [(feed.changed_rows(cursor, timezone.now()), 'updated_at'),
+                            (feed.deleted_rows(cursor, timezone.now()), 'deleted_at')]:
+        plan = explain.explain(queryset)
+        assert explain.is_range_scan(plan, field) and not explain.is_sorted(plan), plan
@@ -0,0 +1,34 @@
+import io
+import json
+
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from .management.commands.benchmark import SCENARIOS
+
+@pytest.mark.slow
+@pytest.mark.django_db
+def test_benchmark_writes_json_and_fails_on_regression(tmp_path):
+    """Проверка: все сценарии в JSON, замедление относительно baseline — ошибка"""
+    output = tmp_path / 'bench.json'
+    options = dict(events=30, locations=3, images=1, repeat=1, stderr=io.StringIO())
+
+    # Текущая БД — только с явным подтверждением записи
+    with pytest.raises(CommandError, match='--allow-writes'):
+        call_command('benchmark', '--current-db', output=str(output), **options)
+
+    call_command('benchmark', '--current-db', '--allow-writes', output=str(output), **options)
+    report = json.loads(output.read_text())
+    assert report['meta']['events'] == 30
+    assert set(report['results']) == set(SCENARIOS)
+    assert all(timings['median_ms'] > 0 for timings in report['results'].values())
+
+    # Базовый прогон в 10 раз быстрее: превью (сотни мс) — регрессия
+    faster = {name: {**timings, 'median_ms': timings['median_ms'] / 10}
+              for name, timings in report['results'].items()}
+    baseline = tmp_path / 'baseline.json'
+    baseline.write_text(json.dumps({**report, 'results': faster}))
+    with pytest.raises(CommandError, match='thumbnails'):
+        call_command('benchmark', '--current-db', '--allow-writes', scenario=['thumbnails'],
+                     baseline=str(baseline), output=str(tmp_path / 'again.json'), **options)
@@ -0,0 +1,388 @@
+from datetime import timedelta
+import pytest
+from celery import current_app
+from django.core.mail.backends.locmem import EmailBackend
+from django.db import DatabaseError
+from django.utils import timezone
+from .models import Event, Location, LocationStats, WeatherData, PublicationNotification
+from .notifications import notify_published
+from .stats import aggregate
+from .tasks import (
+    update_weather_task, prune_weather_history, check_for_publication, reconcile_location_stats, roll_upcoming_stats, finish_weather_update, update_weather_chunk,
+)
+from .testing import StubOpenMeteoServer
+from .weather_refresh import due_points, freeze_past_weather
+from core.locks import acquire, release
+from . import tasks, notifications
+
+@pytest.fixture
+def weather_api(settings):
+    settings.WEATHER_BACKOFF = 0
+    with StubOpenMeteoServer() as server:
+        settings.WEATHER_API_URL = server.url
+        yield server
+
+def upcoming(hours=2):
+    """Даты мероприятия, начинающегося через hours часов"""
+    start = timezone.now() + timedelta(hours=hours)
+    return {'start_date': start, 'end_date': start + timedelta(hours=1)}
+
+@pytest.mark.django_db
+def test_weather_fetched_once_per_location(weather_api, make_event, location, django_capture_on_commit_callbacks):
+    """Проверка: одно показание на место проведения, а не на мероприятие"""
+    other = Location.objects.create(name="Other", lat=59.93, lon=30.31)
+    event = make_event(title="A", **upcoming())
+    make_event(title="B", **upcoming())
+    make_event(title="C", location=other, **upcoming())
+    make_event(title="Draft", status='draft', location=Location.objects.create(name="Empty", lat=1, lon=1),
+               **upcoming())
+
+    with django_capture_on_commit_callbacks(execute=True):
+        report = update_weather_task()
+
+    assert weather_api.request_count == 2
+    assert report == {'frozen': 0, 'points': 2, 'locations': 2, 'chunks': 1}
+    assert WeatherData.objects.count() == 2
+    location.refresh_from_db()
+    assert location.current_weather.pressure == round(1013.0 * 0.75006, 1)
+    # Погода видна в мероприятии: оно попадёт в ленту изменений
+    assert Event.objects.get(id=event.id).updated_at > event.updated_at
+
+    # Свежие показания не запрашиваются повторно
+    assert update_weather_task()['points'] == 0
+
+    # Устаревшие: запуск дописывает историю и переключает текущее показание
+    first = location.current_weather_id
+    WeatherData.objects.update(created_at=timezone.now() - timedelta(hours=2))
+    update_weather_task()
+    location.refresh_from_db()
+    assert WeatherData.objects.count() == 4
+    assert location.current_weather_id != first
+
+@pytest.mark.django_db
+def test_weather_split_into_chunks_and_runs_never_overlap(settings, weather_api, make_event):
+    """Проверка: пачки по WEATHER_CHUNK_SIZE координат, повторный запуск ждёт предыдущий"""
+    settings.WEATHER_CHUNK_SIZE = 2
+    for number in range(5):
+        make_event(location=Location.objects.create(name=f"L{number}", lat=number, lon=number), **upcoming())
+    # Два места в одной точке — в одной пачке, один запрос к API
+    make_event(location=Location.objects.create(name="Twin", lat=0, lon=0), **upcoming())
+
+    # 5 точек по 2 в пачке
+    assert update_weather_task() == {'frozen': 0, 'points': 5, 'locations': 6, 'chunks': 3}
+    assert weather_api.request_count == 5
+    assert WeatherData.objects.count() == 6
+
+    # Пока идёт предыдущий запуск, новый пропускается; итог пачек снимает блокировку
+    token = acquire('update_weather', 60)
+    assert update_weather_task() == {'skipped': 1}
+    report = finish_weather_update([update_weather_chunk([])], token)
+    assert report == {'fetches': 0, 'failed': 0, 'writes': 0}
+    WeatherData.objects.update(created_at=timezone.now() - timedelta(hours=2))
+    assert update_weather_task() == {'frozen': 0, 'points': 5, 'locations': 6, 'chunks': 3}
+    release('update_weather', token)
+
+@pytest.mark.django_db
+def test_weather_retries_failed_requests(weather_api, make_event):
+    """Проверка: временные ошибки API повторяются"""
+    weather_api.fail_first = 2
+    make_event(**upcoming())
+
+    update_weather_task()
+
+    assert WeatherData.objects.count() == 1
+    assert weather_api.request_count == 3
+
+@pytest.mark.django_db
+def test_weather_history_pruned_and_downsampled(settings, location):
+    """Проверка: старые точки прореживаются, текущее показание остаётся"""
+    settings.WEATHER_HISTORY_DAYS = 30
+    settings.WEATHER_DOWNSAMPLE_AFTER_DAYS = 7
+    settings.WEATHER_DOWNSAMPLE_TO = 'day'
+    now = timezone.now()
+    reading = dict(temperature=1, humidity=1, pressure=1, wind_direction='0', wind_speed=1)
+
+    def add(age):
+        weather = WeatherData.objects.create(location=location, **reading)
+        WeatherData.objects.filter(id=weather.id).update(created_at=now - age)
+        return weather
+
+    expired = add(timedelta(days=40))
+    old_day = now.replace(hour=12) - timedelta(days=10)
+    old = [add(now - old_day + timedelta(hours=h)) for h in range(3)]
+    fresh = [add(timedelta(hours=h)) for h in range(3)]
+    location.current_weather = fresh[0]
+    location.save()
+
+    report = prune_weather_history()
+
+    assert report == {'expired': 1, 'downsampled': 2}
+    remaining = set(WeatherData.objects.values_list('id', flat=True))
+    assert expired.id not in remaining
+    assert len(remaining & {w.id for w in old}) == 1
+    assert {w.id for w in fresh} <= remaining
+
+@pytest.mark.django_db
+def test_weather_refreshed_by_staleness_within_budget(settings, weather_api, make_event, location):
+    """Проверка: только мероприятия в горизонте прогноза, самые устаревшие первыми, прошедшие заморожены"""
+    settings.WEATHER_FORECAST_DAYS = 16
+    settings.WEATHER_HISTORY_DAYS = 30
+    now = timezone.now()
+    reading = dict(temperature=1, humidity=1, pressure=1, wind_direction='0', wind_speed=1)
+
+    def place(name, age, **dates):
+        loc = Location.objects.create(name=name, lat=ord(name[0]), lon=0)
+        if age is not None:
+            loc.current_weather = WeatherData.objects.create(location=loc, **reading)
+            loc.save()
+            WeatherData.objects.filter(id=loc.current_weather_id).update(created_at=now - age)
+        return loc, make_event(location=loc, **dates)
+
+    # Идёт: показанию 2 часа при допустимом часе
+    ongoing, _ = place("Ongoing", timedelta(hours=2), start_date=now - timedelta(hours=1), end_date=now + timedelta(hours=1))
+    # Через 2 дня: 2 часа — ещё свежее
+    place("Soon", timedelta(hours=2), **upcoming(48))
+    # Через 10 дней, показаний нет — первым
+    later, _ = place("Later", None, **upcoming(240))
+    # За горизонтом прогноза
+    place("Far", None, **upcoming(24 * 30))
+    # Прошло 40 дней назад: последнее показание фиксируется и переживает очистку истории
+    past, event = place("Past", timedelta(days=40, hours=2), start_date=now - timedelta(days=40, hours=1),
+                        end_date=now - timedelta(days=40))
+
+    assert due_points(now) == [[later.id], [ongoing.id]]
+    assert due_points(now, budget=1) == [[later.id]]
+
+    settings.WEATHER_REFRESH_BUDGET = 1
+    assert update_weather_task() == {'frozen': 1, 'points': 1, 'locations': 1, 'chunks': 1}
+    assert weather_api.request_count == 1
+    event.refresh_from_db()
+    assert event.frozen_weather_id == past.current_weather_id
+
+    # Новое показание места не меняет погоду прошедшего мероприятия
+    past.current_weather = WeatherData.objects.create(location=past, **{**reading, 'temperature': 9})
+    past.save()
+    assert Event.objects.get(id=event.id).weather.temperature == 1
+
+    assert prune_weather_history()['expired'] == 0
+    assert WeatherData.objects.filter(id=event.frozen_weather_id).exists()
+
+@pytest.mark.django_db
+def test_past_weather_frozen_in_batches_including_late_changes(settings, make_event, location,
+                                                              django_assert_num_queries):
+    """Проверка: погода фиксируется пачками, в том числе у опубликованных после окончания"""
+    settings.WEATHER_FREEZE_BATCH = 2
+    now = timezone.now()
+    location.current_weather = WeatherData.objects.create(
+        location=location, temperature=1, humidity=1, pressure=1, wind_direction='0', wind_speed=1,
+    )
+    location.save()
+    WeatherData.objects.update(created_at=now - timedelta(days=10))
+
+    def ended(days, place=location, **fields):
+        return make_event(location=place, start_date=now - timedelta(days=days, hours=1),
+                          end_date=now - timedelta(days=days), **fields)
+
+    # Показаний до окончания нет — не замораживается
+    ended(8, Location.objects.create(name="No readings", lat=1, lon=1))
+    events = [ended(days) for days in (7, 6, 5)]
+
+    assert [freeze_past_weather(now) for _ in range(3)] == [2, 1, 0]
+    assert all(Event.objects.filter(id__in=[e.id for e in events]).values_list('frozen_weather', flat=True))
+    # Без пачек к фиксации — один запрос выбора
+    with django_assert_num_queries(1):
+        assert freeze_past_weather(now) == 0
+
+    # Опубликованное после окончания и перенесённое в прошлое тоже получают погоду
+    late = ended(9, status='draft')
+    moved = make_event(location=location, start_date=now + timedelta(days=1), end_date=now + timedelta(days=2))
+    assert freeze_past_weather(now) == 0
+    Event.objects.filter(id=late.id).update(status='published')
+    Event.objects.filter(id=moved.id).update(start_date=now - timedelta(days=9, hours=1),
+                                             end_date=now - timedelta(days=9))
+    assert freeze_past_weather(now) == 2
+    assert set(Event.objects.filter(id__in=[late.id, moved.id]).values_list('frozen_weather', flat=True)) == {
+        location.current_weather_id}
+
+@pytest.mark.django_db
+def test_failed_chunk_releases_lock(monkeypatch, make_event):
+    """Проверка: если пачка упала, обработчик ошибки chord снимает блокировку"""
+    callbacks = []
+    monkeypatch.setattr(tasks, 'chord', lambda header: callbacks.append)
+    make_event(status='draft', publish_at=timezone.now() - timedelta(minutes=1))
+
+    assert check_for_publication() == {'due': 1, 'chunks': 1}
+    assert acquire('check_for_publication', 60) is None
+
+    # Так Celery вызывает обработчики ошибок callback, когда падает пачка chord
+    errback = current_app.signature(callbacks[0].options['link_error'][0])
+    errback(None, RuntimeError("chunk failed"), None)
+    assert acquire('check_for_publication', 60) is not None
+
+@pytest.mark.django_db
+def test_failed_due_query_releases_lock(monkeypatch):
+    """Проверка: ошибка выбора черновиков не оставляет блокировку до истечения"""
+
+    def broken_filter(*args, **kwargs):
+        raise DatabaseError("connection lost")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(tasks.Event.objects, 'filter', broken_filter)
+        with pytest.raises(DatabaseError):
+            check_for_publication()
+    assert acquire('check_for_publication', 60) is not None
+
+@pytest.mark.django_db
+def test_due_drafts_published_in_one_batch(make_event, mailoutbox, django_capture_on_commit_callbacks):
+    """Проверка: публикуются только черновики с наступившим publish_at"""
+    now = timezone.now()
+    due = [make_event(title=f"Due {i}", status='draft', publish_at=now - timedelta(minutes=i)) for i in range(3)]
+    later = make_event(title="Later", status='draft', publish_at=now + timedelta(hours=1))
+    unscheduled = make_event(title="Unscheduled", status='draft')
+
+    with django_capture_on_commit_callbacks(execute=True):
+        report = check_for_publication()
+
+    assert report == {'due': 3, 'chunks': 1}
+    assert set(Event.objects.filter(status='published').values_list('id', flat=True)) == {e.id for e in due}
+    assert Event.objects.get(id=later.id).status == 'draft'
+    assert Event.objects.get(id=unscheduled.id).status == 'draft'
+    assert sorted(m.subject for m in mailoutbox) == [f"Опубликовано: Due {i}" for i in range(3)]
+
+    # Повторный запуск ничего не делает
+    assert check_for_publication() == {'due': 0, 'chunks': 0}
+
+@pytest.mark.django_db
+def test_publish_due_limited_only_by_ids(make_event, location):
+    """Проверка: publish_due — метод менеджера, отфильтрованный QuerySet его не вызовет"""
+    past = timezone.now() - timedelta(minutes=1)
+    here = make_event(status='draft', publish_at=past)
+    elsewhere = make_event(status='draft', publish_at=past,
+                           location=Location.objects.create(name="Other", lat=1, lon=1))
+
+    with pytest.raises(AttributeError):
+        Event.objects.filter(location=location).publish_due()
+    assert Event.objects.publish_due(ids=[here.id]) == [here.id]
+    assert Event.objects.get(id=elsewhere.id).status == 'draft'
+
+@pytest.mark.django_db
+def test_notifications_sent_in_batches_over_one_connection(settings, make_event, monkeypatch,
+                                                           mailoutbox, django_capture_on_commit_callbacks):
+    """Проверка: массовая публикация — несколько пачек через одно соединение"""
+    settings.EMAIL_BATCH_SIZE = 100
+    calls = {'open': 0, 'send': 0}
+    original_open, original_send = EmailBackend.open, EmailBackend.send_messages
+
+    def counting_open(self):
+        calls['open'] += 1
+        return original_open(self)
+
+    def counting_send(self, messages):
+        calls['send'] += 1
+        return original_send(self, messages)
+
+    monkeypatch.setattr(EmailBackend, 'open', counting_open)
+    monkeypatch.setattr(EmailBackend, 'send_messages', counting_send)
+
+    past = timezone.now() - timedelta(minutes=1)
+    first = make_event(status='draft', publish_at=past)
+    Event.objects.bulk_create([
+        Event(title=f"E{i}", description='', author=first.author, location=first.location,
+              status='draft', publish_at=past, start_date=past, end_date=past)
+        for i in range(249)
+    ])
+
+    with django_capture_on_commit_callbacks(execute=True):
+        check_for_publication()
+        # Повторная постановка уже ожидающих уведомлений не создаёт дублей
+        notify_published(Event.objects.values_list('id', flat=True)[:10])
+
+    assert len(mailoutbox) == 250
+    # Письма по одному: отказ сервера посреди пачки не теряет отметки об отправленных
+    assert calls == {'open': 1, 'send': 250}
+
+
+@pytest.mark.django_db
+def test_notifications_failed_mid_batch_resent_once_and_paced(settings, make_event, monkeypatch, mailoutbox):
+    """Проверка: при отказе почты отправленные не повторяются, темп ограничен на каждое письмо"""
+    settings.EMAIL_RATE_LIMIT = 2
+    events = [make_event(title=f"E{i}") for i in range(5)]
+    PublicationNotification.objects.bulk_create([PublicationNotification(event=event) for event in events])
+
+    original_send = EmailBackend.send_messages
+
+    def failing_send(self, messages):
+        if len(mailoutbox) == 3:
+            raise OSError("SMTP connection lost")
+        return original_send(self, messages)
+
+    clock = {'now': 0.0}
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        clock['now'] += seconds
+
+    monkeypatch.setattr(notifications.time, 'monotonic', lambda: clock['now'])
+    monkeypatch.setattr(notifications.time, 'sleep', sleep)
+    with monkeypatch.context() as patch:
+        patch.setattr(EmailBackend, 'send_messages', failing_send)
+        with pytest.raises(OSError):
+            notifications.send_pending_notifications()
+
+    # Три письма ушли и отмечены, остальные снова в очереди
+    assert PublicationNotification.objects.filter(sent_at__isnull=False).count() == 3
+    assert not PublicationNotification.objects.filter(sent_at__isnull=True, claimed_at__isnull=False).exists()
+    # Каждое письмо после первого — не раньше чем через 1 / EMAIL_RATE_LIMIT секунд
+    assert sleeps == [0.5, 0.5, 0.5]
+
+    assert notifications.send_pending_notifications() == 2
+    assert sorted(message.subject for message in mailoutbox) == sorted(f"Опубликовано: E{i}" for i in range(5))
+
+
+@pytest.mark.django_db
+def test_location_stats_updated_incrementally_and_reconciled(make_event, location):
+    """Проверка: сводка меняется на разницу при любых изменениях и совпадает с полным пересчётом"""
+    now = timezone.now()
+    other = Location.objects.create(name="Other", lat=59.93, lon=30.31)
+
+    def stats():
+        return {
+            row.location_id: {name: getattr(row, name) for name in ('published', 'drafts', 'upcoming', 'rating_sum')}
+            for row in LocationStats.objects.all()
+        }
+
+    roll_upcoming_stats()  # Отметка «предстоящих» — сейчас
+    soon = make_event(title="Soon", rating=10, start_date=now + timedelta(minutes=1),
+                      end_date=now + timedelta(hours=1))
+    make_event(title="Later", rating=20, start_date=now + timedelta(days=1), end_date=now + timedelta(days=2))
+    past = make_event(title="Past", rating=5, start_date=now - timedelta(days=1), end_date=now)
+    draft = make_event(title="Draft", status='draft', publish_at=now - timedelta(minutes=1))
+    assert stats()[location.id] == {'published': 3, 'drafts': 1, 'upcoming': 2, 'rating_sum': 35}
+
+    # Перенос, смена рейтинга и статуса, удаление, публикация одним UPDATE
+    past = Event.objects.get(id=past.id)
+    past.location, past.rating = other, 7
+    past.save()
+    Event.objects.get(title="Later").delete()
+    check_for_publication()
+    soon.status = 'draft'
+    soon.save(update_fields=['status'])
+
+    assert stats() == {
+        location.id: {'published': 1, 'drafts': 1, 'upcoming': 0, 'rating_sum': 0},
+        other.id: {'published': 1, 'drafts': 0, 'upcoming': 0, 'rating_sum': 7},
+    }
+    assert Event.objects.get(id=draft.id).status == 'published'
+    assert reconcile_location_stats() == {'fixed': 0}
+
+    # Начавшиеся мероприятия вычитаются из предстоящих, расхождение исправляет сверка
+    soon.status = 'published'
+    soon.save()
+    assert stats()[location.id]['upcoming'] == 1
+    Event.objects.filter(id=soon.id).update(start_date=timezone.now())
+    assert roll_upcoming_stats() == {'started': 1}
+    assert stats()[location.id]['upcoming'] == 0
+    LocationStats.objects.filter(location=other).update(published=100)
+    assert reconcile_location_stats() == {'fixed': 1}
+    assert stats()[other.id] == aggregate([other.id], now)[other.id]
@@ -0,0 +1,89 @@
+"""Вспомогательные средства для тестов и бенчмарков."""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+STUB_WEATHER = {
+    'current_weather': {
+        'temperature': 21.5,
+        'windspeed': 3.2,
+        'winddirection': 180,
+    },
+    'hourly': {
+        'surface_pressure': [1013.0],
+        'relativehumidity_2m': [55],
+    },
+}
+
+
+class StubOpenMeteoServer:
+    """
+    Локальная заглушка Open-Meteo.
+
+    Отвечает одинаковыми данными на любые координаты и считает запросы.
+    `fail_first` первых запросов получают 503 (для проверки повторов).
+
+        with StubOpenMeteoServer() as server:
+            settings.WEATHER_API_URL = server.url
+    """
+
+    def __init__(self, payload=None, fail_first=0, delay=0):
+        self.payload = payload or STUB_WEATHER
+        self.fail_first = fail_first
+        self.delay = delay
+        self.requests = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/v1/forecast"
+
+    @property
+    def request_count(self):
+        return len(self.requests)
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # keep-alive, чтобы пул соединений клиента работал как с реальным API
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                with stub._lock:
+                    stub.requests.append(parse_qs(urlparse(self.path).query))
+                    failing = len(stub.requests) <= stub.fail_first
+                if stub.delay:
+                    threading.Event().wait(stub.delay)
+
+                status = 503 if failing else 200
+                body = b'{}' if failing else json.dumps(stub.payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,83 @@
+"""Превью изображений мероприятий."""
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+# Форматы, в которых превью сохраняется как есть; остальные — в JPEG
+NATIVE_FORMATS = {'JPEG': 'jpg', 'PNG': 'png'}
+
+
+def scaled_size(width, height, side):
+    """Размер, при котором меньшая сторона равна side"""
+    if width < height:
+        return side, int(height * (side / width))
+    return int(width * (side / height)), side
+
+
+def open_image(file, side):
+    """
+    Открывает изображение для уменьшения до меньшей стороны side.
+
+    Для JPEG включается draft-режим: декодер сразу масштабирует DCT-блоки
+    (1/2, 1/4, 1/8), и большая фотография не распаковывается целиком.
+    """
+    img = Image.open(file)
+    source_format = img.format
+    if source_format == 'JPEG':
+        img.draft('RGB', scaled_size(*img.size, side))
+    img = ImageOps.exif_transpose(img)
+    return img, source_format
+
+
+def has_alpha(img):
+    return img.mode in ('RGBA', 'LA', 'PA') or 'transparency' in img.info
+
+
+def encode(img, fmt):
+    if fmt == 'JPEG' and img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')
+    elif fmt == 'WEBP' and img.mode not in ('RGB', 'RGBA'):
+        # WebP хранит прозрачность: PNG и GIF с альфа-каналом остаются прозрачными
+        img = img.convert('RGBA' if has_alpha(img) else 'RGB')
+    buffer = BytesIO()
+    if fmt == 'WEBP':
+        img.save(buffer, fmt, quality=settings.THUMBNAIL_WEBP_QUALITY)
+    else:
+        img.save(buffer, fmt)
+    return buffer.getvalue()
+
+
+def generate_variants(image):
+    """
+    Создаёт превью всех размеров THUMBNAIL_SIZES в исходном формате
+    (JPEG/PNG, прочие — в JPEG) и в WebP.
+
+    Возвращает словарь {размер: {расширение: имя файла в хранилище}}.
+    """
+    sizes = sorted(settings.THUMBNAIL_SIZES, reverse=True)
+    base, _ = os.path.splitext(os.path.basename(image.name))
+
+    with image.open('rb') as file:
+        img, source_format = open_image(file, sizes[0])
+        img.load()
+
+    fmt = source_format if source_format in NATIVE_FORMATS else 'JPEG'
+    ext = NATIVE_FORMATS.get(fmt, 'jpg')
+
+    variants = {}
+    for side in sizes:
+        # Каждый следующий размер уменьшается из предыдущего; без увеличения
+        if min(img.size) > side:
+            img = img.resize(scaled_size(*img.size, side), Image.LANCZOS)
+        variants[str(side)] = {
+            target_ext: default_storage.save(
+                f"events/thumbnails/{base}_{side}.{target_ext}",
+                ContentFile(encode(img, target_fmt)),
+            )
+            for target_fmt, target_ext in ((fmt, ext), ('WEBP', 'webp'))
+        }
+    return variants
@@ -0,0 +1,43 @@
+"""Число мероприятий по дням, неделям или месяцам (группировка в БД)."""
+import zoneinfo
+
+from django.db.models import Count, DateField
+from django.db.models.functions import Trunc
+from rest_framework.exceptions import ValidationError
+
+INTERVALS = ('day', 'week', 'month')
+
+
+def timeline_params(request):
+    """interval, tz и группировка по месту из строки запроса"""
+    interval = request.query_params.get('interval', 'day')
+    if interval not in INTERVALS:
+        raise ValidationError({'interval': f"Ожидается одно из: {', '.join(INTERVALS)}"})
+    tz = request.query_params.get('tz')
+    try:
+        tzinfo = zoneinfo.ZoneInfo(tz) if tz else None
+    except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+        raise ValidationError({'tz': "Неизвестный часовой пояс"})
+    by_location = request.query_params.get('group') == 'location'
+    return interval, tzinfo, by_location
+
+
+def timeline(queryset, interval, tzinfo=None, by_location=False):
+    """
+    [[дата начала периода, число], ...] по start_date — один GROUP BY без
+    чтения строк. С by_location — такие списки по каждому месту
+    """
+    bucket = Trunc('start_date', interval, output_field=DateField(), tzinfo=tzinfo)
+    columns = ['location_id', 'bucket'] if by_location else ['bucket']
+    rows = (
+        queryset.order_by().annotate(bucket=bucket).values(*columns)
+        .annotate(count=Count('id')).order_by(*columns)
+        .values_list(*columns, 'count')
+    )
+    if not by_location:
+        return {'interval': interval, 'buckets': [[day.isoformat(), count] for day, count in rows]}
+
+    locations = {}
+    for location_id, day, count in rows:
+        locations.setdefault(str(location_id), []).append([day.isoformat(), count])
+    return {'interval': interval, 'locations': locations}
@@ -0,0 +1,180 @@
+"""Загрузка изображений частями: файл пишется на диск по мере получения."""
+import os
+import shutil
+import uuid
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from .models import EventImage
+from .tasks import process_images
+
+# Части читаются из запроса и пишутся блоками такого размера
+BLOCK_SIZE = 64 * 1024
+# Недописанные файлы лежат в MEDIA_ROOT/uploads/<id>.part, принимаемые части — рядом
+PARTIAL_DIR = 'uploads'
+
+# Первые байты файла для каждого разрешённого типа
+SIGNATURES = {
+    'image/jpeg': [(0, b'\xff\xd8\xff')],
+    'image/png': [(0, b'\x89PNG\r\n\x1a\n')],
+    'image/gif': [(0, b'GIF87a'), (0, b'GIF89a')],
+    'image/webp': [(0, b'RIFF'), (8, b'WEBP')],
+}
+SIGNATURE_LENGTH = 12
+
+
+class UploadError(Exception):
+    """Ошибка загрузки с HTTP-статусом ответа"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def partial_path(session):
+    return os.path.join(settings.MEDIA_ROOT, PARTIAL_DIR, f'{session.id}.part')
+
+
+def create_partial(session):
+    """Пустой файл, в который будут дописываться части"""
+    path = partial_path(session)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, 'wb').close()
+
+
+def remove_partial(session):
+    try:
+        os.remove(partial_path(session))
+    except FileNotFoundError:
+        pass
+
+
+def matches_signature(content_type, head):
+    checks = SIGNATURES[content_type]
+    if content_type == 'image/webp':
+        return all(head[start:start + len(magic)] == magic for start, magic in checks)
+    return any(head.startswith(magic) for _, magic in checks)
+
+
+def chunk_path(session):
+    return os.path.join(settings.MEDIA_ROOT, PARTIAL_DIR, f'{session.id}.{uuid.uuid4().hex}.chunk')
+
+
+def check_chunk(session, offset, length):
+    """Смещение и длина части проверяются до чтения тела"""
+    if session.status != 'uploading':
+        raise UploadError("Загрузка уже завершена", status=409)
+    if offset != session.offset:
+        raise UploadError(f"Ожидается смещение {session.offset}", status=409)
+    if offset + length > session.size:
+        raise UploadError(f"Часть выходит за объявленный размер {session.size} байт", status=413)
+    if offset == 0 and length < min(SIGNATURE_LENGTH, session.size):
+        raise UploadError(f"Первая часть должна быть не меньше {SIGNATURE_LENGTH} байт")
+
+
+def receive_chunk(session, stream, offset, length):
+    """
+    Читает часть длиной length байт из stream в отдельный файл блоками по
+    BLOCK_SIZE: в памяти не больше одного блока, строка загрузки не
+    заблокирована, пока клиент передаёт данные. Возвращает (путь файла
+    части, оборвалось ли соединение); полученное до обрыва тоже
+    дописывается, и загрузку можно продолжить с нового смещения.
+    """
+    check_chunk(session, offset, length)
+    path = chunk_path(session)
+    broken = False
+    with open(path, 'wb') as chunk:
+        remaining = length
+        try:
+            if offset == 0:
+                # Тип проверяется по первым байтам, до чтения остального файла
+                head = stream.read(min(SIGNATURE_LENGTH, remaining))
+                if not matches_signature(session.content_type, head):
+                    raise UploadError(f"Содержимое не соответствует типу {session.content_type}", status=415)
+                chunk.write(head)
+                remaining -= len(head)
+            while remaining:
+                block = stream.read(min(BLOCK_SIZE, remaining))
+                if not block:
+                    break
+                chunk.write(block)
+                remaining -= len(block)
+        except OSError:
+            broken = True
+        except UploadError:
+            chunk.close()
+            os.remove(path)
+            raise
+    return path, broken
+
+
+def append_chunk(session, path, offset):
+    """
+    Дописывает полученную часть в недописанный файл со смещения offset и
+    возвращает новое смещение. Вызывается под блокировкой строки загрузки:
+    смещение проверяется ещё раз — части одной загрузки идут по очереди.
+    """
+    try:
+        check_chunk(session, offset, os.path.getsize(path))
+        with open(path, 'rb') as chunk, open(partial_path(session), 'r+b') as partial:
+            partial.seek(offset)
+            shutil.copyfileobj(chunk, partial, BLOCK_SIZE)
+            partial.truncate()
+            session.offset = partial.tell()
+    finally:
+        os.remove(path)
+    return session.offset
+
+
+def move_to_storage(source, name):
+    """
+    Файловое хранилище получает файл переименованием, без повторного
+    чтения; остальные хранилища — потоком из файла. Возвращает имя в хранилище
+    """
+    try:
+        target = default_storage.path(name)
+    except NotImplementedError:
+        with open(source, 'rb') as partial:
+            name = default_storage.save(name, File(partial))
+        os.remove(source)
+    else:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(source, target)
+    return name
+
+
+def finalize_upload(session):
+    """
+    Создаёт EventImage и переносит загруженный файл в хранилище изображений
+    после фиксации транзакции: при откате недописанный файл остаётся на
+    месте, и загрузку можно завершить снова.
+    """
+    if session.status != 'uploading':
+        raise UploadError("Загрузка уже завершена", status=409)
+    if session.offset != session.size:
+        raise UploadError(f"Получено {session.offset} из {session.size} байт", status=409)
+
+    field = EventImage._meta.get_field('image')
+    filename = default_storage.get_valid_name(os.path.basename(session.filename)) or 'image'
+    name = field.generate_filename(None, f'{uuid.uuid4().hex}_{filename}')
+    image = EventImage.objects.create(event=session.event, image=name)
+    session.image = image
+    session.status = 'complete'
+    session.save(update_fields=['image', 'status', 'updated_at'])
+
+    source = partial_path(session)
+
+    def move():
+        stored = move_to_storage(source, name)
+        if stored != name:
+            # Хранилище выбрало другое имя
+            EventImage.objects.filter(pk=image.pk).update(image=stored)
+            image.image.name = stored
+
+    transaction.on_commit(move)
+    # Превью — в фоне после переноса файла, как для изображений из multipart-запроса
+    process_images([image.id])
+    return image
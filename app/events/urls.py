@@ -1,12 +1,21 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import LocationViewSet, EventViewSet
+from .views import LocationViewSet, LocationStatsViewSet, EventViewSet, UploadSessionViewSet
+from .async_views import EventReadView, LocationReadView
 
 router = DefaultRouter()
 router.register(r'locations', LocationViewSet)
 router.register(r'events', EventViewSet)
+router.register(r'uploads', UploadSessionViewSet)
+router.register(r'stats/locations', LocationStatsViewSet, basename='location-stats')
 
 urlpatterns = [
     path('', include(router.urls)),
+
+    # Чтение через async ORM (для ASGI-сервера)
+    path('async/events/', EventReadView.as_view('list'), name='async-event-list'),
+    path('async/events/<int:pk>/', EventReadView.as_view('retrieve'), name='async-event-detail'),
+    path('async/locations/', LocationReadView.as_view('list'), name='async-location-list'),
+    path('async/locations/<int:pk>/', LocationReadView.as_view('retrieve'), name='async-location-detail'),
     
 ]
\ No newline at end of file
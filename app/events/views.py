@@ -1,17 +1,57 @@
 from django.shortcuts import render
-from rest_framework import viewsets, permissions, filters as drf_filters
-from .models import Location, Event
-from .serializers import LocationSerializer, EventSerializer
-from .filters import EventFilter
-from drf_spectacular.utils import extend_schema, extend_schema_view
+from rest_framework import mixins, viewsets, permissions
+from .models import Location, LocationStats, Event, EventImage, EventTombstone, WeatherData, UploadSession
+from .serializers import (
+    LocationSerializer, LocationStatsSerializer, EventSerializer, EventImageSerializer, UploadSessionSerializer,
+)
+from django_filters.rest_framework import DjangoFilterBackend
+from .filters import EventFilter, EventSearchFilter, EventOrderingFilter, NullsLastOrderingFilter
+from .cache import CachedResponseMixin, response_cache_key
+from .pagination import KeysetPagination
+from .listing import EventListing, requested_fields
+from .timeline import timeline, timeline_params
+from .sync import ChangeFeed, decode_cursor, encode_cursor
+from .notifications import notify_published
+from .tasks import schedule_publication, export_events_xlsx_task, import_events_xlsx_task
+from .imports import EventImporter
+from .bulk import EventBulk
+from .exports import write_events_xlsx, XLSX_CONTENT_TYPE
+from .uploads import UploadError, append_chunk, create_partial, finalize_upload, receive_chunk, remove_partial
+from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter
+from core.db_router import ReplicaReadMixin
+from core.metrics import stage
 
 # Экспорт таблиц
-import openpyxl
-from django.http import HttpResponse
+import tempfile
+import uuid
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Count, FloatField, Sum
+from django.db.models.functions import Cast, NullIf
+from django.http import FileResponse
+from rest_framework.generics import get_object_or_404
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from django.utils import timezone
 from django.utils.dateparse import parse_datetime
 
+def job_status_response(request, task, job_id):
+    """Состояние фоновой задачи Celery для клиента, который её опрашивает"""
+    result = task.AsyncResult(job_id)
+    data = {'job_id': job_id, 'status': result.state.lower()}
+    if result.successful():
+        data.update(result.result)
+        if 'url' in data:
+            data['url'] = request.build_absolute_uri(data['url'])
+    elif result.failed():
+        data['error'] = str(result.result)
+    elif isinstance(result.info, dict):
+        # Прогресс из update_state(meta=...)
+        data.update(result.info)
+    return Response(data)
+
 @extend_schema(tags=['Места проведения'])
 @extend_schema_view(
     list=extend_schema(summary="Список мест"),
@@ -24,7 +64,7 @@ from django.utils.dateparse import parse_datetime
     partial_update=extend_schema(summary="Изменить место (частично)", description="Доступно только администратору"),
     destroy=extend_schema(summary="Удалить место", description="Доступно только администратору"),
 )
-class LocationViewSet(viewsets.ModelViewSet):
+class LocationViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = Location.objects.all()
     serializer_class = LocationSerializer
 
@@ -37,7 +77,16 @@ class LocationViewSet(viewsets.ModelViewSet):
 @extend_schema_view(
     list=extend_schema(
         summary="Получить список всех мероприятий", 
-        description="Обычные пользователи видят только опубликованные мероприятия. Суперпользователи видят всё."
+        description="Обычные пользователи видят только опубликованные мероприятия. Суперпользователи видят всё.",
+        parameters=[
+            OpenApiParameter('pagination', str, enum=['cursor'],
+                             description="cursor — постраничный вывод по ключу (без подсчёта общего числа)"),
+            OpenApiParameter('cursor', str, description="Курсор следующей страницы (из поля next)"),
+            OpenApiParameter('page_size', int,
+                             description=f"Размер страницы в режиме cursor (не больше {KeysetPagination.max_page_size})"),
+            OpenApiParameter('fields', str,
+                             description="Только перечисленные через запятую поля, например id,title,start_date"),
+        ],
     ),
     retrieve=extend_schema(
         summary="Детальная информация о мероприятии",
@@ -73,26 +122,77 @@ class LocationViewSet(viewsets.ModelViewSet):
     partial_update=extend_schema(summary="Редактировать мероприятие (частично)", description="Только для администратора"),
     destroy=extend_schema(summary="Удалить мероприятие", description="Только для администратора"),
 )
-class EventViewSet(viewsets.ModelViewSet):
+class EventViewSet(CachedResponseMixin, ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = Event.objects.all()
     serializer_class = EventSerializer
+    # Чтения, которые можно выполнять на реплике
+    replica_actions = ('list', 'retrieve', 'export_xlsx', 'timeline')
+    # Ответы анонимам кэшируются до изменения любой из этих моделей
+    cache_models = (Event, Location, EventImage, WeatherData)
 
+    filter_backends = [DjangoFilterBackend, EventSearchFilter, EventOrderingFilter]
     filterset_class = EventFilter
-    # Поиск по названию или месту
+    # Поиск по названию или месту (в PostgreSQL — полнотекстовый, см. EventSearchFilter)
     search_fields = ['title', 'location__name']  
     # Сортировка
-    ordering_fields = ['title', 'start_date', 'end_date'] 
+    ordering_fields = ['title', 'start_date', 'end_date', 'distance']  # distance — только с near
      # Сортировка по умолчанию
     ordering = ['title']
     
     def get_permissions(self):
-        if self.action in ['create', 'update', 'partial_update', 'destroy']:
+        if self.action in ['create', 'update', 'partial_update', 'destroy', 'bulk',
+                           'import_xlsx', 'import_xlsx_status']:
             return [permissions.IsAdminUser()]
         return [permissions.AllowAny()]
 
+    @property
+    def paginator(self):
+        # ?pagination=cursor — постраничный вывод по ключу вместо номеров страниц
+        if (not hasattr(self, '_paginator') and self.request is not None
+                and self.request.query_params.get('pagination') == 'cursor'):
+            self._paginator = KeysetPagination()
+        return super().paginator
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(self.fast_list, request, *args, **kwargs)
+
+    def fast_list(self, request, *args, **kwargs):
+        """
+        Список без создания моделей: строки values() и изображения страницы
+        сериализуются через EventListing. ?fields= оставляет только
+        перечисленные поля.
+        """
+        listing, rows = self.listing_rows(request)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            with stage('serialize'):
+                data = listing.to_representation(page)
+            return self.get_paginated_response(data)
+        with stage('serialize'):
+            data = listing.to_representation(list(rows))
+        return Response(data)
+
+    def listing_rows(self, request):
+        """EventListing и строки values() отфильтрованного списка"""
+        serializer = self.get_serializer()
+        queryset = self.filter_queryset(self.get_queryset())
+        fields = requested_fields(request, serializer.fields)
+        listing = EventListing(serializer, queryset, fields)
+
+        # Ключ курсора (поле сортировки и id) нужен в строках даже без ?fields=
+        extra = [name for name in self.ordering_fields if name != 'distance']
+        return listing, listing.rows(queryset, extra)
+
+    def filter_queryset(self, queryset):
+        with stage('filter'):
+            return super().filter_queryset(queryset)
+
     def get_queryset(self):
         user = self.request.user
-        queryset = Event.objects.all()
+        # Место и погода — одним JOIN, изображения — одним запросом на страницу
+        queryset = Event.objects.select_related('location__current_weather', 'frozen_weather').defer('search_vector')
+        if self.action not in ('export_xlsx', 'timeline'):
+            queryset = queryset.prefetch_related('images')
         
         # Не суперюзер - показ опубликованные
         if not (user.is_authenticated and user.is_staff):
@@ -102,60 +202,167 @@ class EventViewSet(viewsets.ModelViewSet):
 
     def perform_create(self, serializer):
         # Автор - текущий пользователь
-        serializer.save(author=self.request.user)
+        instance = serializer.save(author=self.request.user)
+        schedule_publication(instance)
 
-    # Тригер для email при публикации
+    # Тригер для email при публикации (только переход черновик -> опубликовано)
     def perform_update(self, serializer):
+        was_published = serializer.instance.status == 'published'
         instance = serializer.save()
-        if instance.status == 'published':
-            from .tasks import send_event_email_task
-            send_event_email_task.delay(
-                event_id=instance.id,
-                recipient_list=['admin@example.com'],
-                subject=f"Опубликовано: {instance.title}",
-                message=f"Мероприятие {instance.title} теперь доступно для всех."
+        schedule_publication(instance)
+        if instance.status == 'published' and not was_published:
+            notify_published([instance.id])
+
+    @extend_schema(
+        summary="Пакетное создание, изменение и удаление",
+        description=(
+            "operations — до EVENT_BULK_MAX_OPERATIONS операций: "
+            "{op: create, data}, {op: update, id, data} (частичное изменение), "
+            "{op: delete, id}. Все операции проверяются и применяются в одной "
+            "транзакции; ошибочные пропускаются. В results — итог каждой операции "
+            "по её индексу."
+        ),
+        request={'application/json': {
+            'type': 'object',
+            'properties': {'operations': {'type': 'array', 'items': {'type': 'object'}}},
+        }},
+        responses={200: {'type': 'object'}},
+        tags=['Мероприятия'],
+    )
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        operations = request.data.get('operations') if isinstance(request.data, dict) else None
+        if not isinstance(operations, list) or not operations:
+            return Response({"error": "Ожидается непустой список operations"}, status=400)
+        if len(operations) > settings.EVENT_BULK_MAX_OPERATIONS:
+            return Response(
+                {"error": f"Не больше {settings.EVENT_BULK_MAX_OPERATIONS} операций за запрос"},
+                status=400,
             )
+        return Response(EventBulk(author=request.user).run(operations))
 
     # Экспорт
-    @extend_schema(summary="Экспорт мероприятий в XLSX", tags=['Excel'])
+    @extend_schema(
+        summary="Экспорт мероприятий в XLSX",
+        description=(
+            "Учитывает фильтры, поиск и сортировку списка. Если строк больше "
+            "EXPORT_ASYNC_THRESHOLD (или передан async=1), файл готовится в фоне: "
+            "ответ 202 с job_id, статус — в export-xlsx/{job_id}/."
+        ),
+        tags=['Excel'],
+    )
     @action(detail=False, methods=['get'], url_path='export-xlsx')
     def export_xlsx(self, request):
         queryset = self.filter_queryset(self.get_queryset())
-        
-        workbook = openpyxl.Workbook()
-        sheet = workbook.active
-        sheet.title = "Events"
-        
-        # Шапка
-        columns = [
-            'Название', 'Описание', 'Дата публикации', 
-            'Дата начала', 'Дата завершения', 'Название места проведения', 
-            'Гео-координаты', 'Рейтинг'
-        ]
-        sheet.append(columns)
-        
-        for event in queryset:
-            coords = f"{event.location.lat}, {event.location.lon}"
-            
-            sheet.append([
-                event.title,
-                event.description,
-                event.pub_date.replace(tzinfo=None) if event.pub_date else "",
-                event.start_date.replace(tzinfo=None) if event.start_date else "",
-                event.end_date.replace(tzinfo=None) if event.end_date else "",
-                event.location.name,
-                coords,
-                event.rating
-            ])
-            
-        response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-        response['Content-Disposition'] = 'attachment; filename=events_export.xlsx'
-        workbook.save(response)
-        return response
-    
+
+        if (request.query_params.get('async') == '1'
+                or queryset.count() > settings.EXPORT_ASYNC_THRESHOLD):
+            job = export_events_xlsx_task.delay(
+                params=list(request.query_params.lists()),
+                user_id=request.user.id,
+            )
+            return Response({'job_id': job.id, 'status': 'pending'}, status=202)
+
+        # Файл собирается на диске и отдаётся потоком
+        export_file = tempfile.TemporaryFile()
+        with stage('xlsx'):
+            write_events_xlsx(queryset, export_file)
+        export_file.seek(0)
+        return FileResponse(
+            export_file,
+            as_attachment=True,
+            filename='events_export.xlsx',
+            content_type=XLSX_CONTENT_TYPE,
+        )
+
+    @extend_schema(
+        summary="Число мероприятий по периодам",
+        description=(
+            "Сколько мероприятий начинается в каждый день, неделю или месяц: "
+            "[[начало периода, число], ...]. Принимает те же фильтры, что и список "
+            "(start_date_after/start_date_before, location, rating...). "
+            "Считаются опубликованные; администраторы могут передать status=draft. "
+            "group=location — отдельный ряд для каждого места. Ответы по "
+            "диапазонам, которые целиком в прошлом, кэшируются."
+        ),
+        parameters=[
+            OpenApiParameter('interval', str, enum=['day', 'week', 'month'], description="Период (по умолчанию day)"),
+            OpenApiParameter('tz', str, description="Часовой пояс границ периодов, например Europe/Moscow"),
+            OpenApiParameter('group', str, enum=['location'], description="Ряд для каждого места"),
+        ],
+        responses={200: {'type': 'object'}},
+    )
+    @action(detail=False, url_path='timeline')
+    def timeline(self, request):
+        interval, tzinfo, by_location = timeline_params(request)
+        filterset = DjangoFilterBackend().get_filterset(request, self.get_queryset(), self)
+        # Прошедший диапазон уже не изменится: кэш без счётчиков поколений
+        dates = filterset.form.cleaned_data.get('start_date') if filterset.is_valid() else None
+        cache_key = None
+        if dates is not None and dates.stop is not None and dates.stop < timezone.now():
+            cache_key = response_cache_key(request, ('timeline', request.user.is_staff))
+            data = cache.get(cache_key)
+            if data is not None:
+                return Response(data)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        # Календарь — опубликованные мероприятия; черновики только по явному status=
+        if 'status' not in request.query_params:
+            queryset = queryset.filter(status='published')
+        data = timeline(queryset, interval, tzinfo, by_location)
+        if cache_key is not None:
+            cache.set(cache_key, data, settings.TIMELINE_CACHE_TIMEOUT)
+        return Response(data)
+
+    @extend_schema(
+        summary="Изменения мероприятий с прошлой синхронизации",
+        description=(
+            "Без cursor — все мероприятия, с cursor из прошлого ответа — только "
+            "изменённые после него (results) и удалённые или скрытые от клиента "
+            "(deleted, id; применять раньше results). Фильтры списка не применяются, "
+            "?fields= — как в списке. "
+            "Пока more = true, запрашивать следующую страницу с новым cursor. "
+            "Курсор старше SYNC_TOMBSTONE_DAYS дней — ответ 410, нужна полная синхронизация."
+        ),
+        parameters=[OpenApiParameter('cursor', str, description="cursor из прошлого ответа")],
+        responses={200: {'type': 'object'}},
+    )
+    @action(detail=False, url_path='sync')
+    def sync(self, request):
+        cursor = decode_cursor(request.query_params.get('cursor'))
+        serializer = self.get_serializer()
+        queryset = self.get_queryset()
+        listing = EventListing(serializer, queryset, requested_fields(request, serializer.fields))
+        tombstones = EventTombstone.objects.all()
+        user = request.user
+        if user.is_authenticated and user.is_staff:
+            # Снятые с публикации остаются у администраторов как изменённые
+            tombstones = tombstones.filter(unpublished=False)
+
+        feed = ChangeFeed(listing.rows(queryset, ['updated_at']), tombstones, settings.SYNC_PAGE_SIZE)
+        rows, deleted, position, more = feed.page(cursor)
+        with stage('serialize'):
+            results = listing.to_representation(rows)
+        return Response({
+            'results': results,
+            'deleted': deleted,
+            'cursor': encode_cursor(position),
+            'more': more,
+        })
+
+    @extend_schema(summary="Статус фонового экспорта", tags=['Excel'])
+    @action(detail=False, methods=['get'], url_path=r'export-xlsx/(?P<job_id>[0-9a-f-]+)')
+    def export_xlsx_status(self, request, job_id=None):
+        return job_status_response(request, export_events_xlsx_task, job_id)
+
     # Импорт
     @extend_schema(
         summary="Импорт мероприятий из XLSX", 
+        description=(
+            "Ошибочные строки пропускаются и перечисляются в errors. Файлы больше "
+            "IMPORT_ASYNC_THRESHOLD байт (или с async=1) импортируются в фоне: "
+            "ответ 202 с job_id, статус и прогресс — в import-xlsx/{job_id}/."
+        ),
         tags=['Excel'],
         request={'multipart/form-data': {'type': 'object', 'properties': {'file': {'type': 'string', 'format': 'binary'}}}}
     )
@@ -164,38 +371,177 @@ class EventViewSet(viewsets.ModelViewSet):
         file = request.FILES.get('file')
         if not file:
             return Response({"error": "Файл не найден"}, status=400)
-            
+
+        if request.data.get('async') == '1' or file.size > settings.IMPORT_ASYNC_THRESHOLD:
+            name = default_storage.save(f'imports/{uuid.uuid4()}.xlsx', file)
+            job = import_events_xlsx_task.delay(name, request.user.id)
+            return Response({'job_id': job.id, 'status': 'pending'}, status=202)
+
         try:
-            wb = openpyxl.load_workbook(file)
-            sheet = wb.active
-            count = 0
-            
-            for row in sheet.iter_rows(min_row=2, values_only=True):
-                if not row[0]: continue # Пропуск пустых строк
-                
-                title, desc, pub_dt, start_dt, end_dt, loc_name, loc_coords, rating = row
-                
-                # Парсим координаты "lat, lon"
-                lat_raw, lon_raw = str(loc_coords).split(',')
-                
-                location, _ = Location.objects.get_or_create(
-                    name=loc_name, 
-                    defaults={'lat': float(lat_raw.strip()), 'lon': float(lon_raw.strip())}
-                )
-                
-                # Создаем мероприятие
-                Event.objects.create(
-                    title=title,
-                    description=desc,
-                    start_date=start_dt,
-                    end_date=end_dt,
-                    location=location,
-                    rating=rating if rating is not None else 0,
-                    author=request.user,
-                    status='published'
-                )
-                count += 1
-                
-            return Response({"status": f"Успешно импортировано {count} записей"})
+            with stage('xlsx'):
+                report = EventImporter(author=request.user).run(file)
         except Exception as e:
-            return Response({"error": f"Ошибка при чтении файла: {str(e)}"}, status=400)
\ No newline at end of file
+            return Response({"error": f"Ошибка при чтении файла: {str(e)}"}, status=400)
+
+        return Response({"status": f"Успешно импортировано {report['created']} записей", **report})
+
+    @extend_schema(summary="Статус фонового импорта", tags=['Excel'])
+    @action(detail=False, methods=['get'], url_path=r'import-xlsx/(?P<job_id>[0-9a-f-]+)',
+            permission_classes=[permissions.IsAdminUser])
+    def import_xlsx_status(self, request, job_id=None):
+        return job_status_response(request, import_events_xlsx_task, job_id)
+
+
+@extend_schema(tags=['Загрузка изображений'])
+@extend_schema_view(
+    create=extend_schema(
+        summary="Начать загрузку изображения",
+        description=(
+            "Объявляет файл для мероприятия: размер (не больше UPLOAD_MAX_SIZE) "
+            "и тип (UPLOAD_ALLOWED_TYPES) проверяются до передачи данных. "
+            "Дальше части отправляются PATCH-запросами, затем finalize."
+        ),
+    ),
+    retrieve=extend_schema(
+        summary="Состояние загрузки",
+        description="offset (и заголовок Upload-Offset) — с какого байта продолжать после обрыва",
+    ),
+    destroy=extend_schema(summary="Отменить загрузку"),
+)
+class UploadSessionViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin,
+                           mixins.DestroyModelMixin, viewsets.GenericViewSet):
+    """
+    Загрузка изображений мероприятия частями. Каждая часть пишется на диск
+    блоками прямо из тела запроса; оборванную загрузку можно продолжить
+    со смещения offset.
+    """
+    queryset = UploadSession.objects.all()
+    serializer_class = UploadSessionSerializer
+    permission_classes = [permissions.IsAdminUser]
+
+    def perform_create(self, serializer):
+        session = serializer.save(created_by=self.request.user)
+        create_partial(session)
+
+    def perform_destroy(self, instance):
+        if instance.status == 'uploading':
+            remove_partial(instance)
+        instance.delete()
+
+    def retrieve(self, request, *args, **kwargs):
+        response = super().retrieve(request, *args, **kwargs)
+        response['Upload-Offset'] = response.data['offset']
+        return response
+
+    def locked_session(self, pk):
+        # Части одной загрузки записываются по очереди
+        return get_object_or_404(self.get_queryset().select_for_update(), pk=pk)
+
+    def error_response(self, session, error):
+        response = Response({'error': str(error), 'offset': session.offset}, status=error.status)
+        response['Upload-Offset'] = session.offset
+        return response
+
+    @extend_schema(
+        summary="Отправить часть файла",
+        description=(
+            "Тело — байты файла начиная со смещения из заголовка Upload-Offset "
+            "(должно совпадать с offset загрузки). Ответ 409 с текущим offset, "
+            "если смещение не совпало; 413, если часть выходит за объявленный размер; "
+            "415, если начало файла не соответствует типу."
+        ),
+        parameters=[OpenApiParameter('Upload-Offset', int, OpenApiParameter.HEADER, required=True)],
+        request={'application/offset+octet-stream': {'type': 'string', 'format': 'binary'}},
+        responses={200: UploadSessionSerializer},
+    )
+    def partial_update(self, request, pk=None):
+        try:
+            offset = int(request.headers['Upload-Offset'])
+        except (KeyError, ValueError):
+            return Response({"error": "Нужен заголовок Upload-Offset"}, status=400)
+        try:
+            length = int(request.headers['Content-Length'])
+        except (KeyError, ValueError):
+            return Response({"error": "Нужен заголовок Content-Length"}, status=411)
+
+        session = self.get_object()
+        try:
+            # request.stream не разбирается парсерами: тело читается блоками
+            # без транзакции и блокировки — медленный клиент не держит соединение с БД
+            path, broken = receive_chunk(session, request.stream, offset, length)
+        except UploadError as e:
+            return self.error_response(session, e)
+
+        with transaction.atomic():
+            session = self.locked_session(pk)
+            try:
+                append_chunk(session, path, offset)
+            except UploadError as e:
+                return self.error_response(session, e)
+            session.save(update_fields=['offset', 'updated_at'])
+
+        if broken:
+            return self.error_response(session, UploadError("Соединение прервано", status=400))
+        response = Response(self.get_serializer(session).data)
+        response['Upload-Offset'] = session.offset
+        return response
+
+    @extend_schema(
+        summary="Завершить загрузку",
+        description=(
+            "Когда получены все байты, файл переносится в хранилище изображений "
+            "и прикрепляется к мероприятию; превью создаются в фоне."
+        ),
+        request=None,
+        responses={201: EventImageSerializer},
+    )
+    @action(detail=True, methods=['post'])
+    def finalize(self, request, pk=None):
+        with transaction.atomic():
+            session = self.locked_session(pk)
+            try:
+                image = finalize_upload(session)
+            except UploadError as e:
+                return self.error_response(session, e)
+        return Response(EventImageSerializer(image, context=self.get_serializer_context()).data, status=201)
+
+
+@extend_schema(tags=['Статистика'])
+@extend_schema_view(
+    list=extend_schema(
+        summary="Статистика по местам проведения",
+        description=(
+            "Опубликованные, черновики, предстоящие и средний рейтинг по каждому "
+            "месту из сводной таблицы: запрос не читает мероприятия. "
+            "ordering — published, drafts, upcoming, average_rating."
+        ),
+    ),
+    retrieve=extend_schema(summary="Статистика одного места"),
+)
+class LocationStatsViewSet(ReplicaReadMixin, viewsets.ReadOnlyModelViewSet):
+    serializer_class = LocationStatsSerializer
+    permission_classes = [permissions.IsAdminUser]
+    # Места без опубликованных (average_rating = null) — в конце
+    filter_backends = [NullsLastOrderingFilter]
+    ordering_fields = ['location', 'published', 'drafts', 'upcoming', 'average_rating']
+    ordering = ['location']
+    replica_actions = ('list', 'retrieve', 'summary')
+
+    def get_queryset(self):
+        return LocationStats.objects.select_related('location').annotate(
+            average_rating=Cast('rating_sum', FloatField()) / NullIf('published', 0),
+        )
+
+    @extend_schema(summary="Итоги по всем местам", responses={200: {'type': 'object'}})
+    @action(detail=False)
+    def summary(self, request):
+        totals = LocationStats.objects.aggregate(
+            locations=Count('location'),
+            published=Sum('published', default=0),
+            drafts=Sum('drafts', default=0),
+            upcoming=Sum('upcoming', default=0),
+            rating_sum=Sum('rating_sum', default=0),
+        )
+        rating_sum = totals.pop('rating_sum')
+        totals['average_rating'] = rating_sum / totals['published'] if totals['published'] else None
+        return Response(totals)
@@ -0,0 +1,90 @@
+"""Загрузка текущей погоды из Open-Meteo."""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+
+def make_session():
+    """Сессия с пулом соединений и повторами с экспоненциальной задержкой"""
+    retry = Retry(
+        total=settings.WEATHER_RETRIES,
+        backoff_factor=settings.WEATHER_BACKOFF,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=('GET',),
+    )
+    adapter = HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=settings.WEATHER_MAX_WORKERS,
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def parse_weather(data):
+    """Преобразует ответ Open-Meteo в поля WeatherData"""
+    current = data['current_weather']
+
+    # Конвертация давления из гПа в мм рт. ст.
+    pressure_hpa = data['hourly']['surface_pressure'][0]
+
+    return {
+        'temperature': current['temperature'],
+        'wind_speed': current['windspeed'],
+        'wind_direction': str(current['winddirection']),
+        'humidity': data['hourly']['relativehumidity_2m'][0],
+        'pressure': round(pressure_hpa * 0.75006, 1),
+    }
+
+
+def fetch_weather(session, lat, lon):
+    response = session.get(
+        settings.WEATHER_API_URL,
+        params={
+            'latitude': lat,
+            'longitude': lon,
+            'current_weather': 'true',
+            'hourly': 'surface_pressure,relativehumidity_2m',
+        },
+        timeout=settings.WEATHER_TIMEOUT,
+    )
+    response.raise_for_status()
+    return parse_weather(response.json())
+
+
+def fetch_weather_bulk(coords):
+    """
+    Параллельно загружает погоду для набора координат (lat, lon).
+
+    Один запрос на каждую пару координат, не более WEATHER_MAX_WORKERS
+    одновременно. Возвращает словарь {(lat, lon): поля WeatherData};
+    координаты, для которых запрос не удался, в словарь не попадают.
+    """
+    coords = list(coords)
+    if not coords:
+        return {}
+
+    def fetch(point):
+        try:
+            return fetch_weather(session, *point)
+        except Exception as e:
+            logger.warning("Weather error for %s, %s: %s", point[0], point[1], e)
+            return None
+
+    with make_session() as session:
+        workers = min(settings.WEATHER_MAX_WORKERS, len(coords))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(fetch, coords)
+            return {
+                point: reading
+                for point, reading in zip(coords, results)
+                if reading is not None
+            }
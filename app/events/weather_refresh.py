@@ -0,0 +1,101 @@
+"""
+Выбор мест для обновления погоды.
+
+Погода нужна только местам с опубликованными мероприятиями, которые идут
+или начнутся в пределах горизонта прогноза (WEATHER_FORECAST_DAYS).
+Допустимый возраст показания зависит от того, как скоро начало: чем ближе
+мероприятие, тем чаще обновление. Места с устаревшими показаниями
+обновляются по убыванию «просроченности» (возраст / допустимый возраст),
+при равной — сначала ближайшие; за запуск не больше WEATHER_REFRESH_BUDGET
+точек. У закончившихся опубликованных мероприятий последнее показание
+фиксируется (Event.frozen_weather) и больше не обновляется.
+"""
+import math
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Exists, Min, OuterRef, Q, Subquery
+
+from .models import Event, Location, WeatherData
+from .signals import bulk_changed
+
+# (начало не позже чем через, допустимый возраст показания); идущие — в первой строке
+MAX_AGE = (
+    (timedelta(hours=24), timedelta(hours=1)),
+    (timedelta(days=3), timedelta(hours=3)),
+    (None, timedelta(hours=12)),
+)
+
+
+def max_age(lead):
+    for limit, age in MAX_AGE:
+        if limit is None or lead <= limit:
+            return age
+
+
+def candidates(now):
+    """
+    (id, lat, lon, ближайшее начало, время показания) мест с мероприятиями,
+    идущими или начинающимися до конца горизонта прогноза
+    """
+    relevant = Q(
+        events__status='published',
+        events__end_date__gte=now,
+        events__start_date__lte=now + timedelta(days=settings.WEATHER_FORECAST_DAYS),
+    )
+    return (
+        Location.objects.filter(relevant)
+        .annotate(next_start=Min('events__start_date'))
+        .values_list('id', 'lat', 'lon', 'next_start', 'current_weather__created_at')
+    )
+
+
+def due_points(now, budget=None):
+    """
+    Точки для обновления в порядке приоритета: [[location_id, ...], ...].
+    Места с одинаковыми координатами — одна точка (один запрос к API)
+    """
+    budget = settings.WEATHER_REFRESH_BUDGET if budget is None else budget
+    points = defaultdict(lambda: {'ids': [], 'overdue': 0, 'lead': None})
+    for location_id, lat, lon, next_start, measured_at in candidates(now):
+        lead = max(next_start - now, timedelta(0))
+        # Без показания — первыми
+        overdue = math.inf if measured_at is None else (now - measured_at) / max_age(lead)
+        point = points[(lat, lon)]
+        point['ids'].append(location_id)
+        point['overdue'] = max(point['overdue'], overdue)
+        point['lead'] = lead if point['lead'] is None else min(point['lead'], lead)
+
+    due = sorted(
+        (point for point in points.values() if point['overdue'] >= 1),
+        key=lambda point: (-point['overdue'], point['lead']),
+    )
+    return [point['ids'] for point in due[:budget]]
+
+
+def freeze_past_weather(now):
+    """
+    Закончившимся опубликованным мероприятиям без зафиксированной погоды —
+    последнее показание места до окончания. Кандидаты читаются по частичному
+    индексу (только незафиксированные), поэтому в выборку попадают и
+    опубликованные после окончания, и с перенесённым на прошлое end_date.
+    Мероприятия без показаний до окончания пропускаются по индексу истории
+    погоды. За запуск не больше WEATHER_FREEZE_BATCH мероприятий. Возвращает
+    число мероприятий с зафиксированной погодой
+    """
+    readings = WeatherData.objects.filter(
+        location=OuterRef('location_id'), created_at__lte=OuterRef('end_date')
+    )
+    ids = list(
+        Event.objects.filter(status='published', frozen_weather__isnull=True, end_date__lte=now)
+        .filter(Exists(readings))
+        .order_by('end_date', 'id')
+        .values_list('id', flat=True)[:settings.WEATHER_FREEZE_BATCH]
+    )
+    if ids:
+        Event.objects.filter(id__in=ids).update(
+            frozen_weather=Subquery(readings.order_by('-created_at').values('id')[:1])
+        )
+        bulk_changed.send(sender=Event, ids=ids)
+    return len(ids)